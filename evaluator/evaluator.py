@@ -1,7 +1,11 @@
 import argparse
+import asyncio
+import hashlib
 import json
 import multiprocessing as mp
+import os
 import random
+import re
 import signal
 import ssl
 import sys
@@ -9,17 +13,26 @@ import threading
 import time
 from collections import defaultdict
 from datetime import datetime
-from multiprocessing import Lock, Manager, Queue
+from multiprocessing import Lock, Queue
 from pathlib import Path
 from typing import Any, Dict, List, Optional, Tuple
 
+import numpy as np
 import requests
 import yaml
 from loguru import logger
-from torchvision import os
 from tqdm import tqdm
 
+from method.utils.cache_utils import LRUCache
+from method.utils.generation_cache import GenerationCache
+from method.utils.judge_utils import is_yes, token_f1
 from method.utils.mllm_factory import MLLMFactory
+from method.utils.results_store import ResultsStore, is_results_store
+
+
+def shared_counter() -> Any:
+    """Integer shared with the pool workers; spawn-context objects work in fork and spawn pools alike."""
+    return mp.get_context("spawn").Value("i", 0)
 
 
 def load_single_concept_data(concept_id: str) -> Dict[str, Any]:
@@ -69,15 +82,383 @@ def load_all_concepts() -> Dict[str, Any]:
     return concept_data
 
 
-def evaluate_single_result_with_retry(evaluator, result, ground_truth, max_retries=3):
+class JudgeVerdictCache:
+    """
+    Persistent judge verdicts addressed by content: judge model, criterion type (ideal answer or key
+    point, and whether it was judged alone or in a single-prompt judgement), reference text and
+    predicted answer. An identical answer is never judged twice, whichever result or output file it
+    belongs to. Logprob judgements are stored under their own keys, as the P(YES) they measured.
+
+    Stored in a GenerationCache database; each process opens its own connection, and the hit/miss
+    counters are shared with the pool workers.
+
+    Args:
+        path: Database file
+        judge_model: Judge model id
+    """
+
+    def __init__(self, path: str, judge_model: str):
+        self.path = path
+        self.judge_model = judge_model
+        self.hits = shared_counter()
+        self.misses = shared_counter()
+        self._store: Optional[GenerationCache] = None
+        self._pid: Optional[int] = None
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        state["_store"] = None
+        state["_pid"] = None
+        return state
+
+    def _get_store(self) -> GenerationCache:
+        # SQLite connections must not cross a fork
+        if self._pid != os.getpid():
+            self._store = GenerationCache(self.path)
+            self._pid = os.getpid()
+        return self._store
+
+    def key(
+        self,
+        criterion: str,
+        reference: str,
+        predicted_answer: str,
+        single_prompt: bool = False,
+        logprob: bool = False,
+    ) -> str:
+        material = {
+            "judge_model": self.judge_model,
+            "criterion": criterion,
+            "single_prompt": single_prompt,
+            "reference": reference,
+            "predicted_answer": predicted_answer,
+        }
+        if logprob:
+            # Only added when set, so the keys of generated verdicts stay valid
+            material["logprob"] = True
+        return hashlib.sha256(json.dumps(material, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def get(
+        self,
+        criterion: str,
+        reference: str,
+        predicted_answer: str,
+        single_prompt: bool = False,
+        logprob: bool = False,
+    ) -> Optional[float]:
+        """Cached verdict (0 / 1), or P(YES) for a logprob judgement; None on a miss."""
+        key = self.key(criterion, reference, predicted_answer, single_prompt, logprob)
+        cached = self._get_store().get(key)
+        counter = self.misses if cached is None else self.hits
+        with counter.get_lock():
+            counter.value += 1
+        return None if cached is None else json.loads(cached)
+
+    def put(
+        self,
+        criterion: str,
+        reference: str,
+        predicted_answer: str,
+        verdict: float,
+        single_prompt: bool = False,
+        logprob: bool = False,
+    ):
+        key = self.key(criterion, reference, predicted_answer, single_prompt, logprob)
+        self._get_store().put(key, json.dumps(verdict))
+
+    def stats(self) -> dict:
+        hits, misses = self.hits.value, self.misses.value
+        return {
+            "entries": len(self._get_store()),
+            "hits": hits,
+            "misses": misses,
+            "hit_rate": hits / (hits + misses) if hits + misses else 0.0,
+        }
+
+
+# Verdict cache of this process (the parent, or a pool worker via init_evaluation_worker); None disables it
+_verdict_cache: Optional[JudgeVerdictCache] = None
+
+
+def set_verdict_cache(cache: Optional[JudgeVerdictCache]):
+    global _verdict_cache
+    _verdict_cache = cache
+
+
+class LogprobJudge:
+    """
+    Per-criterion judging from P(YES) of a single decode step (`chat_yes_probability` of the judge
+    backend: one token with logprobs on API models, the YES/NO logits of one forward pass on local ones)
+    instead of a generated and parsed reply.
+
+    Args:
+        threshold: A criterion passes when P(YES) >= threshold; None scores it with P(YES) itself
+            (soft scoring)
+    """
+
+    def __init__(self, threshold: Optional[float] = 0.5):
+        self.threshold = threshold
+
+    def score(self, probability: float) -> float:
+        if self.threshold is None:
+            return probability
+        return 1 if probability >= self.threshold else 0
+
+
+# Logprob judging of this process (set like the verdict cache); None judges from generated replies
+_logprob_judge: Optional[LogprobJudge] = None
+
+
+def set_logprob_judge(judge: Optional[LogprobJudge]):
+    global _logprob_judge
+    _logprob_judge = judge
+
+
+class PreJudge:
+    """
+    Cheap first pass over each judge criterion. The similarity of the predicted answer to the reference
+    (ideal answer or key point) settles the criterion without a judge call when it is at least `accept`
+    (pass) or at most `reject` (fail); everything in between goes to the LLM judge. The similarity is the
+    lexical token F1, averaged with the cosine similarity of the Retriever text embeddings when an
+    embedding model is set.
+
+    Thresholds are given directly or fitted by `calibrate` on earlier judge verdicts. The counters of
+    decided and forwarded criteria are shared with the pool workers.
+
+    Args:
+        accept: Similarity from which a criterion passes (None: never)
+        reject: Similarity up to which a criterion fails (None: never)
+        embedding_model: Retriever embedding model, loaded on the GPU of each process that embeds
+            (None: lexical overlap only)
+    """
+
+    def __init__(
+        self,
+        accept: Optional[float] = None,
+        reject: Optional[float] = None,
+        embedding_model: Optional[str] = None,
+    ):
+        self.accept = accept
+        self.reject = reject
+        self.embedding_model = embedding_model
+        self.decided = shared_counter()
+        self.forwarded = shared_counter()
+        self._lock = threading.Lock()
+        self.release_encoder()
+
+    def __getstate__(self):
+        state = dict(self.__dict__)
+        # Each process loads its own embedding model on first use
+        state["_lock"] = None
+        state["_retriever"] = None
+        state["_embeddings"] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+        self.release_encoder()
+
+    def release_encoder(self):
+        """Drop the embedding model and the cached embeddings (the next similarity reloads the model)."""
+        self._retriever = None
+        self._embeddings = LRUCache(max_entries=4096, sizeof=lambda vector: vector.nbytes)
+
+    def _embed(self, texts: List[str]) -> List[np.ndarray]:
+        """Unit-norm embeddings of `texts`; references recur across results, so they are cached."""
+        # The asyncio engine embeds from worker threads: one model load, one encode at a time
+        with self._lock:
+            found = {text: self._embeddings.get(text) for text in texts}
+            missing = [text for text, vector in found.items() if vector is None]
+            if missing:
+                if self._retriever is None:
+                    from method.utils.retrieval_utils import Retriever
+
+                    self._retriever = Retriever(self.embedding_model)
+                vectors = self._retriever.encode_passage_text(missing, batch_size=16)
+                vectors = np.asarray(vectors, dtype=np.float32)
+                vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+                for text, vector in zip(missing, vectors):
+                    self._embeddings.put(text, vector)
+                    found[text] = vector
+        return [found[text] for text in texts]
+
+    def similarities(self, pairs: List[Tuple[str, str]]) -> np.ndarray:
+        """Similarity of each (reference, predicted answer) pair."""
+        lexical = np.array([token_f1(reference, answer) for reference, answer in pairs], dtype=np.float32)
+        if self.embedding_model is None or not pairs:
+            return lexical
+        references = self._embed([reference for reference, _ in pairs])
+        answers = self._embed([answer for _, answer in pairs])
+        cosine = np.array([float(r @ a) for r, a in zip(references, answers)], dtype=np.float32)
+        return (lexical + cosine) / 2
+
+    def verdicts(self, scores: np.ndarray) -> np.ndarray:
+        """1 / 0 where a similarity settles the criterion, -1 where the judge has to decide."""
+        return self._threshold_verdicts(scores, self.accept, self.reject)
+
+    @staticmethod
+    def _threshold_verdicts(
+        scores: np.ndarray, accept: Optional[float], reject: Optional[float]
+    ) -> np.ndarray:
+        verdicts = np.full(len(scores), -1)
+        if reject is not None:
+            verdicts[scores <= reject] = 0
+        if accept is not None:
+            verdicts[scores >= accept] = 1
+        return verdicts
+
+    def decide(self, reference: str, predicted_answer: str) -> Optional[int]:
+        """Verdict of a clear-cut criterion, or None to ask the judge."""
+        verdict = int(self.verdicts(self.similarities([(reference, predicted_answer)]))[0])
+        counter = self.forwarded if verdict < 0 else self.decided
+        with counter.get_lock():
+            counter.value += 1
+        return None if verdict < 0 else verdict
+
+    def calibrate(
+        self,
+        pairs: List[Tuple[str, str]],
+        judge_verdicts: List[float],
+        target_agreement: float = 0.95,
+        min_support: int = 10,
+        folds: int = 5,
+    ) -> Dict[str, float]:
+        """
+        Fit the thresholds to judge verdicts of (reference, predicted answer) pairs: `accept` is the lowest
+        similarity above which at least `target_agreement` of the pairs passed, `reject` the highest below
+        which as many failed (each over at least `min_support` pairs, otherwise that side stays off).
+
+        The reported rates are cross-validated: each of `folds` random folds is decided with thresholds
+        fitted on the other folds, so they estimate the agreement on unseen answers rather than on the
+        pairs the thresholds were fitted to. The thresholds kept are fitted on all pairs.
+
+        Returns:
+            Dict[str, float]: Thresholds, and the held-out fraction of judge calls avoided and agreement
+                with the judge
+        """
+        scores = self.similarities(pairs)
+        passed = np.asarray(judge_verdicts, dtype=np.float32) >= 0.5
+        self.accept, self.reject = self._fit_thresholds(scores, passed, target_agreement, min_support)
+
+        # Out-of-fold verdicts: every pair is decided by thresholds that never saw it
+        verdicts = np.full(len(pairs), -1)
+        folds = max(2, folds)
+        fold_of = np.random.default_rng(0).permutation(len(pairs)) % folds
+        for fold in range(folds):
+            held_out = fold_of == fold
+            if held_out.any() and (~held_out).any():
+                accept, reject = self._fit_thresholds(
+                    scores[~held_out], passed[~held_out], target_agreement, min_support
+                )
+                verdicts[held_out] = self._threshold_verdicts(scores[held_out], accept, reject)
+        decided = verdicts >= 0
+        return {
+            "n": len(pairs),
+            "accept": self.accept,
+            "reject": self.reject,
+            "avoided": float(decided.mean()) if len(pairs) else 0.0,
+            "decided_agreement": float((verdicts[decided] == passed[decided]).mean()) if decided.any() else 1.0,
+            # The judge agrees with itself on the forwarded criteria
+            "agreement": 1 - float((verdicts[decided] != passed[decided]).sum()) / max(len(pairs), 1),
+        }
+
+    @classmethod
+    def _fit_thresholds(
+        cls, scores: np.ndarray, passed: np.ndarray, target_agreement: float, min_support: int
+    ) -> Tuple[Optional[float], Optional[float]]:
+        """(accept, reject) thresholds fitted to the similarities and judge verdicts of some pairs."""
+        accept = cls._fit_threshold(-scores, passed, target_agreement, min_support)
+        accept = None if accept is None else -accept
+        reject = cls._fit_threshold(scores, ~passed, target_agreement, min_support)
+        if accept is not None and reject is not None and reject >= accept:
+            reject = None
+        return accept, reject
+
+    @staticmethod
+    def _fit_threshold(
+        keys: np.ndarray, positive: np.ndarray, target_agreement: float, min_support: int
+    ) -> Optional[float]:
+        """Largest key t such that at least `target_agreement` of the pairs with key <= t are positive."""
+        order = np.argsort(keys, kind="stable")
+        keys, positive = keys[order], positive[order]
+        rate = np.cumsum(positive) / np.arange(1, len(keys) + 1)
+        # A threshold takes all tied keys, so only cut where the next key differs
+        boundary = np.append(keys[1:] != keys[:-1], True)
+        support = np.arange(1, len(keys) + 1) >= min_support
+        candidates = np.nonzero((rate >= target_agreement) & boundary & support)[0]
+        return float(keys[candidates.max()]) if candidates.size else None
+
+    def stats(self) -> dict:
+        decided, forwarded = self.decided.value, self.forwarded.value
+        return {
+            "decided": decided,
+            "forwarded": forwarded,
+            "avoided": decided / (decided + forwarded) if decided + forwarded else 0.0,
+        }
+
+
+# Pre-judge of this process (set like the verdict cache); None sends every criterion to the judge
+_pre_judge: Optional[PreJudge] = None
+
+
+def set_pre_judge(pre_judge: Optional[PreJudge]):
+    global _pre_judge
+    _pre_judge = pre_judge
+
+
+def criterion_verdicts(
+    result: Dict[str, Any], ground_truth: Dict[str, Any], evaluation: Dict[str, Any]
+) -> List[Tuple[str, str, float]]:
+    """
+    (reference, predicted answer, judge verdict) of every criterion an evaluation scores on its own: the
+    ideal answer, the single key point of an easy question, the long- and short-term key points of a
+    hard one (an easy question with several key points only records whether any of them passed).
+    """
+    predicted_answer = result.get("answer", "")
+    criteria = ground_truth.get("evaluation_criteria", {})
+    key_points = criteria.get("key_points", [])
+    scored = []
+    if criteria.get("ideal_answer") and "freetext_acc" in evaluation:
+        scored.append((criteria["ideal_answer"], predicted_answer, evaluation["freetext_acc"]))
+    if result["difficulty"] == "easy" and len(key_points) == 1 and "scoring_point" in evaluation:
+        scored.append((key_points[0], predicted_answer, evaluation["scoring_point"]))
+    elif result["difficulty"] == "hard" and len(key_points) >= 2:
+        for key_point, metric in zip(key_points, ("scoring_point_long", "scoring_point_short")):
+            if metric in evaluation:
+                scored.append((key_point, predicted_answer, evaluation[metric]))
+    return scored
+
+
+def lookup_ground_truth(
+    concept_data: Dict[str, Any], result: Dict[str, Any]
+) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """Ground truth of a result row, or an error message if it is not in `concept_data`."""
+    concept_id = result["concept_id"]
+    question_id = result["question_id"]
+    difficulty = result["difficulty"]
+
+    if concept_id not in concept_data:
+        return None, f"Concept {concept_id} not found"
+
+    if difficulty not in concept_data[concept_id]:
+        return None, f"Difficulty {difficulty} not found for concept {concept_id}"
+
+    if question_id not in concept_data[concept_id][difficulty]:
+        return None, f"Question {question_id} not found for {concept_id}/{difficulty}"
+
+    return concept_data[concept_id][difficulty][question_id], None
+
+
+def evaluate_single_result_with_retry(evaluator, result, ground_truth, max_retries=3, single_prompt=False):
     """Helper function to evaluate with retry logic for network errors."""
 
     for attempt in range(max_retries):
         try:
             if result["difficulty"] == "easy":
-                return evaluate_easy_question_static(result, ground_truth, evaluator)
+                return evaluate_easy_question_static(result, ground_truth, evaluator, single_prompt)
             elif result["difficulty"] == "hard":
-                return evaluate_hard_question_static(result, ground_truth, evaluator)
+                return evaluate_hard_question_static(result, ground_truth, evaluator, single_prompt)
             else:
                 raise ValueError(f"Unknown difficulty: {result['difficulty']}")
 
@@ -94,32 +475,44 @@ def evaluate_single_result_with_retry(evaluator, result, ground_truth, max_retri
             raise e
 
 
-def evaluate_single_result(args_tuple):
-    """Worker function to evaluate a single result in multiprocessing."""
-    result, concept_data, model_id = args_tuple
-
-    try:
-        # Create evaluator instance for this process
-        evaluator = MLLMFactory(model_id)
+# Per-process state of the evaluation pool workers, set once by init_evaluation_worker
+_worker_concept_data: Dict[str, Any] = {}
+_worker_evaluator = None
+_worker_single_prompt = False
 
-        concept_id = result["concept_id"]
-        question_id = result["question_id"]
-        difficulty = result["difficulty"]
 
-        # Get ground truth
-        if concept_id not in concept_data:
-            return None, f"Concept {concept_id} not found"
+def init_evaluation_worker(
+    concept_data: Dict[str, Any],
+    model_id: str,
+    single_prompt: bool = False,
+    verdict_cache: Optional[JudgeVerdictCache] = None,
+    logprob_judge: Optional[LogprobJudge] = None,
+    pre_judge: Optional[PreJudge] = None,
+):
+    """Pool initializer: keep the ground truth and build the judge model once per worker process."""
+    global _worker_concept_data, _worker_evaluator, _worker_single_prompt
+    _worker_concept_data = concept_data
+    _worker_evaluator = MLLMFactory(model_id)
+    _worker_single_prompt = single_prompt
+    set_verdict_cache(verdict_cache)
+    set_logprob_judge(logprob_judge)
+    set_pre_judge(pre_judge)
 
-        if difficulty not in concept_data[concept_id]:
-            return None, f"Difficulty {difficulty} not found for concept {concept_id}"
 
-        if question_id not in concept_data[concept_id][difficulty]:
-            return None, f"Question {question_id} not found for {concept_id}/{difficulty}"
+def evaluate_single_result(result: Dict[str, Any]):
+    """Worker function to evaluate a single result in multiprocessing (see init_evaluation_worker)."""
+    concept_data = _worker_concept_data
+    evaluator = _worker_evaluator
 
-        ground_truth = concept_data[concept_id][difficulty][question_id]
+    try:
+        ground_truth, error = lookup_ground_truth(concept_data, result)
+        if error:
+            return None, error
 
         # Evaluate with retry logic for network errors
-        evaluation = evaluate_single_result_with_retry(evaluator, result, ground_truth)
+        evaluation = evaluate_single_result_with_retry(
+            evaluator, result, ground_truth, single_prompt=_worker_single_prompt
+        )
 
         return evaluation, None
 
@@ -130,22 +523,25 @@ def evaluate_single_result(args_tuple):
         )
 
 
-def evaluate_choice_accuracy_static(predicted_choice: str, ground_truth: Dict[str, Any]) -> int:
-    """Static function for choice accuracy evaluation."""
+def correct_choice_static(ground_truth: Dict[str, Any]) -> Optional[str]:
+    """Letter (A/B/C/D) of the option matching the ground-truth answer, if any."""
     if "options" not in ground_truth or "answer" not in ground_truth:
-        return 0
+        return None
 
     # Map the correct answer to A/B/C/D
     correct_answer = ground_truth["answer"]
     options = ground_truth["options"]
 
     # Find which option (A/B/C/D) matches the correct answer
-    correct_choice = None
     for i, option in enumerate(options):
         if option == correct_answer:
-            correct_choice = chr(ord("A") + i)  # Convert 0->A, 1->B, etc.
-            break
+            return chr(ord("A") + i)  # Convert 0->A, 1->B, etc.
+    return None
+
 
+def evaluate_choice_accuracy_static(predicted_choice: str, ground_truth: Dict[str, Any]) -> int:
+    """Static function for choice accuracy evaluation."""
+    correct_choice = correct_choice_static(ground_truth)
     if correct_choice is None:
         return 0
     if predicted_choice is None:
@@ -155,6 +551,31 @@ def evaluate_choice_accuracy_static(predicted_choice: str, ground_truth: Dict[st
     return 1 if predicted_choice.upper() == correct_choice else 0
 
 
+def evaluate_choice_accuracies(
+    results: List[Dict[str, Any]], concept_data: Dict[str, Any]
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    evaluate_choice_accuracy_static of many result rows, as arrays for the per-difficulty means.
+
+    Returns:
+        (choice accuracy per row, mask of the rows whose ground truth was found)
+    """
+    predicted = []
+    correct = []
+    found = []
+    for result in results:
+        ground_truth, error = lookup_ground_truth(concept_data, result)
+        found.append(error is None)
+        correct.append((correct_choice_static(ground_truth) or "") if ground_truth is not None else "")
+        choice = result.get("choice", "")
+        # Same as evaluate_choice_accuracy_static: a missing choice is a random guess
+        predicted.append(random.choice(["A", "B", "C", "D"]) if choice is None else str(choice))
+    predicted = np.char.upper(np.array(predicted, dtype=str))
+    correct = np.array(correct, dtype=str)
+    accuracy = ((predicted == correct) & (correct != "")).astype(np.int64)
+    return accuracy, np.array(found, dtype=bool)
+
+
 def evaluate_freetext_accuracy_static(predicted_answer: str, ground_truth: Dict[str, Any], evaluator) -> int:
     """Static function for freetext accuracy evaluation."""
     if "evaluation_criteria" not in ground_truth:
@@ -164,7 +585,80 @@ def evaluate_freetext_accuracy_static(predicted_answer: str, ground_truth: Dict[
     if not ideal_answer:
         return 0
 
-    prompt = f"""Please evaluate whether the following predicted answer is an acceptable substitute for the ideal answer.
+    prompt = freetext_judge_prompt(ideal_answer, predicted_answer)
+    return judge_verdict(prompt, evaluator, "ideal_answer", ideal_answer, predicted_answer)
+
+
+def evaluate_scoring_point_static(predicted_answer: str, key_point: str, evaluator) -> int:
+    """Static function for scoring point evaluation."""
+    prompt = scoring_point_judge_prompt(predicted_answer, key_point)
+    return judge_verdict(prompt, evaluator, "key_point", key_point, predicted_answer)
+
+
+def judge_verdict(prompt: str, evaluator, criterion: str, reference: str, predicted_answer: str) -> float:
+    """YES/NO judge call, skipped when the verdict cache or the pre-judge settles it; 0 on failure."""
+    verdict = known_verdict(criterion, reference, predicted_answer)
+    if verdict is not None:
+        return verdict
+    try:
+        if _logprob_judge is not None:
+            response = evaluator.chat_yes_probability(prompt)
+        else:
+            response = evaluator.chat_text(prompt, profile="judge")
+    except Exception as e:
+        return 0
+    return record_verdict(criterion, reference, predicted_answer, response)
+
+
+def known_verdict(criterion: str, reference: str, predicted_answer: str) -> Optional[float]:
+    """Verdict available without a judge call: cached, else from a conclusive pre-judge; None otherwise."""
+    cache = _verdict_cache
+    logprob_judge = _logprob_judge
+    if cache is not None:
+        cached = cache.get(criterion, reference, predicted_answer, logprob=logprob_judge is not None)
+        if cached is not None:
+            return cached if logprob_judge is None else logprob_judge.score(cached)
+    return pre_judge_verdict(reference, predicted_answer)
+
+
+def pre_judge_verdict(reference: str, predicted_answer: str) -> Optional[int]:
+    """Verdict of the pre-judge, or None (no pre-judge, inconclusive, or failed) to ask the judge."""
+    if _pre_judge is None:
+        return None
+    try:
+        return _pre_judge.decide(reference, predicted_answer)
+    except Exception as e:
+        logger.warning(f"Pre-judge failed, asking the judge: {e}")
+        return None
+
+
+async def off_event_loop(func, *args):
+    """
+    Call `func` on a worker thread when it may block the event loop: verdict-cache SQLite reads and
+    writes, or a pre-judge that embeds texts. Otherwise it is cheap and runs inline.
+    """
+    if _verdict_cache is not None or (_pre_judge is not None and _pre_judge.embedding_model is not None):
+        return await asyncio.to_thread(func, *args)
+    return func(*args)
+
+
+def record_verdict(criterion: str, reference: str, predicted_answer: str, response) -> float:
+    """Verdict of a judge response (reply, or P(YES) for the logprob judge), stored in the verdict cache."""
+    cache = _verdict_cache
+    logprob_judge = _logprob_judge
+    if logprob_judge is not None:
+        if cache is not None:
+            cache.put(criterion, reference, predicted_answer, response, logprob=True)
+        return logprob_judge.score(response)
+    verdict = parse_judge_verdict(response)
+    if cache is not None and not response.startswith("Error:"):
+        cache.put(criterion, reference, predicted_answer, verdict)
+    return verdict
+
+
+def freetext_judge_prompt(ideal_answer: str, predicted_answer: str) -> str:
+    """Judge prompt asking whether the predicted answer can substitute for the ideal answer."""
+    return f"""Please evaluate whether the following predicted answer is an acceptable substitute for the ideal answer.
 
 Ideal Answer: {ideal_answer}
 
@@ -177,16 +671,10 @@ Consider:
 
 Respond with only "YES" if the predicted answer is acceptable, or "NO" if it is not."""
 
-    try:
-        response = evaluator.chat_text(prompt)
-        return 1 if "YES" in response.strip().upper() else 0
-    except Exception as e:
-        return 0
-
 
-def evaluate_scoring_point_static(predicted_answer: str, key_point: str, evaluator) -> int:
-    """Static function for scoring point evaluation."""
-    prompt = f"""Please evaluate whether the following answer addresses the given key point.
+def scoring_point_judge_prompt(predicted_answer: str, key_point: str) -> str:
+    """Judge prompt asking whether the answer addresses a key point."""
+    return f"""Please evaluate whether the following answer addresses the given key point.
 
 Key Point: {key_point}
 
@@ -194,15 +682,147 @@ Answer: {predicted_answer}
 
 Respond with only "YES" if the answer clearly addresses this key point, or "NO" if it doesn't."""
 
+
+def parse_judge_verdict(response: str) -> int:
+    """1 if the judge's reply starts with YES, else 0 (a YES later in the reply does not count)."""
+    return 1 if is_yes(response) else 0
+
+
+CRITERION_LABELS = {"ideal_answer": "Ideal Answer", "key_point": "Key Point"}
+
+
+def judge_criteria(ground_truth: Dict[str, Any], key_points: List[str]) -> Dict[str, Tuple[str, str]]:
+    """
+    Criteria of a single-prompt judgement: the ideal answer (if any) and each key point.
+
+    Returns:
+        dict: Criterion name -> (criterion type, reference text)
+    """
+    criteria = {}
+    ideal_answer = ground_truth.get("evaluation_criteria", {}).get("ideal_answer", "")
+    if ideal_answer:
+        criteria["ideal_answer"] = ("ideal_answer", ideal_answer)
+    for i, key_point in enumerate(key_points, 1):
+        criteria[f"key_point_{i}"] = ("key_point", key_point)
+    return criteria
+
+
+def cached_criterion_verdicts(criteria: Dict[str, Tuple[str, str]], predicted_answer: str) -> Dict[str, int]:
+    """Single-prompt verdicts of `criteria` already in the verdict cache or settled by the pre-judge."""
+    verdicts = {}
+    for name, (criterion, reference) in criteria.items():
+        if _verdict_cache is not None:
+            cached = _verdict_cache.get(criterion, reference, predicted_answer, single_prompt=True)
+            if cached is not None:
+                verdicts[name] = cached
+                continue
+        verdict = pre_judge_verdict(reference, predicted_answer)
+        if verdict is not None:
+            verdicts[name] = verdict
+    return verdicts
+
+
+def store_criterion_verdicts(
+    criteria: Dict[str, Tuple[str, str]], predicted_answer: str, response: str, verdicts: Dict[str, int]
+):
+    if _verdict_cache is None or response.startswith("Error:"):
+        return
+    for name, verdict in verdicts.items():
+        criterion, reference = criteria[name]
+        _verdict_cache.put(criterion, reference, predicted_answer, verdict, single_prompt=True)
+
+
+def multi_criterion_judge_prompt(predicted_answer: str, criteria: Dict[str, Tuple[str, str]]) -> str:
+    """Judge prompt grading the answer against every criterion at once, answered as one JSON object."""
+    criteria_lines = "\n".join(
+        f"[{name}] {CRITERION_LABELS[criterion]}: {reference}"
+        for name, (criterion, reference) in criteria.items()
+    )
+    example = ", ".join(f'"{name}": "YES"' for name in criteria)
+    return f"""Please grade the following predicted answer against each criterion below.
+
+Predicted Answer: {predicted_answer}
+
+Criteria:
+{criteria_lines}
+
+For "ideal_answer": the predicted answer is acceptable if it supports the same general conclusion and is factually compatible with the ideal answer (not contradictory); you may overlook missing nuances or slightly less precise phrasing if the main intent is still preserved.
+For each "key_point_N": the predicted answer must clearly address that key point.
+
+Respond with only a JSON object mapping every criterion name to "YES" or "NO", e.g. {{{example}}}"""
+
+
+def parse_multi_criterion_verdict(response: str, criteria: Dict[str, Tuple[str, str]]) -> Dict[str, int]:
+    """
+    Verdicts (1 for YES, 0 for NO) of the criteria found in a single-prompt judge response.
+
+    Criteria that are missing or unreadable are left out, so the caller can judge them one by one.
+    """
+    # The object may be cut short by the token cap; close it so the verdicts given so far still count
+    match = re.search(r"\{.*\}", response, re.DOTALL) or re.search(r"\{.*", response, re.DOTALL)
+    if match is None:
+        return {}
+    text = match.group(0).rstrip().rstrip(",")
     try:
-        response = evaluator.chat_text(prompt)
-        return 1 if "YES" in response.strip().upper() else 0
-    except Exception as e:
-        return 0
+        data = json.loads(text if text.endswith("}") else text + "}")
+    except json.JSONDecodeError:
+        return {}
+    if not isinstance(data, dict):
+        return {}
+
+    verdicts = {}
+    for name in criteria:
+        value = data.get(name)
+        if isinstance(value, bool):
+            verdicts[name] = int(value)
+        elif isinstance(value, str) and value.strip().upper() in ("YES", "NO"):
+            verdicts[name] = 1 if value.strip().upper() == "YES" else 0
+    return verdicts
+
+
+def judge_single_prompt_static(
+    predicted_answer: str, ground_truth: Dict[str, Any], key_points: List[str], evaluator
+) -> Tuple[int, List[int]]:
+    """
+    Grade the ideal-answer match and every key point with one judge call.
+
+    Criteria the response does not settle are judged with the per-criterion prompts instead.
+
+    Returns:
+        (freetext verdict, one verdict per key point)
+    """
+    criteria = judge_criteria(ground_truth, key_points)
+    verdicts = cached_criterion_verdicts(criteria, predicted_answer)
+    pending = {name: criterion for name, criterion in criteria.items() if name not in verdicts}
+    if pending:
+        try:
+            prompt = multi_criterion_judge_prompt(predicted_answer, pending)
+            response = evaluator.chat_text(prompt, profile="judge_multi")
+            parsed = parse_multi_criterion_verdict(response, pending)
+            store_criterion_verdicts(pending, predicted_answer, response, parsed)
+            verdicts.update(parsed)
+        except Exception as e:
+            logger.warning(f"Single-prompt judgement failed, falling back to per-criterion judging: {e}")
+        if len(verdicts) < len(criteria):
+            missing = len(criteria) - len(verdicts)
+            logger.debug(f"Single-prompt judgement incomplete, judging {missing} criteria one by one")
+
+    if "ideal_answer" in verdicts:
+        freetext_acc = verdicts["ideal_answer"]
+    else:
+        freetext_acc = evaluate_freetext_accuracy_static(predicted_answer, ground_truth, evaluator)
+    key_point_verdicts = []
+    for i, key_point in enumerate(key_points, 1):
+        name = f"key_point_{i}"
+        if name in verdicts:
+            key_point_verdicts.append(verdicts[name])
+        else:
+            key_point_verdicts.append(evaluate_scoring_point_static(predicted_answer, key_point, evaluator))
+    return freetext_acc, key_point_verdicts
 
 
 def evaluate_easy_question_static(
-    result: Dict[str, Any], ground_truth: Dict[str, Any], evaluator
+    result: Dict[str, Any], ground_truth: Dict[str, Any], evaluator, single_prompt: bool = False
 ) -> Dict[str, Any]:
     """Static function to evaluate an easy question result."""
     evaluation = {
@@ -215,18 +835,26 @@ def evaluate_easy_question_static(
     predicted_choice = result.get("choice", "")
     evaluation["choice_acc"] = evaluate_choice_accuracy_static(predicted_choice, ground_truth)
 
-    # Freetext accuracy
     predicted_answer = result.get("answer", "")
+    key_points = ground_truth.get("evaluation_criteria", {}).get("key_points", [])
+    if single_prompt:
+        evaluation["freetext_acc"], key_point_verdicts = judge_single_prompt_static(
+            predicted_answer, ground_truth, key_points, evaluator
+        )
+        evaluation["scoring_point"] = max(key_point_verdicts, default=0)
+        return evaluation
+
+    # Freetext accuracy
     evaluation["freetext_acc"] = evaluate_freetext_accuracy_static(predicted_answer, ground_truth, evaluator)
 
     # Scoring point - for easy questions, there should be one key point
-    key_points = ground_truth.get("evaluation_criteria", {}).get("key_points", [])
     if key_points:
         # For easy questions, evaluate if the answer addresses the key point(s)
         scoring_point = 0
         for key_point in key_points:
-            if evaluate_scoring_point_static(predicted_answer, key_point, evaluator):
-                scoring_point = 1
+            # The best key point counts (a soft logprob judge scores with its probability)
+            scoring_point = max(scoring_point, evaluate_scoring_point_static(predicted_answer, key_point, evaluator))
+            if scoring_point == 1:
                 break  # If any key point is satisfied, mark as 1
         evaluation["scoring_point"] = scoring_point
     else:
@@ -236,7 +864,7 @@ def evaluate_easy_question_static(
 
 
 def evaluate_hard_question_static(
-    result: Dict[str, Any], ground_truth: Dict[str, Any], evaluator
+    result: Dict[str, Any], ground_truth: Dict[str, Any], evaluator, single_prompt: bool = False
 ) -> Dict[str, Any]:
     """Static function to evaluate a hard question result."""
     evaluation = {
@@ -249,12 +877,21 @@ def evaluate_hard_question_static(
     predicted_choice = result.get("choice", "")
     evaluation["choice_acc"] = evaluate_choice_accuracy_static(predicted_choice, ground_truth)
 
-    # Freetext accuracy
     predicted_answer = result.get("answer", "")
+    key_points = ground_truth.get("evaluation_criteria", {}).get("key_points", [])
+    if single_prompt:
+        # Long-term and short-term key points; none are judged if either is missing
+        key_points = key_points[:2] if len(key_points) >= 2 else []
+        evaluation["freetext_acc"], key_point_verdicts = judge_single_prompt_static(
+            predicted_answer, ground_truth, key_points, evaluator
+        )
+        evaluation["scoring_point_long"], evaluation["scoring_point_short"] = key_point_verdicts or (0, 0)
+        return evaluation
+
+    # Freetext accuracy
     evaluation["freetext_acc"] = evaluate_freetext_accuracy_static(predicted_answer, ground_truth, evaluator)
 
     # Scoring points - for hard questions, there should be two key points
-    key_points = ground_truth.get("evaluation_criteria", {}).get("key_points", [])
     if len(key_points) >= 2:
         # First key point (long-term information)
         evaluation["scoring_point_long"] = evaluate_scoring_point_static(
@@ -271,14 +908,355 @@ def evaluate_hard_question_static(
     return evaluation
 
 
+async def achat_judge(prompt: str, evaluator, semaphore: asyncio.Semaphore, profile: str = "judge") -> str:
+    """One judge call under the global concurrency limit; synchronous backends run in a worker thread."""
+    async with semaphore:
+        if hasattr(evaluator, "achat_text"):
+            return await evaluator.achat_text(prompt, profile=profile)
+        return await asyncio.to_thread(evaluator.chat_text, prompt, profile=profile)
+
+
+async def achat_yes_probability(prompt: str, evaluator, semaphore: asyncio.Semaphore) -> float:
+    """One logprob judge call under the global concurrency limit (see LogprobJudge)."""
+    async with semaphore:
+        if hasattr(evaluator, "achat_yes_probability"):
+            return await evaluator.achat_yes_probability(prompt)
+        return await asyncio.to_thread(evaluator.chat_yes_probability, prompt)
+
+
+async def ajudge_verdict(
+    prompt: str, evaluator, semaphore: asyncio.Semaphore, criterion: str, reference: str, predicted_answer: str
+) -> float:
+    """Async counterpart of judge_verdict."""
+    verdict = await off_event_loop(known_verdict, criterion, reference, predicted_answer)
+    if verdict is not None:
+        return verdict
+    try:
+        if _logprob_judge is not None:
+            response = await achat_yes_probability(prompt, evaluator, semaphore)
+        else:
+            response = await achat_judge(prompt, evaluator, semaphore)
+    except Exception as e:
+        return 0
+    return await off_event_loop(record_verdict, criterion, reference, predicted_answer, response)
+
+
+async def aevaluate_freetext_accuracy_static(
+    predicted_answer: str, ground_truth: Dict[str, Any], evaluator, semaphore: asyncio.Semaphore
+) -> int:
+    """Async counterpart of evaluate_freetext_accuracy_static."""
+    ideal_answer = ground_truth.get("evaluation_criteria", {}).get("ideal_answer", "")
+    if not ideal_answer:
+        return 0
+    prompt = freetext_judge_prompt(ideal_answer, predicted_answer)
+    return await ajudge_verdict(prompt, evaluator, semaphore, "ideal_answer", ideal_answer, predicted_answer)
+
+
+async def aevaluate_scoring_point_static(
+    predicted_answer: str, key_point: str, evaluator, semaphore: asyncio.Semaphore
+) -> int:
+    """Async counterpart of evaluate_scoring_point_static."""
+    prompt = scoring_point_judge_prompt(predicted_answer, key_point)
+    return await ajudge_verdict(prompt, evaluator, semaphore, "key_point", key_point, predicted_answer)
+
+
+async def ajudge_single_prompt_static(
+    predicted_answer: str,
+    ground_truth: Dict[str, Any],
+    key_points: List[str],
+    evaluator,
+    semaphore: asyncio.Semaphore,
+) -> List[int]:
+    """Async counterpart of judge_single_prompt_static, returning [freetext verdict, *key point verdicts]."""
+    criteria = judge_criteria(ground_truth, key_points)
+    verdicts = await off_event_loop(cached_criterion_verdicts, criteria, predicted_answer)
+    pending = {name: criterion for name, criterion in criteria.items() if name not in verdicts}
+    if pending:
+        try:
+            prompt = multi_criterion_judge_prompt(predicted_answer, pending)
+            response = await achat_judge(prompt, evaluator, semaphore, profile="judge_multi")
+            parsed = parse_multi_criterion_verdict(response, pending)
+            await off_event_loop(store_criterion_verdicts, pending, predicted_answer, response, parsed)
+            verdicts.update(parsed)
+        except Exception as e:
+            logger.warning(f"Single-prompt judgement failed, falling back to per-criterion judging: {e}")
+        if len(verdicts) < len(criteria):
+            missing = len(criteria) - len(verdicts)
+            logger.debug(f"Single-prompt judgement incomplete, judging {missing} criteria one by one")
+
+    async def freetext_verdict() -> int:
+        if "ideal_answer" in verdicts:
+            return verdicts["ideal_answer"]
+        return await aevaluate_freetext_accuracy_static(predicted_answer, ground_truth, evaluator, semaphore)
+
+    async def key_point_verdict(i: int, key_point: str) -> int:
+        if f"key_point_{i}" in verdicts:
+            return verdicts[f"key_point_{i}"]
+        return await aevaluate_scoring_point_static(predicted_answer, key_point, evaluator, semaphore)
+
+    return list(
+        await asyncio.gather(
+            freetext_verdict(), *[key_point_verdict(i, kp) for i, kp in enumerate(key_points, 1)]
+        )
+    )
+
+
+async def aevaluate_question_static(
+    result: Dict[str, Any],
+    ground_truth: Dict[str, Any],
+    evaluator,
+    semaphore: asyncio.Semaphore,
+    single_prompt: bool = False,
+) -> Dict[str, Any]:
+    """
+    Async counterpart of evaluate_easy_question_static / evaluate_hard_question_static.
+
+    All judge calls of the result are issued at once. For easy questions every key point is judged
+    (instead of stopping at the first one satisfied), which gives the same score with lower latency.
+    """
+    if result["difficulty"] not in ("easy", "hard"):
+        raise ValueError(f"Unknown difficulty: {result['difficulty']}")
+    evaluation = {
+        "concept_id": result["concept_id"],
+        "question_id": result["question_id"],
+        "difficulty": result["difficulty"],
+    }
+    evaluation["choice_acc"] = evaluate_choice_accuracy_static(result.get("choice", ""), ground_truth)
+
+    predicted_answer = result.get("answer", "")
+    key_points = ground_truth.get("evaluation_criteria", {}).get("key_points", [])
+    if result["difficulty"] == "hard":
+        # First key point: long-term information, second: short-term information
+        key_points = key_points[:2] if len(key_points) >= 2 else []
+
+    if single_prompt:
+        verdicts = await ajudge_single_prompt_static(
+            predicted_answer, ground_truth, key_points, evaluator, semaphore
+        )
+    else:
+        verdicts = await asyncio.gather(
+            aevaluate_freetext_accuracy_static(predicted_answer, ground_truth, evaluator, semaphore),
+            *[aevaluate_scoring_point_static(predicted_answer, kp, evaluator, semaphore) for kp in key_points],
+        )
+    evaluation["freetext_acc"] = verdicts[0]
+    if result["difficulty"] == "easy":
+        evaluation["scoring_point"] = max(verdicts[1:], default=0)
+    elif key_points:
+        evaluation["scoring_point_long"], evaluation["scoring_point_short"] = verdicts[1:]
+    else:
+        evaluation["scoring_point_long"] = 0
+        evaluation["scoring_point_short"] = 0
+    return evaluation
+
+
+async def aevaluate_single_result(
+    result: Dict[str, Any],
+    concept_data: Dict[str, Any],
+    evaluator,
+    semaphore: asyncio.Semaphore,
+    single_prompt: bool = False,
+):
+    """Async counterpart of evaluate_single_result."""
+    try:
+        ground_truth, error = lookup_ground_truth(concept_data, result)
+        if error:
+            return None, error
+        evaluation = await aevaluate_question_static(result, ground_truth, evaluator, semaphore, single_prompt)
+        return evaluation, None
+    except Exception as e:
+        return (
+            None,
+            f"Error evaluating {result.get('concept_id', 'unknown')}/{result.get('question_id', 'unknown')}: {str(e)}",
+        )
+
+
+class EvaluationStats:
+    """
+    Running score sums and counts per difficulty, kept in the parent process: adding an evaluation
+    and computing the current means are O(1), whatever the number of evaluations.
+    """
+
+    METRICS = {
+        "easy": ("choice_acc", "freetext_acc", "scoring_point"),
+        "hard": ("choice_acc", "freetext_acc", "scoring_point_long", "scoring_point_short"),
+    }
+
+    def __init__(self, evaluations: Optional[List[Dict[str, Any]]] = None):
+        self.counts = {difficulty: 0 for difficulty in self.METRICS}
+        self.sums = {
+            difficulty: {metric: 0 for metric in metrics} for difficulty, metrics in self.METRICS.items()
+        }
+        for evaluation in evaluations or []:
+            self.add(evaluation)
+
+    @classmethod
+    def from_sums(cls, metric_sums: Dict[str, Dict[str, Any]]) -> "EvaluationStats":
+        """Stats from the aggregate query of a ResultsStore (ResultsStore.metric_sums), without a scan."""
+        stats = cls()
+        for difficulty, values in metric_sums.items():
+            if difficulty not in cls.METRICS:
+                continue
+            stats.counts[difficulty] = values["count"]
+            for metric in cls.METRICS[difficulty]:
+                stats.sums[difficulty][metric] = values["sums"][metric]
+        return stats
+
+    def add(self, evaluation: Dict[str, Any]):
+        """Count a judged evaluation (phase-1 rows, whose judge metrics are still null, are skipped)."""
+        difficulty = evaluation["difficulty"]
+        if difficulty not in self.METRICS or not is_judged(evaluation):
+            return
+        self.counts[difficulty] += 1
+        sums = self.sums[difficulty]
+        for metric in self.METRICS[difficulty]:
+            sums[metric] += evaluation[metric]
+
+    def remove(self, evaluation: Dict[str, Any]):
+        """Take back an evaluation that has been superseded by a newer one for the same question."""
+        difficulty = evaluation["difficulty"]
+        if difficulty not in self.METRICS or not is_judged(evaluation):
+            return
+        self.counts[difficulty] -= 1
+        sums = self.sums[difficulty]
+        for metric in self.METRICS[difficulty]:
+            sums[metric] -= evaluation[metric]
+
+    def count(self, difficulty: str) -> int:
+        return self.counts[difficulty]
+
+    def mean(self, difficulty: str, metric: str) -> float:
+        return self.sums[difficulty][metric] / self.counts[difficulty] if self.counts[difficulty] else 0.0
+
+    def progress(self, current: int, total: int) -> str:
+        """Progress line with the running scores."""
+        progress_pct = (current / total) * 100
+        stats_msg = f"Progress: {current}/{total} ({progress_pct:.1f}%)"
+
+        if self.count("easy") > 0:
+            s_ca, s_fa, s_sp = (self.mean("easy", metric) for metric in self.METRICS["easy"])
+            stats_msg += f" | Easy({self.count('easy')}): CA={s_ca:.3f} FA={s_fa:.3f} SP={s_sp:.3f}"
+
+        if self.count("hard") > 0:
+            h_ca, h_fa, h_spl, h_sps = (self.mean("hard", metric) for metric in self.METRICS["hard"])
+            stats_msg += f" | Hard({self.count('hard')}): CA={h_ca:.3f} FA={h_fa:.3f} SPL={h_spl:.3f} SPS={h_sps:.3f}"
+
+        return stats_msg
+
+
+JUDGED_METRICS = ("freetext_acc", "scoring_point", "scoring_point_long", "scoring_point_short")
+
+
+def is_judged(evaluation: Dict[str, Any]) -> bool:
+    """False for a phase-1 row, which only has its choice accuracy so far."""
+    return evaluation.get("freetext_acc") is not None
+
+
+def choice_row(result: Dict[str, Any], choice_acc: int) -> Dict[str, Any]:
+    """Phase-1 evaluation row of a result: its choice accuracy, with the judge metrics still null."""
+    row = {
+        "concept_id": result["concept_id"],
+        "question_id": result["question_id"],
+        "difficulty": result["difficulty"],
+        "choice_acc": choice_acc,
+    }
+    for metric in EvaluationStats.METRICS.get(result["difficulty"], ())[1:]:
+        row[metric] = None
+    return row
+
+
+def fill_judge_columns(row: Optional[Dict[str, Any]], evaluation: Dict[str, Any]) -> Dict[str, Any]:
+    """Phase-2 row: the phase-1 row of the question with the judge metrics of `evaluation` filled in."""
+    if row is None:
+        return evaluation
+    return {**row, **{metric: evaluation[metric] for metric in JUDGED_METRICS if metric in evaluation}}
+
+
+def judge_agreement(
+    evaluations: Dict[Tuple[str, int, str], Dict[str, Any]],
+    reference: Dict[Tuple[str, int, str], Dict[str, Any]],
+) -> Dict[str, Dict[str, float]]:
+    """
+    Per-metric agreement of two sets of evaluations of the same results (e.g. single-prompt vs.
+    per-criterion judging): raw agreement, Cohen's kappa and both mean scores.
+    """
+    report = {}
+    common = evaluations.keys() & reference.keys()
+    for metric in JUDGED_METRICS:
+        pairs = [
+            (evaluations[key][metric], reference[key][metric])
+            for key in common
+            if metric in evaluations[key] and metric in reference[key]
+        ]
+        if not pairs:
+            continue
+        n = len(pairs)
+        observed = sum(a == b for a, b in pairs) / n
+        mean_a = sum(a for a, _ in pairs) / n
+        mean_b = sum(b for _, b in pairs) / n
+        expected = mean_a * mean_b + (1 - mean_a) * (1 - mean_b)
+        kappa = (observed - expected) / (1 - expected) if expected < 1 else 1.0
+        report[metric] = {
+            "n": n,
+            "agreement": observed,
+            "kappa": kappa,
+            "mean": mean_a,
+            "reference_mean": mean_b,
+        }
+    return report
+
+
 class ConceptEvaluator:
-    def __init__(self, model_id: str = "Qwen/Qwen2.5-72B-Instruct"):
-        """Initialize the evaluator with an LLM for freetext evaluation."""
+    def __init__(
+        self,
+        model_id: str = "Qwen/Qwen2.5-72B-Instruct",
+        single_prompt_judge: bool = False,
+        verdict_cache: Optional[str] = None,
+        logprob_judge: Optional[LogprobJudge] = None,
+        pre_judge: Optional[PreJudge] = None,
+        run_id: str = "",
+    ):
+        """
+        Initialize the evaluator with an LLM for freetext evaluation.
+
+        Args:
+            model_id: Judge model
+            single_prompt_judge: Grade the ideal answer and all key points of a result in one judge call
+                (per-criterion calls are kept as the fallback when the response cannot be parsed)
+            verdict_cache: Database file of the persistent judge-verdict cache (None: no cache)
+            logprob_judge: Judge each criterion from P(YES) of a single decode step (None: generated replies)
+            pre_judge: Settle clear-cut criteria by answer/reference similarity before the judge (None: off)
+            run_id: Run id of the results read from a results store input, and of the evaluations written
+                to a results store output
+        """
+        if single_prompt_judge and logprob_judge is not None:
+            raise ValueError("Logprob judging scores one criterion per call and excludes single-prompt judging")
         self.model_id = model_id
-        self.evaluator = MLLMFactory(model_id)
+        self.single_prompt_judge = single_prompt_judge
+        self.verdict_cache = JudgeVerdictCache(verdict_cache, model_id) if verdict_cache else None
+        set_verdict_cache(self.verdict_cache)
+        self.logprob_judge = logprob_judge
+        set_logprob_judge(logprob_judge)
+        self.pre_judge = pre_judge
+        set_pre_judge(pre_judge)
+        self.run_id = run_id
+        # Open ResultsStore per input / output path ending in .sqlite or .db
+        self._stores: Dict[str, ResultsStore] = {}
+        self._evaluator = None
         self.concept_data = {}
         self.load_all_concepts()
 
+    @property
+    def evaluator(self):
+        """Judge model, built on first use: choice accuracy and the process pool's parent never need it."""
+        if self._evaluator is None:
+            self._evaluator = MLLMFactory(self.model_id)
+        return self._evaluator
+
+    def results_store(self, path: str) -> ResultsStore:
+        if path not in self._stores:
+            self._stores[path] = ResultsStore(path)
+        return self._stores[path]
+
     def load_all_concepts(self):
         """Load all concept data from data/concept directory."""
         self.concept_data = load_all_concepts()
@@ -315,11 +1293,11 @@ class ConceptEvaluator:
 
     def evaluate_easy_question(self, result: Dict[str, Any], ground_truth: Dict[str, Any]) -> Dict[str, Any]:
         """Evaluate an easy question result."""
-        return evaluate_easy_question_static(result, ground_truth, self.evaluator)
+        return evaluate_easy_question_static(result, ground_truth, self.evaluator, self.single_prompt_judge)
 
     def evaluate_hard_question(self, result: Dict[str, Any], ground_truth: Dict[str, Any]) -> Dict[str, Any]:
         """Evaluate a hard question result."""
-        return evaluate_hard_question_static(result, ground_truth, self.evaluator)
+        return evaluate_hard_question_static(result, ground_truth, self.evaluator, self.single_prompt_judge)
 
     def filter_latest_results(self, results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """Filter results to keep only the latest for each (concept_id, question_id, difficulty) combination."""
@@ -336,10 +1314,27 @@ class ConceptEvaluator:
 
         return filtered_results
 
-    def load_existing_evaluations(self, output_file: str) -> Dict[Tuple[str, int, str], Dict[str, Any]]:
-        """Load existing evaluation results from output file if it exists."""
+    def load_existing_evaluations(
+        self, output_file: str, judged_only: bool = True
+    ) -> Dict[Tuple[str, int, str], Dict[str, Any]]:
+        """
+        Load existing evaluation results from output file if it exists.
+
+        Args:
+            output_file: Evaluation JSONL file or results store
+            judged_only: Leave out the phase-1 rows whose judge metrics are still null
+        """
         existing_evaluations = {}
 
+        if is_results_store(output_file):
+            for evaluation in self.results_store(output_file).latest("evaluations", run_id=self.run_id):
+                if judged_only and not is_judged(evaluation):
+                    continue
+                key = (evaluation["concept_id"], evaluation["question_id"], evaluation["difficulty"])
+                existing_evaluations[key] = evaluation
+            logger.info(f"Loaded {len(existing_evaluations)} existing evaluations from {output_file}")
+            return existing_evaluations
+
         if not Path(output_file).exists():
             logger.info("No existing evaluation file found, starting fresh")
             return existing_evaluations
@@ -352,6 +1347,13 @@ class ConceptEvaluator:
                         evaluation = json.loads(line)
                         key = (evaluation["concept_id"], evaluation["question_id"], evaluation["difficulty"])
                         existing_evaluations[key] = evaluation
+            if judged_only:
+                # The last row of a question wins, judged or not
+                existing_evaluations = {
+                    key: evaluation
+                    for key, evaluation in existing_evaluations.items()
+                    if is_judged(evaluation)
+                }
 
             logger.info(f"Loaded {len(existing_evaluations)} existing evaluations from {output_file}")
         except Exception as e:
@@ -362,6 +1364,11 @@ class ConceptEvaluator:
     def save_evaluation_incrementally(self, evaluation: Dict[str, Any], output_file: str, file_lock: Lock):
         """Save a single evaluation result incrementally with thread safety."""
         try:
+            if is_results_store(output_file):
+                # Upsert: a re-evaluated question replaces its row
+                self.results_store(output_file).upsert("evaluations", evaluation, self.run_id)
+                return
+
             # Ensure directory exists
             output_path = Path(output_file)
             output_path.parent.mkdir(parents=True, exist_ok=True)
@@ -373,10 +1380,92 @@ class ConceptEvaluator:
         except Exception as e:
             logger.error(f"Error saving evaluation incrementally: {e}")
 
-    def evaluate_results(self, input_file: str, output_file: str):
-        """Main evaluation function with multiprocessing support."""
+    def save_choice_rows(self, rows: List[Dict[str, Any]], output_file: str):
+        """Write the phase-1 rows in one go, before any judge call, so an interrupted run keeps them."""
+        if not rows:
+            return
+        try:
+            if is_results_store(output_file):
+                self.results_store(output_file).upsert_many("evaluations", rows, self.run_id)
+                return
+            output_path = Path(output_file)
+            output_path.parent.mkdir(parents=True, exist_ok=True)
+            with open(output_file, "a", encoding="utf-8") as f:
+                f.writelines(json.dumps(row, ensure_ascii=False) + "\n" for row in rows)
+        except Exception as e:
+            logger.error(f"Error saving choice accuracies: {e}")
+
+    def load_pending_results(
+        self, input_file: str, output_file: str
+    ) -> Optional[Tuple[List[Dict[str, Any]], EvaluationStats, Dict[Tuple[str, int, str], Dict[str, Any]]]]:
+        """
+        Load the latest result per question and run phase 1: report the choice accuracy and write a
+        row with it (judge metrics null) to `output_file` for every question that has no row yet. Phase 2
+        judges the results whose row is missing or still has null judge metrics, and fills those in.
+
+        Returns:
+            (results still to judge, statistics of the existing judged evaluations, phase-1 row per
+            question still to judge), or None if the input cannot be read
+        """
+        filtered_results = self.load_latest_results(input_file)
+        if filtered_results is None:
+            return None
+
+        choice_accuracy = self.evaluate_choice_phase(filtered_results)
+
+        if is_results_store(output_file):
+            # Indexed lookup per result, and the statistics from an aggregate query
+            store = self.results_store(output_file)
+            existing_evaluations = {}
+            for result in filtered_results:
+                key = (result["concept_id"], result["question_id"], result["difficulty"])
+                evaluation = store.get("evaluations", *key, run_id=self.run_id)
+                if evaluation is not None:
+                    existing_evaluations[key] = evaluation
+            stats = EvaluationStats.from_sums(store.metric_sums(self.run_id))
+        else:
+            # Load existing evaluations to support resume
+            existing_evaluations = self.load_existing_evaluations(output_file, judged_only=False)
+            stats = EvaluationStats(list(existing_evaluations.values()))
+
+        remaining_results = []
+        choice_rows = {}
+        new_rows = []
+        for result in filtered_results:
+            key = (result["concept_id"], result["question_id"], result["difficulty"])
+            evaluation = existing_evaluations.get(key)
+            if evaluation is not None and is_judged(evaluation):
+                continue
+            remaining_results.append(result)
+            if evaluation is not None:
+                # Phase-1 row of an interrupted run: filled in as it is
+                choice_rows[key] = evaluation
+            elif key in choice_accuracy:
+                choice_rows[key] = choice_row(result, choice_accuracy[key])
+                new_rows.append(choice_rows[key])
+        self.save_choice_rows(new_rows, output_file)
+
+        logger.info(f"Found {stats.count('easy') + stats.count('hard')} existing evaluations")
+        logger.info(f"Remaining to evaluate: {len(remaining_results)} results")
+
+        return remaining_results, stats, choice_rows
+
+    def load_latest_results(self, input_file: str) -> Optional[List[Dict[str, Any]]]:
+        """Load the results JSONL and keep the latest result per question (None if it cannot be read)."""
         logger.info(f"Loading results from {input_file}")
 
+        if is_results_store(input_file):
+            # The store selects the latest row per question of this run itself
+            try:
+                filtered_results = self.results_store(input_file).latest("results", self.run_id)
+            except Exception as e:
+                logger.error(f"Error loading results store {input_file}: {e}")
+                return None
+            if not filtered_results:
+                logger.warning(f"No results of run {self.run_id!r} in {input_file}")
+            logger.info(f"Loaded {len(filtered_results)} unique results of run {self.run_id!r}")
+            return filtered_results
+
         # Load all results from JSONL file
         results = []
         try:
@@ -387,74 +1476,86 @@ class ConceptEvaluator:
                         results.append(json.loads(line))
         except Exception as e:
             logger.error(f"Error loading input file {input_file}: {e}")
-            return
+            return None
 
         logger.info(f"Loaded {len(results)} results")
 
         # Filter to keep only latest results
         filtered_results = self.filter_latest_results(results)
         logger.info(f"After filtering, have {len(filtered_results)} unique results")
+        return filtered_results
 
-        # Load existing evaluations to support resume
-        existing_evaluations = self.load_existing_evaluations(output_file)
+    def evaluate_choice_phase(self, results: List[Dict[str, Any]]) -> Dict[Tuple[str, int, str], int]:
+        """
+        Phase 1: choice accuracy of every result, logged before any judge call. load_pending_results
+        writes it to the output as well, and the judge phase fills in the rest of those rows, so both
+        phases agree (a missing choice is a random guess, drawn once).
+
+        Returns:
+            dict: (concept_id, question_id, difficulty) -> choice accuracy, for results with ground truth
+        """
+        accuracy, found = evaluate_choice_accuracies(results, self.concept_data)
+        difficulties = np.array([result["difficulty"] for result in results], dtype=str)
+
+        logger.info("=== CHOICE ACCURACY (judge phase pending) ===")
+        for difficulty in ("easy", "hard"):
+            mask = found & (difficulties == difficulty)
+            if mask.any():
+                logger.info(f"{difficulty.capitalize()} (n={int(mask.sum())}): CA={accuracy[mask].mean():.3f}")
+            else:
+                logger.info(f"{difficulty.capitalize()}: No data")
 
-        # Filter out already evaluated results
-        remaining_results = []
-        for result in filtered_results:
-            key = (result["concept_id"], result["question_id"], result["difficulty"])
-            if key not in existing_evaluations:
-                remaining_results.append(result)
+        return {
+            (result["concept_id"], result["question_id"], result["difficulty"]): int(accuracy[i])
+            for i, result in enumerate(results)
+            if found[i]
+        }
 
-        logger.info(f"Found {len(existing_evaluations)} existing evaluations")
-        logger.info(f"Remaining to evaluate: {len(remaining_results)} results")
+    def evaluate_choices_only(self, input_file: str):
+        """Phase 1 alone: choice accuracy of the latest results, without judging."""
+        results = self.load_latest_results(input_file)
+        if results is not None:
+            self.evaluate_choice_phase(results)
+
+    def evaluate_results(self, input_file: str, output_file: str):
+        """Main evaluation function with multiprocessing support."""
+        pending = self.load_pending_results(input_file, output_file)
+        if pending is None:
+            return
+        remaining_results, stats, choice_rows = pending
 
         if not remaining_results:
             logger.info("All results have already been evaluated!")
             # Still calculate and display statistics from existing evaluations
-            all_evaluations = list(existing_evaluations.values())
-            self.calculate_final_statistics(all_evaluations)
+            self.calculate_statistics(stats)
             return
 
-        # Initialize shared statistics
-        manager = Manager()
-        easy_stats = manager.dict(
-            {"choice_acc": manager.list(), "freetext_acc": manager.list(), "scoring_point": manager.list()}
-        )
-        hard_stats = manager.dict(
-            {
-                "choice_acc": manager.list(),
-                "freetext_acc": manager.list(),
-                "scoring_point_long": manager.list(),
-                "scoring_point_short": manager.list(),
-            }
-        )
-        file_lock = manager.Lock()
-
-        # Initialize stats from existing evaluations
-        for evaluation in existing_evaluations.values():
-            if evaluation["difficulty"] == "easy":
-                easy_stats["choice_acc"].append(evaluation["choice_acc"])
-                easy_stats["freetext_acc"].append(evaluation["freetext_acc"])
-                easy_stats["scoring_point"].append(evaluation["scoring_point"])
-            elif evaluation["difficulty"] == "hard":
-                hard_stats["choice_acc"].append(evaluation["choice_acc"])
-                hard_stats["freetext_acc"].append(evaluation["freetext_acc"])
-                hard_stats["scoring_point_long"].append(evaluation["scoring_point_long"])
-                hard_stats["scoring_point_short"].append(evaluation["scoring_point_short"])
-
-        # Prepare arguments for multiprocessing
-        args_list = [(result, self.concept_data, self.model_id) for result in remaining_results]
-
-        # Use multiprocessing with 5 workers
-        logger.info("Starting multiprocessing evaluation with 5 workers...")
-
-        # Create progress tracking using mp.Value with explicit lock
-        completed_count = mp.Value("i", 0)
-        completed_lock = mp.Lock()
+        # Statistics live in the parent: pool callbacks run on its result-handler thread, one at a time
+        file_lock = threading.Lock()
+
+        # Workers receive the ground truth once, at startup, and only for the concepts still to evaluate;
+        # each task then carries just its result row
+        needed_concepts = {result["concept_id"] for result in remaining_results}
+        worker_concept_data = {
+            concept_id: data for concept_id, data in self.concept_data.items() if concept_id in needed_concepts
+        }
+
+        num_workers = 2
+        logger.info(f"Starting multiprocessing evaluation with {num_workers} workers...")
+
+        # Calibration may have loaded the pre-judge's embedding model, and with it CUDA, which a forked
+        # worker cannot re-initialize: free it here and start the workers fresh when they embed
+        context = mp.get_context()
+        if self.pre_judge is not None and self.pre_judge.embedding_model is not None:
+            self.pre_judge.release_encoder()
+            context = mp.get_context("spawn")
+
+        completed_count = 0
         total_count = len(remaining_results)
 
         def update_progress_and_save(result_tuple):
             """Callback function to handle completed evaluations."""
+            nonlocal completed_count
             evaluation, error = result_tuple
 
             if error:
@@ -464,48 +1565,18 @@ class ConceptEvaluator:
             if evaluation is None:
                 return
 
-            # Update statistics
-            if evaluation["difficulty"] == "easy":
-                easy_stats["choice_acc"].append(evaluation["choice_acc"])
-                easy_stats["freetext_acc"].append(evaluation["freetext_acc"])
-                easy_stats["scoring_point"].append(evaluation["scoring_point"])
-            elif evaluation["difficulty"] == "hard":
-                hard_stats["choice_acc"].append(evaluation["choice_acc"])
-                hard_stats["freetext_acc"].append(evaluation["freetext_acc"])
-                hard_stats["scoring_point_long"].append(evaluation["scoring_point_long"])
-                hard_stats["scoring_point_short"].append(evaluation["scoring_point_short"])
+            # Fill in the judge metrics of the phase-1 row, and update statistics
+            key = (evaluation["concept_id"], evaluation["question_id"], evaluation["difficulty"])
+            evaluation = fill_judge_columns(choice_rows.get(key), evaluation)
+            stats.add(evaluation)
 
             # Save evaluation incrementally
             self.save_evaluation_incrementally(evaluation, output_file, file_lock)
 
-            # Update progress
-            with completed_lock:
-                completed_count.value += 1
-                current = completed_count.value
-
-                # Print progress every 10 completions or at the end
-                if current % 10 == 0 or current == total_count:
-                    progress_pct = (current / total_count) * 100
-
-                    # Calculate current stats
-                    stats_msg = f"Progress: {current}/{total_count} ({progress_pct:.1f}%)"
-
-                    if len(easy_stats["choice_acc"]) > 0:
-                        s_ca = sum(easy_stats["choice_acc"]) / len(easy_stats["choice_acc"])
-                        s_fa = sum(easy_stats["freetext_acc"]) / len(easy_stats["freetext_acc"])
-                        s_sp = sum(easy_stats["scoring_point"]) / len(easy_stats["scoring_point"])
-                        stats_msg += f" | Easy({len(easy_stats['choice_acc'])}): CA={s_ca:.3f} FA={s_fa:.3f} SP={s_sp:.3f}"
-
-                    if len(hard_stats["choice_acc"]) > 0:
-                        h_ca = sum(hard_stats["choice_acc"]) / len(hard_stats["choice_acc"])
-                        h_fa = sum(hard_stats["freetext_acc"]) / len(hard_stats["freetext_acc"])
-                        h_spl = sum(hard_stats["scoring_point_long"]) / len(hard_stats["scoring_point_long"])
-                        h_sps = sum(hard_stats["scoring_point_short"]) / len(
-                            hard_stats["scoring_point_short"]
-                        )
-                        stats_msg += f" | Hard({len(hard_stats['choice_acc'])}): CA={h_ca:.3f} FA={h_fa:.3f} SPL={h_spl:.3f} SPS={h_sps:.3f}"
-
-                    logger.info(stats_msg)
+            # Update progress; print it every 10 completions or at the end
+            completed_count += 1
+            if completed_count % 10 == 0 or completed_count == total_count:
+                logger.info(stats.progress(completed_count, total_count))
 
         # Execute multiprocessing with better error handling
         def signal_handler(signum, frame):
@@ -515,11 +1586,22 @@ class ConceptEvaluator:
         original_handler = signal.signal(signal.SIGINT, signal_handler)
 
         try:
-            with mp.Pool(processes=2) as pool:
+            with context.Pool(
+                processes=num_workers,
+                initializer=init_evaluation_worker,
+                initargs=(
+                    worker_concept_data,
+                    self.model_id,
+                    self.single_prompt_judge,
+                    self.verdict_cache,
+                    self.logprob_judge,
+                    self.pre_judge,
+                ),
+            ) as pool:
                 # Submit all tasks
                 results_async = [
-                    pool.apply_async(evaluate_single_result, (args,), callback=update_progress_and_save)
-                    for args in args_list
+                    pool.apply_async(evaluate_single_result, (result,), callback=update_progress_and_save)
+                    for result in remaining_results
                 ]
 
                 # Wait for all tasks to complete with timeout to allow interruption
@@ -549,89 +1631,392 @@ class ConceptEvaluator:
         logger.info(f"Evaluation completed! Results saved to {output_file}")
 
         # Calculate and display final statistics
-        final_easy_stats = {
-            "choice_acc": list(easy_stats["choice_acc"]),
-            "freetext_acc": list(easy_stats["freetext_acc"]),
-            "scoring_point": list(easy_stats["scoring_point"]),
-        }
-        final_hard_stats = {
-            "choice_acc": list(hard_stats["choice_acc"]),
-            "freetext_acc": list(hard_stats["freetext_acc"]),
-            "scoring_point_long": list(hard_stats["scoring_point_long"]),
-            "scoring_point_short": list(hard_stats["scoring_point_short"]),
-        }
+        self.calculate_statistics(stats)
+
+    def evaluate_results_async(self, input_file: str, output_file: str, concurrency: int = 16):
+        """
+        Evaluation on one asyncio event loop: the judge calls of every result are scheduled at once,
+        with at most `concurrency` in flight. Output and resume behave as in evaluate_results.
+        """
+        try:
+            asyncio.run(self._evaluate_results_async(input_file, output_file, concurrency))
+        except KeyboardInterrupt:
+            logger.info("Evaluation interrupted by user")
 
-        self.calculate_statistics(final_easy_stats, final_hard_stats)
+    async def _evaluate_results_async(self, input_file: str, output_file: str, concurrency: int):
+        pending = self.load_pending_results(input_file, output_file)
+        if pending is None:
+            return
+        remaining_results, stats, choice_rows = pending
 
-    def calculate_final_statistics(self, evaluations: List[Dict[str, Any]]):
-        """Calculate final statistics from all evaluations."""
-        easy_stats = {"choice_acc": [], "freetext_acc": [], "scoring_point": []}
-        hard_stats = {
-            "choice_acc": [],
-            "freetext_acc": [],
-            "scoring_point_long": [],
-            "scoring_point_short": [],
-        }
+        if not remaining_results:
+            logger.info("All results have already been evaluated!")
+            self.calculate_statistics(stats)
+            return
+
+        logger.info(f"Starting async evaluation with {concurrency} concurrent judge calls...")
+        semaphore = asyncio.Semaphore(concurrency)
+        file_lock = threading.Lock()
+        tasks = [
+            asyncio.create_task(
+                aevaluate_single_result(
+                    result, self.concept_data, self.evaluator, semaphore, self.single_prompt_judge
+                )
+            )
+            for result in remaining_results
+        ]
+        total_count = len(tasks)
+        try:
+            for current, task in enumerate(asyncio.as_completed(tasks), 1):
+                evaluation, error = await task
+                if error:
+                    logger.warning(f"Evaluation error: {error}")
+                elif evaluation is not None:
+                    key = (evaluation["concept_id"], evaluation["question_id"], evaluation["difficulty"])
+                    evaluation = fill_judge_columns(choice_rows.get(key), evaluation)
+                    stats.add(evaluation)
+                    self.save_evaluation_incrementally(evaluation, output_file, file_lock)
+
+                if current % 10 == 0 or current == total_count:
+                    logger.info(stats.progress(current, total_count))
+        finally:
+            for task in tasks:
+                task.cancel()
 
-        for evaluation in evaluations:
-            if evaluation["difficulty"] == "easy":
-                easy_stats["choice_acc"].append(evaluation["choice_acc"])
-                easy_stats["freetext_acc"].append(evaluation["freetext_acc"])
-                easy_stats["scoring_point"].append(evaluation["scoring_point"])
-            elif evaluation["difficulty"] == "hard":
-                hard_stats["choice_acc"].append(evaluation["choice_acc"])
-                hard_stats["freetext_acc"].append(evaluation["freetext_acc"])
-                hard_stats["scoring_point_long"].append(evaluation["scoring_point_long"])
-                hard_stats["scoring_point_short"].append(evaluation["scoring_point_short"])
+        logger.info(f"Evaluation completed! Results saved to {output_file}")
+        self.calculate_statistics(stats)
+
+    def follow_results(
+        self,
+        input_file: str,
+        output_file: str,
+        concurrency: int = 16,
+        poll_interval: float = 1.0,
+        idle_timeout: float = 600.0,
+    ):
+        """
+        Evaluate a results file while it is still being written (e.g. by `python -m method.main qa`).
+
+        New rows are judged as soon as they are appended, on the asyncio engine. The latest row per
+        (concept_id, question_id, difficulty) wins, as in filter_latest_results: a newer row cancels the
+        pending evaluation of an older one, or is evaluated again and supersedes it in the output file.
+        Rows already in the file at startup are resumed against `output_file` like evaluate_results does.
+        Stops after `idle_timeout` seconds without new rows or pending evaluations (or on Ctrl+C).
+        """
+        try:
+            asyncio.run(
+                self._follow_results(input_file, output_file, concurrency, poll_interval, idle_timeout)
+            )
+        except KeyboardInterrupt:
+            logger.info("Evaluation interrupted by user")
+        if is_results_store(output_file):
+            metric_sums = self.results_store(output_file).metric_sums(self.run_id)
+            self.calculate_statistics(EvaluationStats.from_sums(metric_sums))
+        else:
+            self.calculate_final_statistics(list(self.load_existing_evaluations(output_file).values()))
+
+    async def _follow_results(
+        self, input_file: str, output_file: str, concurrency: int, poll_interval: float, idle_timeout: float
+    ):
+        evaluations = self.load_existing_evaluations(output_file)
+        stats = EvaluationStats(list(evaluations.values()))
+        semaphore = asyncio.Semaphore(concurrency)
+        file_lock = threading.Lock()
+        # In-flight evaluation of the latest row of each question, and the reverse mapping
+        pending: Dict[Tuple[str, int, str], asyncio.Task] = {}
+        pending_keys: Dict[asyncio.Task, Tuple[str, int, str]] = {}
+        completed = 0
+
+        logger.info(f"Following {input_file} with {concurrency} concurrent judge calls...")
+        while not Path(input_file).exists():
+            await asyncio.sleep(poll_interval)
+
+        offset = 0
+        partial = b""
+        first_read = True
+        idle_since = time.monotonic()
+        try:
+            with open(input_file, "rb") as f:
+                while True:
+                    if os.path.getsize(input_file) < offset:
+                        logger.warning(f"{input_file} was truncated, reading it from the start")
+                        offset, partial = 0, b""
+                    f.seek(offset)
+                    data = f.read()
+                    offset += len(data)
+                    # Only complete lines; the writer may be in the middle of one
+                    *lines, partial = (partial + data).split(b"\n")
+
+                    rows = []
+                    for line in lines:
+                        line = line.strip()
+                        if not line:
+                            continue
+                        try:
+                            rows.append(json.loads(line))
+                        except json.JSONDecodeError as e:
+                            logger.warning(f"Skipping invalid line in {input_file}: {e}")
+                    for result in self.filter_latest_results(rows):
+                        key = (result["concept_id"], result["question_id"], result["difficulty"])
+                        if first_read and key in evaluations:
+                            continue
+                        if key in pending:
+                            # Superseded before its verdicts came back
+                            superseded = pending.pop(key)
+                            del pending_keys[superseded]
+                            superseded.cancel()
+                        task = asyncio.create_task(
+                            aevaluate_single_result(
+                                result, self.concept_data, self.evaluator, semaphore, self.single_prompt_judge
+                            )
+                        )
+                        pending[key] = task
+                        pending_keys[task] = key
+                    first_read = False
+
+                    done = set()
+                    if pending:
+                        done, _ = await asyncio.wait(
+                            pending_keys, timeout=poll_interval, return_when=asyncio.FIRST_COMPLETED
+                        )
+                    for task in done:
+                        key = pending_keys.pop(task)
+                        del pending[key]
+                        evaluation, error = task.result()
+                        if error:
+                            logger.warning(f"Evaluation error: {error}")
+                            continue
+                        if evaluation is None:
+                            continue
+                        if key in evaluations:
+                            stats.remove(evaluations[key])
+                        evaluations[key] = evaluation
+                        stats.add(evaluation)
+                        self.save_evaluation_incrementally(evaluation, output_file, file_lock)
+                        completed += 1
+                        if completed % 10 == 0 or not pending:
+                            logger.info(stats.progress(completed, completed + len(pending)))
+
+                    if rows or pending:
+                        idle_since = time.monotonic()
+                    elif time.monotonic() - idle_since >= idle_timeout:
+                        logger.info(f"No new results for {idle_timeout:.0f}s, stopping")
+                        break
+                    if not pending:
+                        await asyncio.sleep(poll_interval)
+        finally:
+            for task in pending.values():
+                task.cancel()
 
-        self.calculate_statistics(easy_stats, hard_stats)
+        logger.info(f"Evaluation completed! Results saved to {output_file}")
 
-    def calculate_statistics(self, easy_stats: Dict[str, List[int]], hard_stats: Dict[str, List[int]]):
+    def report_agreement(self, output_file: str, reference_file: str) -> Dict[str, Dict[str, float]]:
+        """Log the agreement of the evaluations in `output_file` with those in `reference_file`."""
+        report = judge_agreement(
+            self.load_existing_evaluations(output_file), self.load_existing_evaluations(reference_file)
+        )
+        logger.info(f"=== JUDGE AGREEMENT ({output_file} vs {reference_file}) ===")
+        if not report:
+            logger.info("No evaluations in common")
+        for metric, values in report.items():
+            logger.info(
+                f"{metric} (n={values['n']}): agreement={values['agreement']:.3f} kappa={values['kappa']:.3f} "
+                f"mean={values['mean']:.3f} reference_mean={values['reference_mean']:.3f}"
+            )
+        return report
+
+    def calibrate_pre_judge(
+        self, input_file: str, reference_file: str, target_agreement: float = 0.95
+    ) -> Optional[Dict[str, float]]:
+        """
+        Fit the pre-judge thresholds to the judge verdicts of an earlier evaluation of `input_file`
+        (e.g. of a sample of it, without pre-judge) and log how many judge calls they avoid and how often
+        the result agrees with the judge, both cross-validated (see PreJudge.calibrate).
+        """
+        results = self.load_latest_results(input_file)
+        evaluations = self.load_existing_evaluations(reference_file)
+        scored = []
+        for result in results or []:
+            evaluation = evaluations.get((result["concept_id"], result["question_id"], result["difficulty"]))
+            ground_truth, error = lookup_ground_truth(self.concept_data, result)
+            if evaluation is not None and not error:
+                scored.extend(criterion_verdicts(result, ground_truth, evaluation))
+        if not scored:
+            logger.warning(f"No judge verdicts to calibrate the pre-judge on in {reference_file}")
+            return None
+
+        report = self.pre_judge.calibrate(
+            [(reference, answer) for reference, answer, _ in scored],
+            [verdict for _, _, verdict in scored],
+            target_agreement=target_agreement,
+        )
+        accept = "off" if report["accept"] is None else f"{report['accept']:.3f}"
+        reject = "off" if report["reject"] is None else f"{report['reject']:.3f}"
+        logger.info(f"=== PRE-JUDGE CALIBRATION ({reference_file}) ===")
+        logger.info(
+            f"n={report['n']} criteria: accept >= {accept}, reject <= {reject} | cross-validated: "
+            f"judge calls avoided={report['avoided']:.3f} agreement on decided={report['decided_agreement']:.3f} "
+            f"overall agreement={report['agreement']:.3f}"
+        )
+        return report
+
+    def log_pre_judge_stats(self):
+        if self.pre_judge is None:
+            return
+        stats = self.pre_judge.stats()
+        logger.info(
+            f"Pre-judge: {stats['decided']} criteria decided, {stats['forwarded']} sent to the judge "
+            f"({stats['avoided']:.3f} of judge calls avoided)"
+        )
+
+    def log_verdict_cache_stats(self):
+        if self.verdict_cache is None:
+            return
+        stats = self.verdict_cache.stats()
+        logger.info(
+            f"Judge verdict cache: {stats['hits']} hits, {stats['misses']} misses "
+            f"(hit rate {stats['hit_rate']:.3f}), {stats['entries']} entries"
+        )
+
+    def calculate_final_statistics(self, evaluations: List[Dict[str, Any]]):
+        """Calculate final statistics from all evaluations."""
+        self.calculate_statistics(EvaluationStats(evaluations))
+
+    def calculate_statistics(self, stats: EvaluationStats):
         """Calculate and display aggregated statistics."""
 
         # Calculate averages
         logger.info("=== EVALUATION STATISTICS ===")
 
-        if easy_stats["choice_acc"]:
-            easy_choice_avg = sum(easy_stats["choice_acc"]) / len(easy_stats["choice_acc"])
-            easy_freetext_avg = sum(easy_stats["freetext_acc"]) / len(easy_stats["freetext_acc"])
-            easy_scoring_avg = sum(easy_stats["scoring_point"]) / len(easy_stats["scoring_point"])
+        if stats.count("easy"):
+            easy_choice_avg = stats.mean("easy", "choice_acc")
+            easy_freetext_avg = stats.mean("easy", "freetext_acc")
+            easy_scoring_avg = stats.mean("easy", "scoring_point")
 
             logger.info(
-                f"Easy (n={len(easy_stats['choice_acc'])}): CA={easy_choice_avg:.3f} FA={easy_freetext_avg:.3f} SP={easy_scoring_avg:.3f}"
+                f"Easy (n={stats.count('easy')}): CA={easy_choice_avg:.3f} FA={easy_freetext_avg:.3f} SP={easy_scoring_avg:.3f}"
             )
         else:
             logger.info("Easy: No data")
 
-        if hard_stats["choice_acc"]:
-            hard_choice_avg = sum(hard_stats["choice_acc"]) / len(hard_stats["choice_acc"])
-            hard_freetext_avg = sum(hard_stats["freetext_acc"]) / len(hard_stats["freetext_acc"])
-            hard_scoring_long_avg = sum(hard_stats["scoring_point_long"]) / len(
-                hard_stats["scoring_point_long"]
-            )
-            hard_scoring_short_avg = sum(hard_stats["scoring_point_short"]) / len(
-                hard_stats["scoring_point_short"]
-            )
+        if stats.count("hard"):
+            hard_choice_avg = stats.mean("hard", "choice_acc")
+            hard_freetext_avg = stats.mean("hard", "freetext_acc")
+            hard_scoring_long_avg = stats.mean("hard", "scoring_point_long")
+            hard_scoring_short_avg = stats.mean("hard", "scoring_point_short")
 
             logger.info(
-                f"Hard (n={len(hard_stats['choice_acc'])}): CA={hard_choice_avg:.3f} FA={hard_freetext_avg:.3f} SPL={hard_scoring_long_avg:.3f} SPS={hard_scoring_short_avg:.3f}"
+                f"Hard (n={stats.count('hard')}): CA={hard_choice_avg:.3f} FA={hard_freetext_avg:.3f} SPL={hard_scoring_long_avg:.3f} SPS={hard_scoring_short_avg:.3f}"
             )
         else:
             logger.info("Hard: No data")
 
-        if easy_stats["choice_acc"] and hard_stats["choice_acc"]:
+        if stats.count("easy") and stats.count("hard"):
             logger.info(
                 f"{easy_choice_avg * 100:.2f} & {easy_freetext_avg * 100:.2f} & {easy_scoring_avg * 100:.2f} & {hard_choice_avg * 100:.2f} & {hard_freetext_avg * 100:.2f} & {hard_scoring_long_avg * 100:.2f} & {hard_scoring_short_avg * 100:.2f}"
             )
 
+        self.log_verdict_cache_stats()
+        self.log_pre_judge_stats()
+
 
 def main():
     parser = argparse.ArgumentParser(description="Evaluate concept-based Q&A results")
-    parser.add_argument("input_file", help="Input JSONL file with results")
-    parser.add_argument("output_file", help="Output JSONL file for evaluations")
+    parser.add_argument("input_file", help="Input JSONL file with results (or a .sqlite / .db results store)")
+    parser.add_argument("output_file", help="Output JSONL file for evaluations (or a .sqlite / .db store)")
     parser.add_argument("--model", default="Qwen/Qwen2.5-72B-Instruct", help="Model ID for LLM evaluation")
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=None,
+        help="Evaluate on an asyncio event loop with up to N judge calls in flight (default: process pool)",
+    )
+    parser.add_argument(
+        "--choice-only",
+        action="store_true",
+        help="Only report choice accuracy (phase 1), without LLM judging",
+    )
+    parser.add_argument(
+        "--follow",
+        action="store_true",
+        help="Keep evaluating new rows as they are appended to the input file (asyncio engine)",
+    )
+    parser.add_argument(
+        "--idle-timeout",
+        type=float,
+        default=600.0,
+        help="With --follow, stop after this many seconds without new rows",
+    )
+    parser.add_argument(
+        "--single-prompt-judge",
+        action="store_true",
+        help="Grade the ideal answer and all key points of a result in one judge call",
+    )
+    parser.add_argument(
+        "--logprob-judge",
+        action="store_true",
+        help="Judge each criterion from P(YES) of a single token (API logprobs / local YES-NO logits)",
+    )
+    parser.add_argument(
+        "--judge-threshold",
+        type=float,
+        default=0.5,
+        help="With --logprob-judge, a criterion passes when P(YES) reaches this threshold",
+    )
+    parser.add_argument(
+        "--soft-judge",
+        action="store_true",
+        help="With --logprob-judge, score each criterion with P(YES) instead of thresholding it",
+    )
+    parser.add_argument(
+        "--pre-judge-calibration",
+        default=None,
+        help="Evaluation JSONL with judge verdicts on the input results; fits the pre-judge thresholds",
+    )
+    parser.add_argument(
+        "--pre-judge-thresholds",
+        type=float,
+        nargs=2,
+        default=None,
+        metavar=("ACCEPT", "REJECT"),
+        help="Pre-judge similarity thresholds (instead of calibrating them)",
+    )
+    parser.add_argument(
+        "--pre-judge-agreement",
+        type=float,
+        default=0.95,
+        help="Agreement with the judge the calibrated pre-judge thresholds must reach",
+    )
+    parser.add_argument(
+        "--pre-judge-embedding",
+        default="none",
+        help="Embedding model of the pre-judge similarity, run on the GPU of each process "
+        "(e.g. jinaai/jina-embeddings-v4; default 'none': lexical overlap only)",
+    )
+    parser.add_argument(
+        "--run-id",
+        default=None,
+        help="Run id of the results to evaluate when the input is a results store (the QA run id: by default "
+        "the model's short name), and of the evaluations when the output is one",
+    )
+    parser.add_argument(
+        "--agreement-with",
+        default=None,
+        help="Evaluation JSONL to compare the output with afterwards (e.g. a per-criterion judging run)",
+    )
+    parser.add_argument(
+        "--verdict-cache",
+        default=os.getenv("JUDGE_VERDICT_CACHE"),
+        help="Database file of the persistent judge-verdict cache (default: JUDGE_VERDICT_CACHE, else off)",
+    )
 
     args = parser.parse_args()
+    if args.logprob_judge and args.single_prompt_judge:
+        parser.error("--logprob-judge and --single-prompt-judge are mutually exclusive")
+    if args.follow and is_results_store(args.input_file):
+        parser.error("--follow tails a JSONL input file, not a results store")
+    if args.run_id is None and is_results_store(args.input_file):
+        parser.error("--run-id is required to select the results of one QA run from a results store")
 
     # Setup logger
     logger.remove()
@@ -645,8 +2030,38 @@ def main():
     logger.add(f"log/{timestamp}.log")
 
     # Create evaluator and run evaluation
-    evaluator = ConceptEvaluator(model_id=args.model)
-    evaluator.evaluate_results(args.input_file, args.output_file)
+    if args.follow and args.concurrency is None:
+        args.concurrency = 16
+    if args.concurrency is not None:
+        # Size the API client's connection pool and async limit to match
+        os.environ.setdefault("API_MAX_CONCURRENCY", str(args.concurrency))
+    logprob_judge = None
+    if args.logprob_judge:
+        logprob_judge = LogprobJudge(threshold=None if args.soft_judge else args.judge_threshold)
+    pre_judge = None
+    if args.pre_judge_calibration or args.pre_judge_thresholds:
+        embedding_model = None if args.pre_judge_embedding.lower() == "none" else args.pre_judge_embedding
+        pre_judge = PreJudge(*(args.pre_judge_thresholds or ()), embedding_model=embedding_model)
+    evaluator = ConceptEvaluator(
+        model_id=args.model,
+        single_prompt_judge=args.single_prompt_judge,
+        verdict_cache=args.verdict_cache,
+        logprob_judge=logprob_judge,
+        pre_judge=pre_judge,
+        run_id="" if args.run_id is None else args.run_id,
+    )
+    if pre_judge is not None and not args.pre_judge_thresholds:
+        evaluator.calibrate_pre_judge(args.input_file, args.pre_judge_calibration, args.pre_judge_agreement)
+    if args.choice_only:
+        evaluator.evaluate_choices_only(args.input_file)
+    elif args.follow:
+        evaluator.follow_results(args.input_file, args.output_file, args.concurrency, idle_timeout=args.idle_timeout)
+    elif args.concurrency is not None:
+        evaluator.evaluate_results_async(args.input_file, args.output_file, args.concurrency)
+    else:
+        evaluator.evaluate_results(args.input_file, args.output_file)
+    if args.agreement_with:
+        evaluator.report_agreement(args.output_file, args.agreement_with)
 
 
 if __name__ == "__main__":
@@ -1,6 +1,6 @@
 import re
 from pathlib import Path
-from typing import List, Optional, Tuple
+from typing import TYPE_CHECKING, Iterator, List, Optional, Tuple
 
 import yaml
 from loguru import logger
@@ -8,7 +8,10 @@ from PIL import Image
 
 from method.utils.memory_utils import ConceptManager, MemoryManager
 from method.utils.mllm_factory import MLLMFactory
-from method.utils.retrieval_utils import Detector, Retriever
+
+if TYPE_CHECKING:
+    # torch / sentence_transformers / grounding-dino: imported only when first needed
+    from method.utils.retrieval_utils import Detector, Retriever
 
 """
 Double Memory Personalized MLLM System
@@ -36,10 +39,18 @@ def get_model_short_name(model_id: str) -> str:
 
 
 class TAME:
-    def __init__(self, model_id: str):
+    def __init__(
+        self, model_id: str, constrained_decoding: bool = False, generation_cache: Optional[dict] = None
+    ):
         self.model_id = model_id
         self.model_short_name = get_model_short_name(model_id)
-        self.model = MLLMFactory(model_id)
+        self.model = MLLMFactory(model_id, cache=generation_cache)
+        # Force memory-op responses into the op schema (local backends only)
+        self.constrained_decoding = constrained_decoding and getattr(
+            self.model, "supports_constrained_decoding", False
+        )
+        if constrained_decoding and not self.constrained_decoding:
+            logger.warning(f"Model {model_id} does not support constrained decoding, using free-form output")
         self.history_path = Path("data/concept")
         self._detector = None
         self._retriever = None
@@ -48,17 +59,21 @@ class TAME:
         self.concept_manager.read_memories()  # FIX: Initialize concept memories
 
     @property
-    def detector(self) -> Detector:
+    def detector(self) -> "Detector":
         """Lazy-load detector on first access"""
         if self._detector is None:
+            from method.utils.retrieval_utils import Detector
+
             logger.info("Loading detector (lazy-loaded).")
             self._detector = Detector()
         return self._detector
 
     @property
-    def retriever(self) -> Retriever:
+    def retriever(self) -> "Retriever":
         """Lazy-load retriever on first access"""
         if self._retriever is None:
+            from method.utils.retrieval_utils import Retriever
+
             logger.info("Loading retriever (lazy-loaded).")
             self._retriever = Retriever()
         return self._retriever
@@ -140,7 +155,116 @@ class TAME:
         memory_prompt_type = "dynamic"
 
         # Part 2: Process memory updates
-        memory_prompt = f"""You are a strict Data Entry Assistant for `{concept_id}`.
+        memory_prompt = self._memory_update_prompt(
+            concept_id,
+            dynamic_memory if memory_type == "dynamic" else memory_manager.read_static_memory(),
+            question,
+            answer,
+            img,
+        )
+
+        generation_kwargs = {"grammar": "memory_update_ops"} if self.constrained_decoding else {}
+        generation_kwargs["profile"] = "memory_update"
+        if img is not None:
+            memory_response = self.model.chat_img(memory_prompt, img, **generation_kwargs)
+        else:
+            memory_response = self.model.chat_text(memory_prompt, **generation_kwargs)
+        logger.info(f"{memory_prompt_type.title()} memory update: {memory_response.replace('\n', ' ')}")
+
+        # Use normal memory processing
+        memory_manager.parse_update_ops(memory_response, memory_type)
+
+        # Log the number of operations processed
+        try:
+            yaml_match = re.search(r"```yaml\s*(.*?)(?:```|$)", memory_response, re.DOTALL)
+            if yaml_match:
+                yaml_content = yaml_match.group(1)
+            else:
+                yaml_content = memory_response
+
+            parsed_ops = yaml.safe_load(yaml_content)
+            if isinstance(parsed_ops, list):
+                logger.info(f"Processed {len(parsed_ops)} dynamic memory operations")
+            elif parsed_ops is None or (isinstance(parsed_ops, list) and len(parsed_ops) == 0):
+                logger.info("Processed 0 dynamic memory operations")
+        except Exception as e:
+            logger.debug(f"Could not count dynamic operations: {e}")
+
+        static_memory = memory_manager.read_static_memory()
+        dynamic_memory = memory_manager.read_dynamic_memory()
+
+        # if static_memory is empty, use the image to generate a portrait
+        if not static_memory and img is not None:  # FIX: Add img None check
+            memory_manager.save_portrait(img)
+
+        # Part 1: Process static memory updates based on dynamic memory analysis (transfer step)
+        # Analyze dynamic memory to identify persistent attributes for static memory
+        updated_dynamic_memory = memory_manager.read_dynamic_memory()
+
+        if updated_dynamic_memory:  # Only process if there's dynamic memory to analyze
+            static_analysis_prompt = self._static_transfer_prompt(
+                concept_id, updated_dynamic_memory, static_memory
+            )
+
+            # Get response from model
+            generation_kwargs = {"grammar": "memory_transfer_ops"} if self.constrained_decoding else {}
+            generation_kwargs["profile"] = "static_transfer"
+            if img is not None:
+                memory_transform_response = self.model.chat_img(static_analysis_prompt, img, **generation_kwargs)
+            else:
+                memory_transform_response = self.model.chat_text(static_analysis_prompt, **generation_kwargs)
+
+            logger.info(f"Static memory update: {memory_transform_response.replace('\n', ' ')}")
+
+            # Parse and execute the memory operations using existing parse_update_ops function
+            try:
+                # Extract YAML content
+                yaml_match = re.search(r"```yaml\s*(.*?)(?:```|$)", memory_transform_response, re.DOTALL)
+                if yaml_match:
+                    yaml_content = yaml_match.group(1)
+                else:
+                    yaml_content = memory_transform_response
+
+                parsed_response = yaml.safe_load(yaml_content)
+
+                if isinstance(parsed_response, dict):
+                    # Process dynamic memory operations (removals) using parse_update_ops
+                    dynamic_ops = parsed_response.get("dynamic_ops", [])
+                    if dynamic_ops:
+                        # Convert to YAML string format that parse_update_ops expects
+                        dynamic_yaml = yaml.dump(dynamic_ops, allow_unicode=True)
+                        memory_manager.parse_update_ops(f"```yaml\n{dynamic_yaml}```", "dynamic")
+
+                    # Process static memory operations (additions/modifications) using parse_update_ops
+                    static_ops = parsed_response.get("static_ops", [])
+                    if static_ops:
+                        # Convert to YAML string format that parse_update_ops expects
+                        static_yaml = yaml.dump(static_ops, allow_unicode=True)
+                        memory_manager.parse_update_ops(f"```yaml\n{static_yaml}```", "static")
+
+                    logger.info(
+                        f"Processed {len(dynamic_ops)} dynamic and {len(static_ops)} static memory operations"
+                    )
+
+            except Exception as e:
+                logger.error(f"Error processing static memory from dynamic memory: {e}")
+                logger.debug(f"Raw response: {memory_transform_response}")
+
+        # Apply FIFO rule to dynamic memory at the end
+        memory_manager.apply_fifo_to_dynamic_memory(max_size=10)
+
+    def _output_instruction(self) -> str:
+        # Constrained decoding skips the analysis and emits only the YAML code box
+        if self.constrained_decoding:
+            return "(Only the YAML code box)"
+        return "(Start with # Analysis then YAML code box)"
+
+    def _memory_update_prompt(
+        self, concept_id: str, memory: list, question: str, answer: str, img: Optional[Image.Image]
+    ) -> str:
+        """Create the prompt that updates the dynamic memory from one conversation turn"""
+        output_instruction = self._output_instruction()
+        return f"""You are a strict Data Entry Assistant for `{concept_id}`.
 Your task is to update the **Dynamic Memory** (temporary buffer) based on the **Current Conversation**.
 
 ## GOAL
@@ -152,7 +276,7 @@ Extract **new information** provided in the conversation.
 ## INPUT DATA
 **Existing Dynamic Memory:**
 ```yaml
-{self.dump_numbered_list(dynamic_memory if memory_type == "dynamic" else memory_manager.read_static_memory())}
+{self.dump_numbered_list(memory)}
 
 ```
 
@@ -198,52 +322,18 @@ Provide a `# Analysis` comment first, then the YAML code box.
 
 If no updates are needed, output: []
 
-Generate the output: (Start with # Analysis then YAML code box)
+Generate the output: {output_instruction}
 """
 
-        if img is not None:
-            memory_response = self.model.chat_img(memory_prompt, img)
-        else:
-            memory_response = self.model.chat_text(memory_prompt)
-        logger.info(f"{memory_prompt_type.title()} memory update: {memory_response.replace('\n', ' ')}")
-
-        # Use normal memory processing
-        memory_manager.parse_update_ops(memory_response, memory_type)
-
-        # Log the number of operations processed
-        try:
-            yaml_match = re.search(r"```yaml\s*(.*?)```", memory_response, re.DOTALL)
-            if yaml_match:
-                yaml_content = yaml_match.group(1)
-            else:
-                yaml_content = memory_response
-
-            parsed_ops = yaml.safe_load(yaml_content)
-            if isinstance(parsed_ops, list):
-                logger.info(f"Processed {len(parsed_ops)} dynamic memory operations")
-            elif parsed_ops is None or (isinstance(parsed_ops, list) and len(parsed_ops) == 0):
-                logger.info("Processed 0 dynamic memory operations")
-        except Exception as e:
-            logger.debug(f"Could not count dynamic operations: {e}")
-
-        static_memory = memory_manager.read_static_memory()
-        dynamic_memory = memory_manager.read_dynamic_memory()
-
-        # if static_memory is empty, use the image to generate a portrait
-        if not static_memory and img is not None:  # FIX: Add img None check
-            memory_manager.save_portrait(img)
-
-        # Part 1: Process static memory updates based on dynamic memory analysis (transfer step)
-        # Analyze dynamic memory to identify persistent attributes for static memory
-        updated_dynamic_memory = memory_manager.read_dynamic_memory()
-
-        if updated_dynamic_memory:  # Only process if there's dynamic memory to analyze
-            static_analysis_prompt = f"""You are a strict Memory Manager. Your goal is to move PERMANENT FACTS from Dynamic Memory to Static Memory, while leaving TEMPORARY EVENTS alone.
+    def _static_transfer_prompt(self, concept_id: str, dynamic_memory: list, static_memory: list) -> str:
+        """Create the prompt that moves permanent facts from the dynamic to the static memory"""
+        output_instruction = self._output_instruction()
+        return f"""You are a strict Memory Manager. Your goal is to move PERMANENT FACTS from Dynamic Memory to Static Memory, while leaving TEMPORARY EVENTS alone.
 
 ## INPUT DATA
 Current Dynamic Memory (Recent observations) for `{concept_id}`:
 ```yaml
-{self.dump_numbered_list(updated_dynamic_memory)}
+{self.dump_numbered_list(dynamic_memory)}
 
 ```
 
@@ -300,54 +390,9 @@ dynamic_ops: []
 static_ops: []
 ```
 
-Generate the output: (Start with # Analysis then YAML code box)
+Generate the output: {output_instruction}
 """
 
-            # Get response from model
-            if img is not None:
-                memory_transform_response = self.model.chat_img(static_analysis_prompt, img)
-            else:
-                memory_transform_response = self.model.chat_text(static_analysis_prompt)
-
-            logger.info(f"Static memory update: {memory_transform_response.replace('\n', ' ')}")
-
-            # Parse and execute the memory operations using existing parse_update_ops function
-            try:
-                # Extract YAML content
-                yaml_match = re.search(r"```yaml\s*(.*?)```", memory_transform_response, re.DOTALL)
-                if yaml_match:
-                    yaml_content = yaml_match.group(1)
-                else:
-                    yaml_content = memory_transform_response
-
-                parsed_response = yaml.safe_load(yaml_content)
-
-                if isinstance(parsed_response, dict):
-                    # Process dynamic memory operations (removals) using parse_update_ops
-                    dynamic_ops = parsed_response.get("dynamic_ops", [])
-                    if dynamic_ops:
-                        # Convert to YAML string format that parse_update_ops expects
-                        dynamic_yaml = yaml.dump(dynamic_ops, allow_unicode=True)
-                        memory_manager.parse_update_ops(f"```yaml\n{dynamic_yaml}```", "dynamic")
-
-                    # Process static memory operations (additions/modifications) using parse_update_ops
-                    static_ops = parsed_response.get("static_ops", [])
-                    if static_ops:
-                        # Convert to YAML string format that parse_update_ops expects
-                        static_yaml = yaml.dump(static_ops, allow_unicode=True)
-                        memory_manager.parse_update_ops(f"```yaml\n{static_yaml}```", "static")
-
-                    logger.info(
-                        f"Processed {len(dynamic_ops)} dynamic and {len(static_ops)} static memory operations"
-                    )
-
-            except Exception as e:
-                logger.error(f"Error processing static memory from dynamic memory: {e}")
-                logger.debug(f"Raw response: {memory_transform_response}")
-
-        # Apply FIFO rule to dynamic memory at the end
-        memory_manager.apply_fifo_to_dynamic_memory(max_size=10)
-
     def identify_concept(self, img: Image.Image, question: str) -> Optional[str]:  # Add return type hint
         """Add comprehensive error handling and validation"""
         if img is None:
@@ -433,9 +478,9 @@ You are a precise information extraction agent. Your goal is to identify and lis
 
             # Use appropriate model method based on whether image is provided
             if img is not None:
-                aligned_response = self.model.chat_img(alignment_prompt, img)
+                aligned_response = self.model.chat_img(alignment_prompt, img, profile="alignment")
             else:
-                aligned_response = self.model.chat_text(alignment_prompt)
+                aligned_response = self.model.chat_text(alignment_prompt, profile="alignment")
 
             logger.info(f"Memory aligned for question: {question[:50]}...")
             return aligned_response
@@ -462,8 +507,45 @@ You are a precise information extraction agent. Your goal is to identify and lis
             logger.error("concept_id and question cannot be empty")
             return "Error: Invalid parameters provided."
 
-        # Create the main prompt for answering the question
-        answer_prompt = f"""# TASK: Personalized Concept Analysis
+        answer_prompt = self._answer_prompt(question, context_prompt, img)
+
+        # Use appropriate model method based on whether image is provided
+        if img is not None:
+            response = self.model.chat_img(answer_prompt, img, profile="answer")
+        else:
+            response = self.model.chat_text(answer_prompt, profile="answer")
+
+        return response
+
+    def answer_question_stream(
+        self, concept_id: str, question: str, context_prompt: str, img: Optional[Image.Image] = None
+    ) -> Iterator[str]:
+        """
+        Streaming version of answer_question: yields the answer as text chunks while it is generated.
+
+        Args:
+            concept_id: The identifier of the concept
+            question: The question to answer
+            context_prompt: The formatted context prompt containing memory information
+            img: Optional image that may be related to the question
+
+        Yields:
+            str: Consecutive chunks of the answer
+        """
+        if not concept_id or not question:
+            logger.error("concept_id and question cannot be empty")
+            yield "Error: Invalid parameters provided."
+            return
+
+        answer_prompt = self._answer_prompt(question, context_prompt, img)
+        if img is not None:
+            yield from self.model.chat_img_stream(answer_prompt, img, profile="answer")
+        else:
+            yield from self.model.chat_text_stream(answer_prompt, profile="answer")
+
+    def _answer_prompt(self, question: str, context_prompt: str, img: Optional[Image.Image]) -> str:
+        """Create the main prompt for answering the question"""
+        return f"""# TASK: Personalized Concept Analysis
 You are a precision-focused AI assistant. Your goal is to answer questions about a specific CONCEPT by synthesizing its permanent traits (Static) and its current state (Dynamic).
 
 # INPUT DATA
@@ -486,14 +568,6 @@ To provide a complete answer, you must evaluate:
 # RESPONSE:
 [Insert your single-paragraph response here]"""
 
-        # Use appropriate model method based on whether image is provided
-        if img is not None:
-            response = self.model.chat_img(answer_prompt, img)
-        else:
-            response = self.model.chat_text(answer_prompt)
-
-        return response
-
     def answer_choice_question(
         self,
         concept_id: str,
@@ -554,9 +628,9 @@ Generate your response (only the letter):"""
 
         # Use appropriate model method based on whether image is provided
         if img is not None:
-            response = self.model.chat_img(choice_prompt, img)
+            response = self.model.chat_img(choice_prompt, img, profile="choice")
         else:
-            response = self.model.chat_text(choice_prompt)
+            response = self.model.chat_text(choice_prompt, profile="choice")
 
         # Extract only the letter from the response
         choice_match = re.search(r"[ABCD]", response.strip().upper())
@@ -1,6 +1,8 @@
 import argparse
 import json
 import os
+import statistics
+import subprocess
 import sys
 from datetime import datetime
 from pathlib import Path
@@ -13,6 +15,7 @@ from loguru import logger
 
 from method.qa import QASystem
 from method.TAME import TAME, get_model_id, get_model_short_name
+from method.utils.results_store import ResultsStore
 
 
 def setup_logger():
@@ -113,7 +116,7 @@ def load_existing_question_ids(results_file: Path) -> set:
     return existing_keys
 
 
-def build_memory(model_arg: str):
+def build_memory(model_arg: str, constrained_decoding: bool = False, generation_cache: dict = None):
     """Build memory by reading history for all concepts"""
     setup_logger()
 
@@ -122,24 +125,38 @@ def build_memory(model_arg: str):
 
     logger.info(f"Building memory using model: {model_id} ({model_short_name})")
 
-    assistant = TAME(model_id=model_id)
+    assistant = TAME(model_id=model_id, constrained_decoding=constrained_decoding, generation_cache=generation_cache)
 
     logger.info("Reading history for all concepts...")
     assistant.read_history_all()
 
     logger.info(f"Memory building completed for model: {model_short_name}")
+    if hasattr(assistant.model, "cache_stats"):
+        logger.info(f"Generation cache: {assistant.model.cache_stats()}")
 
 
-def run_qa(model_arg: str):
-    """Run QA system to answer questions"""
+def run_qa(model_arg: str, generation_cache: dict = None, results_store: str = None, run_id: str = None):
+    """
+    Run QA system to answer questions
+
+    Args:
+        model_arg: Model to use
+        generation_cache: Generation cache options (see main)
+        results_store: Write the results to this ResultsStore database instead of the JSONL file; resuming
+            then checks each question with an indexed lookup rather than re-reading the file
+        run_id: Run id of the results in the store (questions of other runs are answered again); defaults
+            to the model's short name, so the runs of different models never resume each other
+    """
     setup_logger()
 
     model_id = get_model_id(model_arg)
     model_short_name = get_model_short_name(model_id)
+    if run_id is None:
+        run_id = model_short_name
 
     logger.info(f"Starting QA system with model: {model_id} ({model_short_name})")
 
-    assistant = TAME(model_id=model_id)
+    assistant = TAME(model_id=model_id, generation_cache=generation_cache)
 
     logger.info("Starting QA System")
     qa_system = QASystem(model_id=model_id)
@@ -150,8 +167,15 @@ def run_qa(model_arg: str):
 
     results_file = results_dir / f"all_results_{model_short_name}.jsonl"
 
-    # Load existing question IDs to avoid duplicates
-    existing_question_ids = load_existing_question_ids(results_file)
+    store = None
+    if results_store:
+        store = ResultsStore(results_store)
+        results_file = Path(results_store)
+        logger.info(f"Using results store {results_store} (run id {run_id!r})")
+        existing_question_ids = set()
+    else:
+        # Load existing question IDs to avoid duplicates
+        existing_question_ids = load_existing_question_ids(results_file)
     skipped_count = 0
     processed_count = 0
 
@@ -171,7 +195,9 @@ def run_qa(model_arg: str):
         composite_key = (original_concept_id, question_id, difficulty)
 
         # Check if this question has already been processed
-        if composite_key in existing_question_ids:
+        if composite_key in existing_question_ids or (
+            store is not None and store.contains("results", *composite_key, run_id=run_id)
+        ):
             skipped_count += 1
             logger.info(
                 f"{Fore.YELLOW}Skipping{Style.RESET_ALL}: {question_id} (concept: {original_concept_id}, difficulty: {difficulty}) - already processed"
@@ -208,9 +234,12 @@ def run_qa(model_arg: str):
             "choice": choice_answer if choice_answer else None,
         }
 
-        # Append to JSONL file
-        with open(results_file, "a", encoding="utf-8") as f:
-            f.write(json.dumps(result_entry, ensure_ascii=False) + "\n")
+        if store is not None:
+            store.upsert("results", result_entry, run_id)
+        else:
+            # Append to JSONL file
+            with open(results_file, "a", encoding="utf-8") as f:
+                f.write(json.dumps(result_entry, ensure_ascii=False) + "\n")
 
         logger.info(f"{Fore.MAGENTA}Result saved to {results_file}{Style.RESET_ALL}")
 
@@ -219,25 +248,110 @@ def run_qa(model_arg: str):
     logger.info(f"{Fore.CYAN}Questions Processed: {processed_count}{Style.RESET_ALL}")
     logger.info(f"{Fore.CYAN}Questions Skipped: {skipped_count}{Style.RESET_ALL}")
     logger.info(f"{Fore.CYAN}Total Questions: {processed_count + skipped_count}{Style.RESET_ALL}")
+    if hasattr(assistant.model, "cache_stats"):
+        logger.info(f"{Fore.CYAN}Generation Cache: {assistant.model.cache_stats()}{Style.RESET_ALL}")
 
     logger.info(f"\n{Fore.GREEN}All results saved to: {results_file}{Style.RESET_ALL}")
 
 
+# Import paths whose cold-start cost is tracked by `bench-startup`
+STARTUP_TARGETS = {
+    "mllm_factory": "import method.utils.mllm_factory",
+    "api backend": "from method.utils.mllm_factory import get_model_class; get_model_class('gemini-2.5-pro')",
+    "TAME": "import method.TAME",
+    "evaluator": "import evaluator.evaluator",
+}
+
+_STARTUP_PROBE = """
+import json, resource, sys, time
+start = time.perf_counter()
+{statement}
+elapsed = time.perf_counter() - start
+heavy = ["torch", "torchvision", "transformers", "sentence_transformers", "einops", "qwen_vl_utils"]
+print(json.dumps({{
+    "seconds": elapsed,
+    "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "heavy_modules": [name for name in heavy if name in sys.modules],
+}}))
+"""
+
+
+def benchmark_startup(repeats: int = 3):
+    """Measure cold-start import time and peak RSS of each STARTUP_TARGETS entry in fresh interpreters"""
+    setup_logger()
+
+    repo_root = Path(__file__).resolve().parent.parent
+    logger.info(f"{Fore.CYAN}=== COLD START ({repeats} runs, median) ==={Style.RESET_ALL}")
+    for name, statement in STARTUP_TARGETS.items():
+        runs = []
+        for _ in range(repeats):
+            completed = subprocess.run(
+                [sys.executable, "-c", _STARTUP_PROBE.format(statement=statement)],
+                cwd=repo_root,
+                capture_output=True,
+                text=True,
+            )
+            if completed.returncode != 0:
+                logger.error(f"{name}: import failed\n{completed.stderr.strip()}")
+                break
+            runs.append(json.loads(completed.stdout.strip().splitlines()[-1]))
+        if not runs:
+            continue
+        seconds = statistics.median(run["seconds"] for run in runs)
+        rss = statistics.median(run["max_rss_mb"] for run in runs)
+        heavy = ", ".join(runs[0]["heavy_modules"]) or "none"
+        logger.info(f"{name:<14} {seconds * 1000:8.1f} ms | peak RSS {rss:7.1f} MB | heavy modules: {heavy}")
+
+
 def main():
     parser = argparse.ArgumentParser(description="TAME: Double Memory Personalized MLLM System")
     parser.add_argument(
-        "mode", choices=["build", "qa"], help="Mode: 'build' for memory building, 'qa' for question answering"
+        "mode",
+        choices=["build", "qa", "bench-startup"],
+        help="Mode: 'build' for memory building, 'qa' for question answering, "
+        "'bench-startup' for the cold-start import time / RSS benchmark",
     )
     parser.add_argument(
         "--model", "-m", default="qwenvl", help="Model to use: 'qwenvl' or 'internvl' (default: qwenvl)"
     )
+    parser.add_argument(
+        "--constrained",
+        action="store_true",
+        help="Build mode: constrain memory operations to the YAML op schema (local models only)",
+    )
+    parser.add_argument(
+        "--generation-cache",
+        default=None,
+        help="Replay repeated model calls from this disk cache (SQLite file), e.g. cache/generations.sqlite",
+    )
+    parser.add_argument(
+        "--results-store",
+        default=None,
+        help="QA mode: write results to this indexed SQLite store (e.g. results/results.sqlite)",
+    )
+    parser.add_argument(
+        "--run-id",
+        default=None,
+        help="QA mode: run id of the results written to --results-store (default: the model's short name)",
+    )
+    parser.add_argument(
+        "--cache-sampled",
+        action="store_true",
+        help="Also cache calls with sampled (non-deterministic) profiles, such as free-form answers",
+    )
 
     args = parser.parse_args()
 
+    generation_cache = None
+    if args.generation_cache:
+        generation_cache = {"path": args.generation_cache, "deterministic_only": not args.cache_sampled}
+
     if args.mode == "build":
-        build_memory(args.model)
+        build_memory(args.model, args.constrained, generation_cache)
     elif args.mode == "qa":
-        run_qa(args.model)
+        run_qa(args.model, generation_cache, args.results_store, args.run_id)
+    elif args.mode == "bench-startup":
+        benchmark_startup()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,222 @@
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Optional
+
+from loguru import logger
+from PIL import Image
+
+
+@dataclass
+class _ChatRequest:
+    kind: str  # "text" or "img"
+    prompt: str
+    image: Optional[Image.Image]
+    max_tokens: Optional[int]
+    profile: Optional[str] = None  # generation profile, shared by every request of a batch
+    kwargs: dict = field(default_factory=dict)  # extra backend options (e.g. grammar), served unbatched
+    future: Future = field(default_factory=Future)
+
+
+class BatchScheduler:
+    """
+    Request-queue scheduler in front of a local MLLM backend.
+
+    Concurrent `chat_text` / `chat_img` callers are collected over a short window
+    (up to `max_wait_ms` or `max_batch_size` requests) and served as one padded batch.
+    Backends with a heterogeneous `chat_batch` get the whole window (text and image rows,
+    per-row token limits) in one forward pass; otherwise requests are grouped for
+    `chat_text_batch` / `chat_img_batch`. Requests are only batched with others of the same
+    generation profile. Each caller blocks on its own future, so the
+    scheduler is a drop-in replacement for the backend.
+    """
+
+    def __init__(
+        self, model, max_batch_size: int = 8, max_wait_ms: float = 20.0, lock: Optional[threading.Lock] = None
+    ):
+        self.model = model
+        # Held while a batch is served, so other users of the backend (e.g. a model server) can serialize with it
+        self.lock = lock if lock is not None else threading.Lock()
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.batch_sizes = Counter()
+        self._queue: "queue.Queue[Optional[_ChatRequest]]" = queue.Queue()
+        self._closed = False
+        self._worker = threading.Thread(target=self._run, name="batch-scheduler", daemon=True)
+        self._worker.start()
+
+    def __getattr__(self, name):
+        # Anything not scheduled (chat_multi_img, tokenizer, caches...) goes straight to the backend
+        return getattr(self.model, name)
+
+    def submit_text(
+        self, prompt: str, max_tokens: Optional[int] = None, profile: Optional[str] = None, **kwargs
+    ) -> Future:
+        return self._submit(_ChatRequest("text", prompt, None, max_tokens, profile, kwargs))
+
+    def submit_img(
+        self,
+        prompt: str,
+        image: Image.Image,
+        max_tokens: Optional[int] = None,
+        profile: Optional[str] = None,
+        **kwargs,
+    ) -> Future:
+        return self._submit(_ChatRequest("img", prompt, image, max_tokens, profile, kwargs))
+
+    def chat_text(self, prompt: str, max_tokens: Optional[int] = None, profile: Optional[str] = None, **kwargs) -> str:
+        return self.submit_text(prompt, max_tokens, profile, **kwargs).result()
+
+    def chat_img(
+        self,
+        prompt: str,
+        image: Image.Image,
+        max_tokens: Optional[int] = None,
+        profile: Optional[str] = None,
+        **kwargs,
+    ) -> str:
+        return self.submit_img(prompt, image, max_tokens, profile, **kwargs).result()
+
+    def _submit(self, request: _ChatRequest) -> Future:
+        if self._closed:
+            raise RuntimeError("BatchScheduler is closed")
+        self._queue.put(request)
+        return request.future
+
+    def close(self):
+        """Stop the worker after the already queued requests are served."""
+        if not self._closed:
+            self._closed = True
+            self._queue.put(None)
+            self._worker.join()
+
+    def _collect(self) -> tuple[list[_ChatRequest], bool]:
+        """Block for the first request, then gather more until the window or batch size is exhausted."""
+        first = self._queue.get()
+        if first is None:
+            return [], True
+        batch = [first]
+        deadline = time.monotonic() + self.max_wait_ms / 1000
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if request is None:
+                return batch, True
+            batch.append(request)
+        return batch, False
+
+    def _run(self):
+        stop = False
+        while not stop:
+            batch, stop = self._collect()
+            if not batch:
+                continue
+            with self.lock:
+                self._serve_batch(batch)
+
+    def _serve_batch(self, batch: list[_ChatRequest]):
+        # Requests with backend-specific options cannot share a batch; serve them on their own
+        for request in [r for r in batch if r.kwargs]:
+            self._serve_single(request)
+        batch = [r for r in batch if not r.kwargs]
+        if not batch:
+            return
+
+        if hasattr(self.model, "chat_batch"):
+            by_profile = {}
+            for request in batch:
+                by_profile.setdefault(request.profile, []).append(request)
+            for profile, requests in by_profile.items():
+                self._serve_mixed(profile, requests)
+            return
+
+        # One generate call per (kind, profile, max_tokens) group keeps per-call settings exact
+        groups = {}
+        for request in batch:
+            groups.setdefault((request.kind, request.profile, request.max_tokens), []).append(request)
+        for (kind, profile, max_tokens), requests in groups.items():
+            self._serve(kind, profile, max_tokens, requests)
+
+    def _serve_single(self, request: _ChatRequest):
+        self.batch_sizes[1] += 1
+        try:
+            kwargs = {"profile": request.profile, **request.kwargs}
+            if request.kind == "img":
+                output = self.model.chat_img(request.prompt, request.image, request.max_tokens, **kwargs)
+            else:
+                output = self.model.chat_text(request.prompt, request.max_tokens, **kwargs)
+        except Exception as e:
+            request.future.set_exception(e)
+            return
+        request.future.set_result(output)
+
+    def _serve_mixed(self, profile: Optional[str], requests: list[_ChatRequest]):
+        self.batch_sizes[len(requests)] += 1
+        try:
+            outputs = self.model.chat_batch(
+                [r.prompt for r in requests],
+                [r.image for r in requests],
+                [r.max_tokens for r in requests],
+                profile=profile,
+            )
+        except Exception as e:
+            logger.error(f"Batched generation of size {len(requests)} failed: {e}")
+            for request in requests:
+                request.future.set_exception(e)
+            return
+
+        self._resolve(requests, outputs)
+
+    def _serve(self, kind: str, profile: Optional[str], max_tokens: Optional[int], requests: list[_ChatRequest]):
+        self.batch_sizes[len(requests)] += 1
+        prompts = [request.prompt for request in requests]
+        try:
+            if kind == "img" and hasattr(self.model, "chat_img_batch"):
+                outputs = self.model.chat_img_batch(
+                    prompts, [r.image for r in requests], max_tokens=max_tokens, profile=profile
+                )
+            elif kind == "text" and hasattr(self.model, "chat_text_batch"):
+                outputs = self.model.chat_text_batch(prompts, max_tokens=max_tokens, profile=profile)
+            elif kind == "img":
+                outputs = [self.model.chat_img(r.prompt, r.image, max_tokens, profile=profile) for r in requests]
+            else:
+                outputs = [self.model.chat_text(r.prompt, max_tokens, profile=profile) for r in requests]
+        except Exception as e:
+            logger.error(f"Batched {kind} generation of size {len(requests)} failed: {e}")
+            for request in requests:
+                request.future.set_exception(e)
+            return
+
+        self._resolve(requests, outputs)
+
+    @staticmethod
+    def _resolve(requests: list[_ChatRequest], outputs: list[str]):
+        """Hand each request its output; requests the backend returned no output for fail instead of hanging."""
+        outputs = list(outputs)
+        if len(outputs) != len(requests):
+            logger.error(f"Batched generation returned {len(outputs)} outputs for {len(requests)} requests")
+        for request, output in zip(requests, outputs):
+            request.future.set_result(output)
+        for request in requests[len(outputs) :]:
+            request.future.set_exception(
+                RuntimeError(f"Backend returned {len(outputs)} outputs for a batch of {len(requests)} requests")
+            )
+
+    def stats(self) -> dict:
+        """Batch-size distribution of the batches served so far."""
+        num_batches = sum(self.batch_sizes.values())
+        num_requests = sum(size * count for size, count in self.batch_sizes.items())
+        return {
+            "batches": num_batches,
+            "requests": num_requests,
+            "mean_batch_size": num_requests / num_batches if num_batches else 0.0,
+            "batch_size_histogram": dict(sorted(self.batch_sizes.items())),
+        }
@@ -0,0 +1,104 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Hashable, Optional
+
+from PIL import Image
+
+
+def image_key(image: Image.Image) -> str:
+    """
+    Content hash of a PIL image, stable across calls that pass the same pixels.
+
+    Args:
+        image: The image to hash
+
+    Returns:
+        str: Hex digest identifying the image content
+    """
+    # SHA-1 is hardware-accelerated on current CPUs, roughly twice as fast as blake2b on raw pixels
+    hasher = hashlib.sha1()
+    hasher.update(f"{image.mode}:{image.size[0]}x{image.size[1]}".encode("utf-8"))
+    hasher.update(image.tobytes())
+    return hasher.hexdigest()
+
+
+def tensor_nbytes(value: Any) -> int:
+    """Approximate memory footprint of a tensor, or of a tuple/list/dict of tensors."""
+    if isinstance(value, (tuple, list)):
+        return sum(tensor_nbytes(v) for v in value)
+    if isinstance(value, dict):
+        return sum(tensor_nbytes(v) for v in value.values())
+    if hasattr(value, "element_size") and hasattr(value, "nelement"):
+        return value.element_size() * value.nelement()
+    return 0
+
+
+class LRUCache:
+    """Thread-safe LRU cache bounded by an entry count and/or a total byte size."""
+
+    def __init__(
+        self,
+        max_entries: Optional[int] = 64,
+        max_bytes: Optional[int] = None,
+        sizeof: Callable[[Any], int] = tensor_nbytes,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self._data: "OrderedDict[Hashable, tuple[Any, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            if key not in self._data:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return self._data[key][0]
+
+    def put(self, key: Hashable, value: Any):
+        size = self.sizeof(value)
+        with self._lock:
+            if key in self._data:
+                self.total_bytes -= self._data.pop(key)[1]
+            self._data[key] = (value, size)
+            self.total_bytes += size
+            self._evict()
+
+    def _evict(self):
+        while self._data and (
+            (self.max_entries is not None and len(self._data) > self.max_entries)
+            or (self.max_bytes is not None and self.total_bytes > self.max_bytes)
+        ):
+            _, (_, size) = self._data.popitem(last=False)
+            self.total_bytes -= size
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.total_bytes = 0
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._data
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._data),
+            "bytes": self.total_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hit_rate,
+        }
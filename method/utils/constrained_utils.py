@@ -0,0 +1,195 @@
+"""Grammar-constrained decoding for the memory-operation YAML blocks."""
+
+from typing import Callable, Optional
+
+import torch
+from transformers import LogitsProcessor
+
+
+class _Node:
+    __slots__ = ("pred", "outs")
+
+    def __init__(self, pred: Optional[Callable[[str], bool]] = None, outs: Optional[list] = None):
+        self.pred = pred  # None for epsilon nodes
+        self.outs = outs if outs is not None else []
+
+
+class Pattern:
+    def build(self, next_node: _Node) -> _Node:
+        """Build the NFA fragment for this pattern in front of `next_node` and return its entry node."""
+        raise NotImplementedError
+
+
+class Lit(Pattern):
+    def __init__(self, text: str):
+        self.text = text
+
+    def build(self, next_node: _Node) -> _Node:
+        node = next_node
+        for ch in reversed(self.text):
+            node = _Node(lambda c, ch=ch: c == ch, [node])
+        return node
+
+
+class Chars(Pattern):
+    """A single character allowed by `allowed` (a string of characters) or refused by `excluded`."""
+
+    def __init__(self, allowed: Optional[str] = None, excluded: Optional[str] = None):
+        self.allowed = allowed
+        self.excluded = excluded
+
+    def build(self, next_node: _Node) -> _Node:
+        if self.allowed is not None:
+            return _Node(lambda c: c in self.allowed, [next_node])
+        return _Node(lambda c: c not in self.excluded, [next_node])
+
+
+class Seq(Pattern):
+    def __init__(self, *parts: Pattern):
+        self.parts = parts
+
+    def build(self, next_node: _Node) -> _Node:
+        node = next_node
+        for part in reversed(self.parts):
+            node = part.build(node)
+        return node
+
+
+class Alt(Pattern):
+    def __init__(self, *options: Pattern):
+        self.options = options
+
+    def build(self, next_node: _Node) -> _Node:
+        return _Node(None, [option.build(next_node) for option in self.options])
+
+
+class Star(Pattern):
+    def __init__(self, body: Pattern):
+        self.body = body
+
+    def build(self, next_node: _Node) -> _Node:
+        loop = _Node(None)
+        loop.outs = [self.body.build(loop), next_node]
+        return loop
+
+
+def Opt(body: Pattern) -> Pattern:
+    return Alt(body, Seq())
+
+
+def Plus(body: Pattern) -> Pattern:
+    return Seq(body, Star(body))
+
+
+class Grammar:
+    """Compiled NFA with immutable state sets, so prefix checks never need copying."""
+
+    def __init__(self, pattern: Pattern):
+        self.accept = _Node(None)
+        self.start = self._closure({pattern.build(self.accept)})
+
+    @staticmethod
+    def _closure(nodes: set) -> frozenset:
+        stack = list(nodes)
+        closed = set(nodes)
+        while stack:
+            node = stack.pop()
+            if node.pred is None:
+                for out in node.outs:
+                    if out not in closed:
+                        closed.add(out)
+                        stack.append(out)
+        return frozenset(closed)
+
+    def feed(self, state: frozenset, text: str) -> frozenset:
+        """Advance `state` over `text`; an empty state means `text` left the grammar."""
+        for ch in text:
+            state = self._closure({node.outs[0] for node in state if node.pred is not None and node.pred(ch)})
+            if not state:
+                break
+        return state
+
+    def is_complete(self, state: frozenset) -> bool:
+        return self.accept in state
+
+
+# Double-quoted YAML scalar without characters that would need escaping
+_QUOTED = Seq(Lit('"'), Star(Chars(excluded='"\\\n')), Lit('"'))
+_TARGET_ID = Seq(Chars("123456789"), Star(Chars("0123456789")))
+_OP_ITEM = Seq(
+    Lit("- op: "),
+    Alt(Lit('"add"'), Lit('"modify"'), Lit('"remove"')),
+    Lit("\n"),
+    Opt(Seq(Lit("  memory: "), _QUOTED, Lit("\n"))),
+    Opt(Seq(Lit("  target_id: "), _TARGET_ID, Lit("\n"))),
+)
+_OP_LIST = Alt(Lit(" []\n"), Seq(Lit("\n"), Plus(_OP_ITEM)))
+
+GRAMMARS = {
+    # List of add/modify/remove ops for one memory (MemoryManager.parse_update_ops)
+    "memory_update_ops": Grammar(Seq(Lit("```yaml\n"), Alt(Lit("[]\n"), Plus(_OP_ITEM)), Lit("```"))),
+    # Dynamic -> static transfer step
+    "memory_transfer_ops": Grammar(
+        Seq(Lit("```yaml\n"), Lit("dynamic_ops:"), _OP_LIST, Lit("static_ops:"), _OP_LIST, Lit("```"))
+    ),
+}
+
+
+class GrammarLogitsProcessor(LogitsProcessor):
+    """
+    Restrict generation to a grammar from GRAMMARS.
+
+    Only the highest-scoring candidates are checked against the grammar (widening the search when
+    none of them fits), so the per-step cost stays small even with a large vocabulary.
+    """
+
+    def __init__(self, grammar: str, tokenizer, token_strings: Optional[dict] = None, top_k: int = 32):
+        self.grammar = GRAMMARS[grammar]
+        self.tokenizer = tokenizer
+        self.token_strings = token_strings if token_strings is not None else {}
+        self.special_ids = set(tokenizer.all_special_ids)
+        self.eos_token_id = tokenizer.eos_token_id
+        self.top_k = top_k
+        self.states = None
+        self.seen_length = 0
+
+    def _token_string(self, token_id: int) -> str:
+        if token_id not in self.token_strings:
+            self.token_strings[token_id] = self.tokenizer.decode([token_id])
+        return self.token_strings[token_id]
+
+    def _allowed(self, state: frozenset, token_id: int) -> bool:
+        if token_id in self.special_ids:
+            return False
+        text = self._token_string(token_id)
+        return bool(text) and bool(self.grammar.feed(state, text))
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor) -> torch.FloatTensor:
+        if self.states is None:
+            # First step: everything so far is prompt (empty when generating from inputs_embeds)
+            self.states = [self.grammar.start] * input_ids.shape[0]
+        else:
+            for row in range(input_ids.shape[0]):
+                for token_id in input_ids[row, self.seen_length :].tolist():
+                    if self.states[row] and token_id not in self.special_ids:
+                        self.states[row] = self.grammar.feed(self.states[row], self._token_string(token_id))
+        self.seen_length = input_ids.shape[1]
+
+        masked = torch.full_like(scores, float("-inf"))
+        for row, state in enumerate(self.states):
+            if not state or self.grammar.is_complete(state):
+                # The structure is closed (or broken): stop right away
+                masked[row, self.eos_token_id] = 0
+                continue
+
+            allowed = []
+            for k in (self.top_k, self.top_k * 32, scores.shape[-1]):
+                candidates = torch.topk(scores[row], min(k, scores.shape[-1])).indices.tolist()
+                allowed = [token_id for token_id in candidates if self._allowed(state, token_id)]
+                if allowed:
+                    break
+            if allowed:
+                masked[row, allowed] = scores[row, allowed]
+            else:
+                masked[row, self.eos_token_id] = 0
+        return masked
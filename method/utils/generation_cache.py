@@ -0,0 +1,270 @@
+"""Disk-backed cache of generated responses, keyed by everything that determines the output."""
+
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from dataclasses import asdict
+from pathlib import Path
+from typing import Iterator, Optional
+
+from loguru import logger
+from PIL import Image
+
+from .cache_utils import image_key
+from .generation_profiles import is_deterministic, resolve_profile, sampling_settings
+
+
+class GenerationCache:
+    """
+    SQLite key-value store bounded by the total size of the cached responses (least recently used
+    entries are evicted). Safe to share between threads and processes.
+
+    Args:
+        path: Database file
+        max_bytes: Size bound of the stored responses
+        check_every: Puts between exact size checks, which pick up the writes of other processes
+    """
+
+    def __init__(self, path: str, max_bytes: int = 1 << 30, check_every: int = 256):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=60, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS generations "
+            "(key TEXT PRIMARY KEY, response TEXT NOT NULL, size INTEGER NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS generations_last_used ON generations (last_used)")
+        # Running total of the stored sizes, re-read from the table once it crosses the bound
+        # and every `check_every` puts
+        self.check_every = check_every
+        self._puts_since_check = 0
+        self._total_bytes = self._stored_bytes()
+
+    @staticmethod
+    def make_key(model_id: str, prompt: str, images: list[Image.Image], settings: dict) -> str:
+        """Hash of the model, prompt, image contents and generation settings of one call."""
+        material = {
+            "model": model_id,
+            "prompt": prompt,
+            "images": [image_key(image) for image in images],
+            "settings": settings,
+        }
+        return hashlib.sha256(json.dumps(material, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            row = self._conn.execute("SELECT response FROM generations WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._conn.execute("UPDATE generations SET last_used = ? WHERE key = ?", (time.time(), key))
+            return row[0]
+
+    def put(self, key: str, response: str):
+        size = len(response.encode("utf-8"))
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO generations (key, response, size, last_used) VALUES (?, ?, ?, ?)",
+                (key, response, size, time.time()),
+            )
+            self._total_bytes += size
+            self._puts_since_check += 1
+            if self._total_bytes > self.max_bytes or self._puts_since_check >= self.check_every:
+                self._total_bytes = self._stored_bytes()
+                self._puts_since_check = 0
+                if self._total_bytes > self.max_bytes:
+                    self._evict()
+
+    def _stored_bytes(self) -> int:
+        return self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM generations").fetchone()[0]
+
+    def _evict(self):
+        # Drop the least recently used entries until the store is back under 90% of its bound
+        excess = self._total_bytes - int(self.max_bytes * 0.9)
+        freed = 0
+        keys = []
+        for key, size in self._conn.execute("SELECT key, size FROM generations ORDER BY last_used"):
+            keys.append(key)
+            freed += size
+            if freed >= excess:
+                break
+        self._conn.executemany("DELETE FROM generations WHERE key = ?", [(key,) for key in keys])
+        self._total_bytes -= freed
+        logger.debug(f"Generation cache evicted {len(keys)} entries ({freed} bytes)")
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM generations").fetchone()[0]
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "entries": len(self),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class CachedModel:
+    """
+    Backend wrapper answering repeated calls from a GenerationCache.
+
+    Only calls that decode greedily (do_sample False or temperature 0 once the profile is merged
+    with the backend params and the call's kwargs) are cached unless `deterministic_only` is False.
+    Error strings returned by a backend are never stored. Everything else (batch methods, caches,
+    tokenizer...) goes straight to the wrapped backend.
+    """
+
+    def __init__(self, model, model_id: str, cache: GenerationCache, deterministic_only: bool = True):
+        self.model = model
+        self.model_id = model_id
+        self.cache = cache
+        self.deterministic_only = deterministic_only
+
+    def __getattr__(self, name):
+        return getattr(self.model, name)
+
+    def _key(self, prompt: str, images: list, max_tokens: Optional[int], profile: Optional[str], kwargs: dict):
+        """Cache key of a call, or None if it must not be cached."""
+        settings = resolve_profile(self.model.profiles, profile, max_tokens, self.model.default_max_tokens)
+        params = getattr(self.model, "params", {})
+        # Backend params take precedence over call kwargs, and the profile over both
+        if self.deterministic_only and not is_deterministic(sampling_settings(settings, {**kwargs, **params})):
+            return None
+        options = {"generation": asdict(settings), "params": params, **kwargs}
+        # The timeout does not change the output
+        options.pop("timeout", None)
+        return GenerationCache.make_key(self.model_id, prompt, images, options)
+
+    def _store(self, key: Optional[str], response: str):
+        if key is not None and not response.startswith("Error:"):
+            self.cache.put(key, response)
+
+    def chat_text(
+        self, prompt: str, max_tokens: Optional[int] = None, profile: Optional[str] = None, **kwargs
+    ) -> str:
+        key = self._key(prompt, [], max_tokens, profile, kwargs)
+        cached = self.cache.get(key) if key is not None else None
+        if cached is not None:
+            return cached
+        response = self.model.chat_text(prompt, max_tokens, profile=profile, **kwargs)
+        self._store(key, response)
+        return response
+
+    def chat_img(
+        self,
+        prompt: str,
+        image: Image.Image,
+        max_tokens: Optional[int] = None,
+        profile: Optional[str] = None,
+        **kwargs,
+    ) -> str:
+        key = self._key(prompt, [image], max_tokens, profile, kwargs)
+        cached = self.cache.get(key) if key is not None else None
+        if cached is not None:
+            return cached
+        response = self.model.chat_img(prompt, image, max_tokens, profile=profile, **kwargs)
+        self._store(key, response)
+        return response
+
+    def chat_multi_img(
+        self,
+        prompt: str,
+        images: list[Image.Image],
+        max_tokens: Optional[int] = None,
+        profile: Optional[str] = None,
+        **kwargs,
+    ) -> str:
+        key = self._key(prompt, images, max_tokens, profile, kwargs)
+        cached = self.cache.get(key) if key is not None else None
+        if cached is not None:
+            return cached
+        response = self.model.chat_multi_img(prompt, images, max_tokens, profile=profile, **kwargs)
+        self._store(key, response)
+        return response
+
+    def chat_text_stream(
+        self, prompt: str, max_tokens: Optional[int] = None, profile: Optional[str] = None, **kwargs
+    ) -> Iterator[str]:
+        return self._stream(prompt, [], max_tokens, profile, kwargs)
+
+    def chat_img_stream(
+        self,
+        prompt: str,
+        image: Image.Image,
+        max_tokens: Optional[int] = None,
+        profile: Optional[str] = None,
+        **kwargs,
+    ) -> Iterator[str]:
+        return self._stream(prompt, [image], max_tokens, profile, kwargs)
+
+    def _stream(self, prompt: str, images: list, max_tokens: Optional[int], profile: Optional[str], kwargs: dict):
+        """A hit is replayed as a single chunk; a miss is stored once the stream has completed."""
+        key = self._key(prompt, images, max_tokens, profile, kwargs)
+        cached = self.cache.get(key) if key is not None else None
+        if cached is not None:
+            yield cached
+            return
+        if images:
+            stream = self.model.chat_img_stream(prompt, images[0], max_tokens, profile=profile, **kwargs)
+        else:
+            stream = self.model.chat_text_stream(prompt, max_tokens, profile=profile, **kwargs)
+        chunks = []
+        for chunk in stream:
+            chunks.append(chunk)
+            yield chunk
+        self._store(key, "".join(chunks))
+
+    async def achat_text(
+        self, prompt: str, max_tokens: Optional[int] = None, profile: Optional[str] = None, **kwargs
+    ) -> str:
+        key = self._key(prompt, [], max_tokens, profile, kwargs)
+        cached = self.cache.get(key) if key is not None else None
+        if cached is not None:
+            return cached
+        if hasattr(self.model, "achat_text"):
+            response = await self.model.achat_text(prompt, max_tokens, profile=profile, **kwargs)
+        else:
+            # Local backends are synchronous; keep the event loop free while they generate
+            response = await asyncio.to_thread(self.model.chat_text, prompt, max_tokens, profile=profile, **kwargs)
+        self._store(key, response)
+        return response
+
+    async def achat_img(
+        self,
+        prompt: str,
+        image: Image.Image,
+        max_tokens: Optional[int] = None,
+        profile: Optional[str] = None,
+        **kwargs,
+    ) -> str:
+        key = self._key(prompt, [image], max_tokens, profile, kwargs)
+        cached = self.cache.get(key) if key is not None else None
+        if cached is not None:
+            return cached
+        if hasattr(self.model, "achat_img"):
+            response = await self.model.achat_img(prompt, image, max_tokens, profile=profile, **kwargs)
+        else:
+            response = await asyncio.to_thread(
+                self.model.chat_img, prompt, image, max_tokens, profile=profile, **kwargs
+            )
+        self._store(key, response)
+        return response
+
+    def cache_stats(self) -> dict:
+        return self.cache.stats()
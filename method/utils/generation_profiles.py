@@ -0,0 +1,147 @@
+"""Named generation profiles, one per call type."""
+
+from dataclasses import dataclass, field, replace
+from typing import Dict, Iterable, Iterator, Optional
+
+
+@dataclass(frozen=True)
+class GenerationProfile:
+    max_tokens: int = 512
+    stop: tuple = field(default_factory=tuple)
+    do_sample: Optional[bool] = None  # None keeps the backend default
+    temperature: Optional[float] = None
+    top_p: Optional[float] = None
+
+
+GENERATION_PROFILES: Dict[str, GenerationProfile] = {
+    # YAML op blocks end at the closing fence (the opening one is "```yaml")
+    "memory_update": GenerationProfile(max_tokens=512, stop=("```\n",), do_sample=False),
+    "static_transfer": GenerationProfile(max_tokens=768, stop=("```\n",), do_sample=False),
+    "alignment": GenerationProfile(max_tokens=384, do_sample=False),
+    "answer": GenerationProfile(max_tokens=512),
+    # A single letter / a single YES or NO
+    "choice": GenerationProfile(max_tokens=8, do_sample=False),
+    "judge": GenerationProfile(max_tokens=8, do_sample=False),
+    # A small JSON object with one YES/NO verdict per criterion
+    "judge_multi": GenerationProfile(max_tokens=128, do_sample=False),
+}
+
+
+def build_profiles(overrides: Optional[Dict[str, dict]] = None) -> Dict[str, GenerationProfile]:
+    """
+    Default profiles with per-profile field overrides applied.
+
+    Args:
+        overrides: e.g. {"answer": {"max_tokens": 256}, "judge": {"stop": ["\\n", "."]}}
+
+    Returns:
+        dict: Profile name -> GenerationProfile
+    """
+    profiles = dict(GENERATION_PROFILES)
+    for name, fields in (overrides or {}).items():
+        if "stop" in fields:
+            fields = {**fields, "stop": tuple(fields["stop"])}
+        profiles[name] = replace(profiles.get(name, GenerationProfile()), **fields)
+    return profiles
+
+
+def resolve_profile(
+    profiles: Dict[str, GenerationProfile],
+    profile: Optional[str],
+    max_tokens: Optional[int],
+    default_max_tokens: int,
+) -> GenerationProfile:
+    """
+    Settings for one call: the named profile, with an explicit `max_tokens` taking precedence.
+
+    Without a profile, the backend's own `default_max_tokens` and sampling defaults apply.
+    """
+    if profile is None:
+        settings = GenerationProfile(max_tokens=default_max_tokens)
+    elif profile in profiles:
+        settings = profiles[profile]
+    else:
+        raise ValueError(f"Unknown generation profile: {profile}")
+    if max_tokens is not None:
+        settings = replace(settings, max_tokens=max_tokens)
+    return settings
+
+
+def truncate_at_stop(text: str, stop: tuple) -> str:
+    """Cut `text` before the earliest stop string, for backends that may run past it."""
+    cut = min((text.find(s) for s in stop if s in text), default=-1)
+    return text[:cut] if cut >= 0 else text
+
+
+def until_stop(chunks: Iterable[str], stop: tuple) -> Iterator[str]:
+    """
+    Streaming counterpart of truncate_at_stop: pass text chunks through, ending before the first
+    stop string. The last `len(stop) - 1` characters are held back until they cannot start a stop string.
+    """
+    if not stop:
+        yield from chunks
+        return
+    holdback = max(len(s) for s in stop) - 1
+    buffer = ""
+    for chunk in chunks:
+        buffer += chunk
+        cut = min((buffer.find(s) for s in stop if s in buffer), default=-1)
+        if cut >= 0:
+            if cut:
+                yield buffer[:cut]
+            return
+        if len(buffer) > holdback:
+            yield buffer[: len(buffer) - holdback]
+            buffer = buffer[len(buffer) - holdback :]
+    if buffer:
+        yield buffer
+
+
+# Generation kwargs a profile is authoritative for
+SAMPLING_KEYS = ("do_sample", "temperature", "top_p")
+
+
+def sampling_settings(settings: GenerationProfile, params: Optional[dict] = None) -> dict:
+    """
+    Sampling kwargs of a call: backend-level `params` fill in what the profile leaves unset, and the
+    profile's own do_sample / temperature / top_p always win. A greedy profile drops the sampling-only keys.
+    """
+    sampling = {key: value for key, value in (params or {}).items() if key in SAMPLING_KEYS}
+    if settings.do_sample is not None:
+        sampling["do_sample"] = settings.do_sample
+    if sampling.get("do_sample") is False:
+        sampling.pop("temperature", None)
+        sampling.pop("top_p", None)
+        return sampling
+    if settings.temperature is not None:
+        sampling["temperature"] = settings.temperature
+    if settings.top_p is not None:
+        sampling["top_p"] = settings.top_p
+    return sampling
+
+
+def is_deterministic(sampling: dict) -> bool:
+    """Whether merged sampling kwargs (see sampling_settings) give greedy output; unset means sampled."""
+    return sampling.get("do_sample") is False or sampling.get("temperature") == 0
+
+
+def hf_generate_kwargs(settings: GenerationProfile, tokenizer, params: Optional[dict] = None) -> dict:
+    """
+    transformers `generate()` kwargs for resolved settings.
+
+    Args:
+        settings: Output of resolve_profile
+        tokenizer: Tokenizer used to match stop strings
+        params: Backend-level generation params; the profile's sampling, stop strings and token cap
+            take precedence over them
+
+    Returns:
+        dict: kwargs for `generate()`
+    """
+    kwargs = {key: value for key, value in (params or {}).items() if key not in SAMPLING_KEYS}
+    kwargs.update(sampling_settings(settings, params))
+    if settings.stop:
+        kwargs["stop_strings"] = list(settings.stop)
+        kwargs["tokenizer"] = tokenizer
+    kwargs["max_new_tokens"] = settings.max_tokens
+    return kwargs
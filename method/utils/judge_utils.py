@@ -0,0 +1,61 @@
+"""YES/NO judging from token probabilities."""
+
+import math
+import re
+from collections import Counter
+from typing import Optional
+
+YES_NO_SPELLINGS = ("YES", "Yes", "yes", "NO", "No", "no")
+
+
+def is_yes(response: str) -> bool:
+    """True if a generated judge reply starts with YES (quotes, markdown and the like ignored)."""
+    return re.match(r"[\W_]*YES\b", response.strip().upper()) is not None
+
+
+def yes_probability_from_top_logprobs(top_logprobs: list[dict]) -> Optional[float]:
+    """
+    P(YES) among the YES/NO candidates of one OpenAI-style `top_logprobs` list.
+
+    Returns:
+        Optional[float]: None if neither YES nor NO is among the candidates
+    """
+    mass = {"YES": 0.0, "NO": 0.0}
+    for candidate in top_logprobs:
+        label = candidate.get("token", "").strip().upper()
+        if label in mass:
+            mass[label] += math.exp(candidate["logprob"])
+    total = mass["YES"] + mass["NO"]
+    return mass["YES"] / total if total > 0 else None
+
+
+def yes_no_token_ids(tokenizer) -> tuple[list[int], list[int]]:
+    """Ids of the YES and NO spellings (with and without a leading space) that are a single token."""
+    ids = {"YES": set(), "NO": set()}
+    for word in YES_NO_SPELLINGS:
+        for text in (word, f" {word}"):
+            token_ids = tokenizer.encode(text, add_special_tokens=False)
+            if len(token_ids) == 1:
+                ids[word.upper()].add(token_ids[0])
+    if not ids["YES"] or not ids["NO"]:
+        raise ValueError("The tokenizer has no single-token spelling of YES or NO")
+    return sorted(ids["YES"]), sorted(ids["NO"])
+
+
+def yes_probability_from_logits(logits, yes_ids: list[int], no_ids: list[int]) -> float:
+    """P(YES) among the YES/NO tokens, from the next-token logits (1-D tensor) of a forward pass."""
+    yes = logits[yes_ids].float().logsumexp(0)
+    no = logits[no_ids].float().logsumexp(0)
+    return float((yes - no).sigmoid())
+
+
+def token_f1(reference: str, answer: str) -> float:
+    """Lexical overlap of two texts: F1 of their lowercase word multisets."""
+    reference_tokens = Counter(re.findall(r"\w+", reference.lower()))
+    answer_tokens = Counter(re.findall(r"\w+", answer.lower()))
+    common = sum((reference_tokens & answer_tokens).values())
+    if common == 0:
+        return 0.0
+    precision = common / sum(answer_tokens.values())
+    recall = common / sum(reference_tokens.values())
+    return 2 * precision * recall / (precision + recall)
@@ -0,0 +1,82 @@
+"""Log-bucketed latency histograms, one per call type."""
+
+import math
+import threading
+from collections import defaultdict
+from typing import Optional
+
+
+class LatencyHistogram:
+    """
+    Histogram with geometrically growing buckets (each `growth` times wider than the previous),
+    so quantiles keep a bounded relative error from milliseconds to many minutes.
+    """
+
+    def __init__(self, min_seconds: float = 0.01, growth: float = 1.2, num_buckets: int = 64):
+        self.min_seconds = min_seconds
+        self.growth = growth
+        self.counts = [0] * num_buckets
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def _bucket(self, seconds: float) -> int:
+        if seconds <= self.min_seconds:
+            return 0
+        index = int(math.log(seconds / self.min_seconds, self.growth)) + 1
+        return min(index, len(self.counts) - 1)
+
+    def upper_bound(self, bucket: int) -> float:
+        return self.min_seconds * self.growth**bucket
+
+    def record(self, seconds: float):
+        self.counts[self._bucket(seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the q-quantile (capped by the largest sample)."""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for bucket, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return min(self.upper_bound(bucket), self.max)
+        return self.max
+
+    def summary(self) -> dict:
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else 0.0,
+            "p50": self.quantile(0.5),
+            "p90": self.quantile(0.9),
+            "p99": self.quantile(0.99),
+            "max": self.max,
+        }
+
+
+class LatencyTracker:
+    """Thread-safe collection of LatencyHistograms keyed by call type."""
+
+    def __init__(self):
+        self.histograms = defaultdict(LatencyHistogram)
+        self._lock = threading.Lock()
+
+    def record(self, call_type: str, seconds: float):
+        with self._lock:
+            self.histograms[call_type].record(seconds)
+
+    def quantile(self, call_type: str, q: float, min_samples: int = 1) -> Optional[float]:
+        """q-quantile for `call_type`, or None until `min_samples` latencies were recorded."""
+        with self._lock:
+            histogram = self.histograms.get(call_type)
+            if histogram is None or histogram.count < min_samples:
+                return None
+            return histogram.quantile(q)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {call_type: histogram.summary() for call_type, histogram in sorted(self.histograms.items())}
@@ -177,7 +177,8 @@ class MemoryManager:
         memory: memory content
         Note: Both static and dynamic memory now use the same simple string format
         """
-        m = re.search(r"```yaml\s*(.*?)```", response, re.S)
+        # The closing fence is missing when generation stopped on it (see generation_profiles)
+        m = re.search(r"```yaml\s*(.*?)(?:```|$)", response, re.S)
         response = m.group(1) if m else response
         try:
             parsed_response = yaml.safe_load(response)
@@ -1,18 +1,74 @@
+import importlib
+import os
 from typing import Dict, Optional, Union
 
-from .models.api_model import APIModel
-from .models.qwenvl_model import QwenVLModel
-from .models.internvl_model import InternVLModel
-
-
-def MLLMFactory(model_id: str, params: Optional[Dict] = None):
-    # Check each model class directly
-    model_classes = [
-        QwenVLModel,
-        APIModel,
-        InternVLModel,
-    ]
-    for model_class in model_classes:
-        if model_id in model_class.model_list():
-            return model_class(model_id, params)
-    raise ValueError(f"Model {model_id} not supported")
+from .batching_utils import BatchScheduler
+from .generation_cache import CachedModel, GenerationCache
+from .generation_profiles import build_profiles
+
+# Model id -> (backend module, class name, runs locally): the list of supported models. Backend
+# modules are imported only when one of their models is requested, so API-only processes never
+# load torch / transformers.
+MODEL_REGISTRY = {
+    "Qwen/Qwen2.5-VL-7B-Instruct": (".models.qwenvl_model", "QwenVLModel", True),
+    "gemini-2.5-pro": (".models.api_model", "APIModel", False),
+    "Qwen/Qwen2.5-72B-Instruct": (".models.api_model", "APIModel", False),
+    "OpenGVLab/InternVL3-8B": (".models.internvl_model", "InternVLModel", True),
+}
+
+
+def get_model_class(model_id: str):
+    """Import and return the backend class serving `model_id`."""
+    if model_id not in MODEL_REGISTRY:
+        raise ValueError(f"Model {model_id} not supported")
+    module_name, class_name, _ = MODEL_REGISTRY[model_id]
+    return getattr(importlib.import_module(module_name, package=__package__), class_name)
+
+
+def MLLMFactory(
+    model_id: str,
+    params: Optional[Dict] = None,
+    batching: Optional[Dict] = None,
+    profiles: Optional[Dict[str, Dict]] = None,
+    cache: Optional[Dict] = None,
+    server: Optional[str] = None,
+):
+    """
+    Create the backend serving `model_id`.
+
+    Args:
+        model_id: Model identifier
+        params: Extra generation parameters passed to the backend
+        batching: If given, wrap local backends in a BatchScheduler with these
+            options (e.g. {"max_batch_size": 8, "max_wait_ms": 20})
+        profiles: Per-profile overrides of the generation profiles
+            (e.g. {"answer": {"max_tokens": 256}}), see generation_profiles
+        cache: If given, answer repeated calls from a disk-backed GenerationCache, e.g.
+            {"path": "cache/generations.sqlite", "max_bytes": 1 << 30, "deterministic_only": True};
+            the GENERATION_CACHE environment variable (a path) enables it with the defaults
+        server: Unix socket of a running model_server (default: the MODEL_SERVER environment
+            variable); local models are then served by it instead of being loaded in this process.
+            The server's params, batching and profiles apply to them. Its key must be set in
+            MODEL_SERVER_AUTHKEY.
+    """
+    if cache is None and os.getenv("GENERATION_CACHE"):
+        cache = {"path": os.getenv("GENERATION_CACHE")}
+    if server is None:
+        server = os.getenv("MODEL_SERVER")
+
+    if model_id not in MODEL_REGISTRY:
+        raise ValueError(f"Model {model_id} not supported")
+    if server and MODEL_REGISTRY[model_id][2]:
+        from .model_server import RemoteModel
+
+        model = RemoteModel(model_id, server)
+    else:
+        model = get_model_class(model_id)(model_id, params)
+        model.profiles = build_profiles(profiles)
+        if batching is not None and MODEL_REGISTRY[model_id][2]:
+            model = BatchScheduler(model, **batching)
+    if cache is not None:
+        cache = dict(cache)
+        deterministic_only = cache.pop("deterministic_only", True)
+        model = CachedModel(model, model_id, GenerationCache(**cache), deterministic_only)
+    return model
@@ -0,0 +1,307 @@
+"""Local mock of an OpenAI-compatible /chat/completions endpoint for APIModel and the LLM judge."""
+
+import argparse
+import json
+import math
+import random
+import re
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Optional
+
+from loguru import logger
+
+
+def echo_reply(payload: dict) -> str:
+    """Default reply: the first characters of the prompt text."""
+    content = payload["messages"][-1]["content"]
+    if isinstance(content, list):
+        content = " ".join(part.get("text", "") for part in content if part.get("type") == "text")
+    return f"echo: {content[:64]}"
+
+
+def _word_overlap(reference: str, answer: str) -> float:
+    reference_words = set(re.findall(r"\w+", reference.lower()))
+    answer_words = set(re.findall(r"\w+", answer.lower()))
+    return len(reference_words & answer_words) / max(len(reference_words), 1)
+
+
+def _prompt_text(payload: dict) -> str:
+    content = payload["messages"][-1]["content"]
+    if isinstance(content, list):
+        content = " ".join(part.get("text", "") for part in content if part.get("type") == "text")
+    return content
+
+
+def judge_yes_probability(payload: dict) -> float:
+    """P(YES) of the mock judge for a YES/NO prompt: rises smoothly with the word overlap, 0.5 at half."""
+    content = _prompt_text(payload)
+    answer = re.search(r"^(?:Predicted Answer|Answer): (.*)$", content, re.MULTILINE)
+    reference = re.search(r"^(?:Ideal Answer|Key Point): (.*)$", content, re.MULTILINE)
+    if answer is None or reference is None:
+        return 0.0
+    return 1 / (1 + math.exp(-12 * (_word_overlap(reference.group(1), answer.group(1)) - 0.5)))
+
+
+def judge_reply(payload: dict) -> str:
+    """
+    Deterministic stand-in for an LLM judge (the evaluator's YES/NO prompts): YES when the answer
+    contains at least half of the words of the reference (ideal answer or key point). Single-prompt
+    judgements ("[name] Ideal Answer: ..." / "[name] Key Point: ..." criteria) get a JSON object.
+    """
+    content = _prompt_text(payload)
+    answer = re.search(r"^(?:Predicted Answer|Answer): (.*)$", content, re.MULTILINE)
+    if answer is None:
+        return "NO"
+    criteria = re.findall(r"^\[(\w+)\] (?:Ideal Answer|Key Point): (.*)$", content, re.MULTILINE)
+    if criteria:
+        verdicts = {
+            name: "YES" if _word_overlap(reference, answer.group(1)) >= 0.5 else "NO" for name, reference in criteria
+        }
+        return json.dumps(verdicts)
+    return "YES" if judge_yes_probability(payload) >= 0.5 else "NO"
+
+
+class MockOpenAIServer:
+    """
+    Threaded HTTP/1.1 server answering chat completions with `reply(payload)`.
+
+    Tracks the number of requests and of distinct TCP connections, so a client that keeps
+    its connections alive shows far fewer connections than requests. Requests asking for `logprobs`
+    get the top logprobs of the first reply token, from `yes_probability(payload)` when given
+    (a YES/NO judge) or else certainty of the first reply word.
+    """
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        reply: Callable[[dict], str] = echo_reply,
+        latency_ms: float = 0.0,
+        max_rps: Optional[float] = None,
+        tail_fraction: float = 0.0,
+        tail_latency_ms: float = 0.0,
+        yes_probability: Optional[Callable[[dict], float]] = None,
+        fail_requests: int = 0,
+    ):
+        self.reply = reply
+        self.yes_probability = yes_probability
+        self.latency_ms = latency_ms
+        # Stragglers: this fraction of the requests takes `tail_latency_ms` instead
+        self.tail_fraction = tail_fraction
+        self.tail_latency_ms = tail_latency_ms
+        # Provider-side rate limit: requests beyond `max_rps` get a 429 with Retry-After
+        self.max_rps = max_rps
+        self._allowance = max_rps or 0.0
+        self._allowance_updated = time.monotonic()
+        self.rejected = 0
+        # Transient errors: the first `fail_requests` requests get a 500
+        self.fail_requests = fail_requests
+        self.failed = 0
+        self.requests = 0
+        self.connections = 0
+        self.max_in_flight = 0
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer((host, port), self._handler_class())
+        self.httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _admit(self) -> bool:
+        if self.max_rps is None:
+            return True
+        with self._lock:
+            now = time.monotonic()
+            self._allowance = min(self.max_rps, self._allowance + (now - self._allowance_updated) * self.max_rps)
+            self._allowance_updated = now
+            if self._allowance < 1:
+                self.rejected += 1
+                return False
+            self._allowance -= 1
+            return True
+
+    def _fail(self) -> bool:
+        with self._lock:
+            if self.failed >= self.fail_requests:
+                return False
+            self.failed += 1
+            return True
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive
+
+            def setup(self):
+                super().setup()
+                # Headers and body go out as separate writes; avoid the delayed-ACK stall
+                self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                with server._lock:
+                    server.connections += 1
+
+            def log_message(self, format, *args):
+                logger.debug(f"Mock server: {format % args}")
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if not self.path.rstrip("/").endswith("/chat/completions"):
+                    self._send(404, {"error": {"message": f"Unknown path {self.path}"}})
+                    return
+                if server._fail():
+                    self._send(500, {"error": {"message": "Internal server error"}})
+                    return
+                if not server._admit():
+                    self._send(429, {"error": {"message": "Rate limit exceeded"}}, {"Retry-After": "1"})
+                    return
+                with server._lock:
+                    server.requests += 1
+                    server._in_flight += 1
+                    server.max_in_flight = max(server.max_in_flight, server._in_flight)
+                try:
+                    payload = json.loads(body)
+                    latency_ms = server.tail_latency_ms if random.random() < server.tail_fraction else server.latency_ms
+                    text = server.reply(payload)
+                    if payload.get("stream"):
+                        self._send_stream(payload, text, latency_ms)
+                        return
+                    if latency_ms:
+                        time.sleep(latency_ms / 1000)
+                finally:
+                    with server._lock:
+                        server._in_flight -= 1
+                choice = {"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}
+                if payload.get("logprobs"):
+                    choice["logprobs"] = server._logprobs(payload, text)
+                    choice["message"]["content"] = choice["logprobs"]["content"][0]["token"]
+                self._send(
+                    200,
+                    {
+                        "id": f"chatcmpl-mock-{server.requests}",
+                        "object": "chat.completion",
+                        "created": int(time.time()),
+                        "model": payload.get("model", "mock"),
+                        "choices": [choice],
+                    },
+                )
+
+            def _send_stream(self, payload: dict, text: str, latency_ms: float):
+                """Server-sent events, one word per chunk, with the latency spread over the chunks."""
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                words = text.split(" ")
+                events = []
+                for i, word in enumerate(words):
+                    delta = {"content": word if i == 0 else f" {word}"}
+                    chunk = {
+                        "object": "chat.completion.chunk",
+                        "model": payload.get("model", "mock"),
+                        "choices": [{"index": 0, "delta": delta, "finish_reason": None}],
+                    }
+                    events.append(f"data: {json.dumps(chunk)}\n\n")
+                events.append("data: [DONE]\n\n")
+                try:
+                    for event in events:
+                        if latency_ms:
+                            time.sleep(latency_ms / 1000 / len(words))
+                        encoded = event.encode("utf-8")
+                        self.wfile.write(f"{len(encoded):X}\r\n".encode("ascii") + encoded + b"\r\n")
+                    self.wfile.write(b"0\r\n\r\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+            def _send(self, status: int, data: dict, headers: Optional[dict] = None):
+                encoded = json.dumps(data).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(encoded)))
+                self.end_headers()
+                try:
+                    self.wfile.write(encoded)
+                except (BrokenPipeError, ConnectionResetError):
+                    # The client gave up on the request (deadline or lost hedge)
+                    pass
+
+        return Handler
+
+    def _logprobs(self, payload: dict, text: str) -> dict:
+        """OpenAI-style logprobs of the first generated token."""
+        if self.yes_probability is not None:
+            p = min(max(self.yes_probability(payload), 1e-6), 1 - 1e-6)
+            candidates = [{"token": "YES", "logprob": math.log(p)}, {"token": "NO", "logprob": math.log(1 - p)}]
+            candidates.sort(key=lambda candidate: -candidate["logprob"])
+        else:
+            candidates = [{"token": (text.split() or [""])[0], "logprob": 0.0}]
+        top = candidates[: payload.get("top_logprobs", 0)]
+        return {"content": [{**candidates[0], "top_logprobs": top}]}
+
+    def start(self) -> "MockOpenAIServer":
+        """Serve on a background thread."""
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="mock-openai", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self) -> "MockOpenAIServer":
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "rejected": self.rejected,
+            "failed": self.failed,
+            "connections": self.connections,
+            "max_in_flight": self.max_in_flight,
+        }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mock OpenAI-compatible chat completions server")
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--reply", type=str, default=None, help="Fixed reply text (default: echo the prompt)")
+    parser.add_argument("--judge", action="store_true", help="Answer the evaluator's judge prompts with YES/NO")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Simulated generation latency")
+    parser.add_argument("--max-rps", type=float, default=None, help="Answer 429 above this request rate")
+    parser.add_argument("--tail-fraction", type=float, default=0.0, help="Fraction of slow requests")
+    parser.add_argument("--tail-latency-ms", type=float, default=0.0, help="Latency of the slow requests")
+    parser.add_argument("--fail-requests", type=int, default=0, help="Answer the first N requests with a 500")
+    args = parser.parse_args()
+
+    if args.reply is not None:
+        reply = lambda payload: args.reply
+    else:
+        reply = judge_reply if args.judge else echo_reply
+    server = MockOpenAIServer(
+        args.host,
+        args.port,
+        reply=reply,
+        latency_ms=args.latency_ms,
+        max_rps=args.max_rps,
+        tail_fraction=args.tail_fraction,
+        tail_latency_ms=args.tail_latency_ms,
+        yes_probability=judge_yes_probability if args.judge else None,
+        fail_requests=args.fail_requests,
+    )
+    logger.info(f"Mock OpenAI server listening on {server.url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
@@ -0,0 +1,262 @@
+"""Shared local model server: one process owns each local model, runners connect through RemoteModel."""
+
+import argparse
+import os
+import secrets
+import tempfile
+import threading
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Connection, Listener
+from typing import Any, Dict, Iterator, Optional
+
+from loguru import logger
+
+# Inside a per-user directory that only its owner can enter
+DEFAULT_SOCKET = os.path.join(tempfile.gettempdir(), f"tame-model-server-{os.getuid()}", "server.sock")
+
+
+def _client_authkey() -> bytes:
+    key = os.getenv("MODEL_SERVER_AUTHKEY")
+    if not key:
+        raise ValueError("MODEL_SERVER_AUTHKEY environment variable is not set (the model server prints its key)")
+    return key.encode("utf-8")
+
+
+def _private_socket_dir(address: str):
+    """Create the socket's directory (mode 700), or check that an existing one is private to this user."""
+    directory = os.path.dirname(os.path.abspath(address))
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    info = os.stat(directory)
+    if info.st_uid != os.getuid() or info.st_mode & 0o077:
+        raise PermissionError(
+            f"Model server socket directory {directory} must belong to this user and be private (chmod 700)"
+        )
+
+
+class ModelServer:
+    """
+    Serve local models over a Unix socket, one thread per client connection.
+
+    Args:
+        address: Unix socket path, in a directory private to this user
+        batching: BatchScheduler options for every served model (None: serve calls one by one)
+        authkey: Key clients must present (default: MODEL_SERVER_AUTHKEY, else a random key that is logged)
+    """
+
+    def __init__(
+        self, address: str = DEFAULT_SOCKET, batching: Optional[Dict] = None, authkey: Optional[str] = None
+    ):
+        self.address = address
+        self.batching = batching
+        self.authkey = authkey or os.getenv("MODEL_SERVER_AUTHKEY")
+        self._generated_authkey = not self.authkey
+        if self._generated_authkey:
+            self.authkey = secrets.token_hex(16)
+        self.models: Dict[str, Any] = {}
+        # One lock per model: batches, streams and unscheduled calls never run on the same weights at once
+        self.locks: Dict[str, threading.Lock] = {}
+        self._load_lock = threading.Lock()
+        self.listener: Optional[Listener] = None
+
+    def get_model(self, model_id: str):
+        """Load `model_id` on first use (once, even with concurrent clients)."""
+        with self._load_lock:
+            if model_id not in self.models:
+                from .batching_utils import BatchScheduler
+                from .mllm_factory import get_model_class
+
+                logger.info(f"Model server loading {model_id}")
+                lock = threading.Lock()
+                # Built directly rather than through MLLMFactory, which would route back to this server
+                model = get_model_class(model_id)(model_id, None)
+                if self.batching is not None:
+                    model = BatchScheduler(model, lock=lock, **self.batching)
+                self.models[model_id] = model
+                self.locks[model_id] = lock
+            return self.models[model_id]
+
+    def serve_forever(self):
+        _private_socket_dir(self.address)
+        if os.path.exists(self.address):
+            os.unlink(self.address)
+        self.listener = Listener(self.address, family="AF_UNIX", authkey=self.authkey.encode("utf-8"))
+        os.chmod(self.address, 0o600)
+        logger.info(f"Model server listening on {self.address}")
+        if self._generated_authkey:
+            logger.info(f"Clients need MODEL_SERVER={self.address} MODEL_SERVER_AUTHKEY={self.authkey}")
+        try:
+            while True:
+                try:
+                    conn = self.listener.accept()
+                except (AuthenticationError, EOFError, ConnectionResetError) as e:
+                    logger.warning(f"Model server rejected a client: {e}")
+                    continue
+                client = threading.Thread(target=self._handle, args=(conn,), name="model-server-client", daemon=True)
+                client.start()
+        finally:
+            self.listener.close()
+
+    def _handle(self, conn: Connection):
+        try:
+            while True:
+                try:
+                    message = conn.recv()
+                except (EOFError, ConnectionResetError):
+                    return
+                kind, model_id = message[0], message[1]
+                try:
+                    model = self.get_model(model_id)
+                    if kind == "describe":
+                        conn.send(("ok", self._describe(model)))
+                    elif message[2].endswith("_stream"):
+                        self._stream(conn, model_id, model, *message[2:])
+                    else:
+                        conn.send(("ok", self._call(model_id, model, *message[2:])))
+                except (BrokenPipeError, ConnectionResetError):
+                    # The client went away, e.g. it closed a stream early
+                    return
+                except Exception as e:
+                    conn.send(("error", self._picklable(e)))
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _describe(model) -> dict:
+        return {
+            "profiles": model.profiles,
+            "default_max_tokens": model.default_max_tokens,
+            "params": getattr(model, "params", {}),
+            "supports_constrained_decoding": getattr(model, "supports_constrained_decoding", False),
+            # BatchScheduler forwards the methods it does not schedule to the backend
+            "methods": [
+                name
+                for name in set(dir(model)) | set(dir(getattr(model, "model", model)))
+                if name.startswith("chat")
+            ],
+        }
+
+    def _call(self, model_id: str, model, method: str, args: tuple, kwargs: dict):
+        if not method.startswith("chat"):
+            raise AttributeError(f"Model server does not expose {method}")
+        if self.batching is not None and method in ("chat_text", "chat_img"):
+            # The scheduler takes the model lock itself while it serves a batch
+            return getattr(model, method)(*args, **kwargs)
+        with self.locks[model_id]:
+            return getattr(model, method)(*args, **kwargs)
+
+    def _stream(self, conn: Connection, model_id: str, model, method: str, args: tuple, kwargs: dict):
+        with self.locks[model_id]:
+            for chunk in getattr(model, method)(*args, **kwargs):
+                conn.send(("chunk", chunk))
+        conn.send(("end", None))
+
+    @staticmethod
+    def _picklable(error: Exception) -> Exception:
+        import pickle
+
+        try:
+            pickle.dumps(error)
+            return error
+        except Exception:
+            return RuntimeError(f"{type(error).__name__}: {error}")
+
+
+class RemoteModel:
+    """
+    Client backend forwarding chat calls to a ModelServer.
+
+    Each thread gets its own connection, so a RemoteModel can be shared by threads (e.g. behind
+    a CachedModel) and concurrent requests reach the server's batch scheduler together.
+    """
+
+    def __init__(self, model_id: str, address: str = DEFAULT_SOCKET):
+        self.model_id = model_id
+        self.address = address
+        self._local = threading.local()
+        info = self._request(("describe", model_id))
+        self.profiles = info["profiles"]
+        self.default_max_tokens = info["default_max_tokens"]
+        self.params = info["params"]
+        self.supports_constrained_decoding = info["supports_constrained_decoding"]
+        self._methods = set(info["methods"])
+
+    def _connection(self) -> Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = Client(self.address, family="AF_UNIX", authkey=_client_authkey())
+            self._local.conn = conn
+        return conn
+
+    def _request(self, message: tuple):
+        conn = self._connection()
+        conn.send(message)
+        status, value = conn.recv()
+        if status == "error":
+            raise value
+        return value
+
+    def _call(self, method: str, *args, **kwargs):
+        return self._request(("call", self.model_id, method, args, kwargs))
+
+    def _stream(self, method: str, *args, **kwargs) -> Iterator[str]:
+        conn = self._connection()
+        conn.send(("call", self.model_id, method, args, kwargs))
+        finished = False
+        try:
+            while True:
+                status, value = conn.recv()
+                if status == "error":
+                    finished = True
+                    raise value
+                if status == "end":
+                    finished = True
+                    return
+                yield value
+        finally:
+            if not finished:
+                # The server is still sending this stream; drop the connection rather than desync it
+                conn.close()
+                self._local.conn = None
+
+    def __getattr__(self, name):
+        # Batch methods (chat_batch, chat_text_batch, chat_img_batch) exist only if the served backend has them
+        if name.startswith("chat") and name in self.__dict__.get("_methods", ()):
+            return lambda *args, **kwargs: self._call(name, *args, **kwargs)
+        raise AttributeError(name)
+
+    def chat_text(self, prompt: str, max_tokens: Optional[int] = None, **kwargs) -> str:
+        return self._call("chat_text", prompt, max_tokens, **kwargs)
+
+    def chat_img(self, prompt: str, image, max_tokens: Optional[int] = None, **kwargs) -> str:
+        return self._call("chat_img", prompt, image, max_tokens, **kwargs)
+
+    def chat_multi_img(self, prompt: str, images: list, max_tokens: Optional[int] = None, **kwargs) -> str:
+        return self._call("chat_multi_img", prompt, images, max_tokens, **kwargs)
+
+    def chat_text_stream(self, prompt: str, max_tokens: Optional[int] = None, **kwargs) -> Iterator[str]:
+        return self._stream("chat_text_stream", prompt, max_tokens, **kwargs)
+
+    def chat_img_stream(self, prompt: str, image, max_tokens: Optional[int] = None, **kwargs) -> Iterator[str]:
+        return self._stream("chat_img_stream", prompt, image, max_tokens, **kwargs)
+
+    def close(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Shared local model server")
+    parser.add_argument("--socket", type=str, default=DEFAULT_SOCKET, help="Unix socket path")
+    parser.add_argument("--models", nargs="*", default=[], help="Model ids to load at startup")
+    parser.add_argument("--max-batch-size", type=int, default=8, help="Batch size of the request scheduler")
+    parser.add_argument("--max-wait-ms", type=float, default=20.0, help="Batching window of the request scheduler")
+    parser.add_argument("--no-batching", action="store_true", help="Serve requests one by one")
+    args = parser.parse_args()
+
+    batching = None if args.no_batching else {"max_batch_size": args.max_batch_size, "max_wait_ms": args.max_wait_ms}
+    server = ModelServer(args.socket, batching=batching)
+    for model_id in args.models:
+        server.get_model(model_id)
+    server.serve_forever()
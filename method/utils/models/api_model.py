@@ -1,24 +1,78 @@
+import asyncio
 import base64
+import json
 import os
+import threading
 import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait
 from io import BytesIO
-from typing import Optional
+from typing import Iterator, Optional
 
 import dotenv
 import requests
 from loguru import logger
 from PIL import Image
+from requests.adapters import HTTPAdapter
+
+from ..cache_utils import LRUCache, image_key
+from ..generation_profiles import (
+    SAMPLING_KEYS,
+    build_profiles,
+    resolve_profile,
+    sampling_settings,
+    truncate_at_stop,
+    until_stop,
+)
+from ..judge_utils import is_yes, yes_probability_from_top_logprobs
+from ..latency_utils import LatencyTracker
+from ..rate_limit_utils import RequestCancelled, SharedRateLimiter, jittered_backoff, parse_retry_after
 
 # from .base_model import BaseModel
 
+# Reasoning models spend completion tokens on thinking, so the profile caps are not sent to them
+REASONING_MODEL_PREFIXES = ("gemini-2.5", "o1", "o3", "o4")
+
+# Image payload encoding per model: longest edge in pixels (images are only ever downscaled) and JPEG quality
+IMAGE_ENCODING = {
+    "gemini-2.5-pro": {"max_edge": 1024, "quality": 90},
+    "Qwen/Qwen2.5-72B-Instruct": {"max_edge": 640, "quality": 85},
+}
+DEFAULT_IMAGE_ENCODING = {"max_edge": 1024, "quality": 85}
+
 
 class APIModel:
-    def __init__(self, model_id: str, params={}):
+    def __init__(
+        self,
+        model_id: str,
+        params={},
+        max_concurrency: Optional[int] = None,
+        rate_limit: Optional[dict] = None,
+        timeout: Optional[float] = None,
+        hedging: Optional[dict] = None,
+        image_encoding: Optional[dict] = None,
+        image_cache_size: int = 128,
+    ):
         """
         Initialize APIModel with model_id and API key.
 
         Args:
             model_id: Model identifier (e.g., "gpt-4-vision-preview")
+            params: Extra payload fields merged into every request (the profile's sampling, token cap and
+                stop fields take precedence)
+            max_concurrency: Maximum number of requests in flight through the async interface,
+                which is also the size of the keep-alive connection pool
+                (default: API_MAX_CONCURRENCY environment variable, else 8)
+            rate_limit: SharedRateLimiter options (e.g. {"rate": 2, "max_concurrency": 16}); the rate
+                can also be set with API_RATE_LIMIT and the concurrency with API_MAX_CONCURRENCY.
+                Without a rate, requests are not throttled, but a 429 still pauses every client
+            timeout: Default per-call deadline in seconds, retries included
+                (default: API_TIMEOUT environment variable, else 600)
+            hedging: Enable hedged requests, e.g. {"quantile": 0.9, "max_rate": 0.1, "min_samples": 20}:
+                a duplicate request is sent when a call is slower than that latency quantile of its
+                call type, for at most `max_rate` of the calls (also enabled by API_HEDGE_MAX_RATE)
+            image_encoding: Override of the model's IMAGE_ENCODING entry, e.g. {"max_edge": 768, "quality": 80}
+            image_cache_size: Number of encoded image payloads kept, keyed by image content
         """
         super().__init__()
         dotenv.load_dotenv()
@@ -30,26 +84,112 @@ class APIModel:
         self.api_base = os.getenv("API_URL")
         self.headers = {"Content-Type": "application/json", "Authorization": f"Bearer {self.api_key}"}
         self.params = {} if params is None else params
+        # Named generation profiles (see generation_profiles); MLLMFactory may override them
+        self.profiles = build_profiles()
+        self.default_max_tokens = 2048
+        # Encoded (resized, JPEG, base64) images, reused when the same image is sent again
+        self.image_encoding = {
+            **DEFAULT_IMAGE_ENCODING,
+            **IMAGE_ENCODING.get(model_id, {}),
+            **(image_encoding or {}),
+        }
+        self.image_cache = LRUCache(max_entries=image_cache_size, sizeof=len)
 
-    @staticmethod
-    def model_list():
-        return ["gemini-2.5-pro", "Qwen/Qwen2.5-72B-Instruct"]
+        # One keep-alive session for all calls, so only the first request per connection pays for
+        # the TCP/TLS handshake; the pool holds one connection per concurrent request
+        if max_concurrency is None:
+            max_concurrency = int(os.getenv("API_MAX_CONCURRENCY", 8))
+        self.max_concurrency = max_concurrency
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        # Token bucket and concurrency slots shared by all threads and processes calling this endpoint
+        rate_limit = dict(rate_limit or {})
+        if os.getenv("API_RATE_LIMIT"):
+            rate_limit.setdefault("rate", float(os.getenv("API_RATE_LIMIT")))
+        if os.getenv("API_MAX_CONCURRENCY"):
+            rate_limit.setdefault("max_concurrency", int(os.getenv("API_MAX_CONCURRENCY")))
+        self.rate_limiter = SharedRateLimiter(f"{self.api_base}|{self.model_id}", **rate_limit)
+        self.timeout = timeout if timeout is not None else float(os.getenv("API_TIMEOUT", 600))
+        if hedging is None and os.getenv("API_HEDGE_MAX_RATE"):
+            hedging = {"max_rate": float(os.getenv("API_HEDGE_MAX_RATE"))}
+        if hedging is not None:
+            hedging = {"quantile": 0.9, "max_rate": 0.1, "min_samples": 20, **hedging}
+        self.hedging = hedging
+        # Request latencies per call type (generation profile), which also set the hedging threshold
+        self.latency = LatencyTracker()
+        self.hedge_counts = {"calls": 0, "hedges": 0, "hedge_wins": 0, "abandoned": 0}
+        self._hedge_lock = threading.Lock()
+        self._hedge_executor: Optional[ThreadPoolExecutor] = None
+        # Created lazily by the async interface
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._semaphores = weakref.WeakKeyDictionary()  # event loop -> asyncio.Semaphore
 
     def _encode_image(self, image: Image.Image) -> str:
-        """Convert PIL Image to base64 string."""
+        """Convert PIL Image to a base64 JPEG string, downscaled to the model's max edge (cached)."""
+        max_edge, quality = self.image_encoding["max_edge"], self.image_encoding["quality"]
+        key = (image_key(image), max_edge, quality)
+        encoded = self.image_cache.get(key)
+        if encoded is not None:
+            return encoded
+
         image = image.convert("RGB")
+        if max(image.size) > max_edge:
+            scale = max_edge / max(image.size)
+            size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+            image = image.resize(size, Image.Resampling.BICUBIC)
         buffered = BytesIO()
-        image.save(buffered, format="JPEG")
-        return base64.b64encode(buffered.getvalue()).decode("utf-8")
+        image.save(buffered, format="JPEG", quality=quality)
+        encoded = base64.b64encode(buffered.getvalue()).decode("utf-8")
+        self.image_cache.put(key, encoded)
+        return encoded
+
+    def chat_img(
+        self,
+        prompt: str,
+        image: Image.Image,
+        max_tokens: Optional[int] = None,
+        profile: Optional[str] = None,
+        timeout: Optional[float] = None,
+    ) -> str:
+        return self.chat_multi_img(prompt, [image], max_tokens, profile=profile, timeout=timeout)
 
-    def chat_img(self, prompt: str, image: Image.Image, max_tokens: int = 2048) -> str:
-        return self.chat_multi_img(prompt, [image], max_tokens)
+    def chat_text(
+        self,
+        prompt: str,
+        max_tokens: Optional[int] = None,
+        profile: Optional[str] = None,
+        timeout: Optional[float] = None,
+    ) -> str:
+        return self.chat_multi_img(prompt, [], max_tokens, profile=profile, timeout=timeout)
+
+    @property
+    def is_reasoning_model(self) -> bool:
+        return self.model_id.startswith(REASONING_MODEL_PREFIXES)
 
-    def chat_text(self, prompt: str, max_tokens: int = 2048) -> str:
-        return self.chat_multi_img(prompt, [], max_tokens)
+    def _generation_payload(self, max_tokens: Optional[int], temperature: float, profile: Optional[str]) -> dict:
+        """Sampling, token cap and stop fields of the request for the resolved profile (over self.params)"""
+        settings = resolve_profile(self.profiles, profile, max_tokens, self.default_max_tokens)
+        fields = sampling_settings(settings, {"temperature": temperature, **self.params})
+        # The API has no do_sample: greedy decoding is temperature 0
+        if fields.pop("do_sample", None) is False:
+            fields["temperature"] = 0.0
+        if settings.stop:
+            fields["stop"] = list(settings.stop)
+        if not self.is_reasoning_model:
+            fields["max_tokens"] = settings.max_tokens
+        return fields
 
     def chat_multi_img(
-        self, prompt: str, images: list[Image.Image], max_tokens: int = 2048, temperature: float = 0.8
+        self,
+        prompt: str,
+        images: list[Image.Image],
+        max_tokens: Optional[int] = None,
+        temperature: float = 0.8,
+        profile: Optional[str] = None,
+        timeout: Optional[float] = None,
     ) -> str:
         """
         Generate text response for the given prompt and multiple images using OpenAI API.
@@ -57,11 +197,254 @@ class APIModel:
         Args:
             prompt: Text prompt to process
             images: List of images to analyze (list of PIL Image objects)
-            max_tokens: Maximum number of tokens to generate
+            max_tokens: Maximum number of tokens to generate (default: the profile's cap)
+            temperature: Sampling temperature when the profile does not set one
+            profile: Generation profile name (see generation_profiles)
+            timeout: Deadline in seconds for the whole call, retries included (default: self.timeout)
 
         Returns:
             str: Generated text response
         """
+        payload = self._build_payload(prompt, images, max_tokens, temperature, profile)
+        return self._call(payload, profile or "default", timeout)
+
+    def chat_img_stream(
+        self,
+        prompt: str,
+        image: Image.Image,
+        max_tokens: Optional[int] = None,
+        profile: Optional[str] = None,
+        timeout: Optional[float] = None,
+    ) -> Iterator[str]:
+        return self.chat_multi_img_stream(prompt, [image], max_tokens, profile=profile, timeout=timeout)
+
+    def chat_text_stream(
+        self,
+        prompt: str,
+        max_tokens: Optional[int] = None,
+        profile: Optional[str] = None,
+        timeout: Optional[float] = None,
+    ) -> Iterator[str]:
+        return self.chat_multi_img_stream(prompt, [], max_tokens, profile=profile, timeout=timeout)
+
+    def chat_multi_img_stream(
+        self,
+        prompt: str,
+        images: list[Image.Image],
+        max_tokens: Optional[int] = None,
+        temperature: float = 0.8,
+        profile: Optional[str] = None,
+        timeout: Optional[float] = None,
+    ) -> Iterator[str]:
+        """
+        Streaming version of chat_multi_img: yields text chunks as the server-sent events arrive.
+
+        The time to first chunk is recorded under the "<call type>:ttft" latency histogram.
+        """
+        payload = self._build_payload(prompt, images, max_tokens, temperature, profile)
+        payload["stream"] = True
+        deadline = time.time() + (timeout if timeout is not None else self.timeout)
+
+        start = time.perf_counter()
+        first = True
+        for chunk in until_stop(self._stream_chat(payload, deadline), tuple(payload.get("stop") or ())):
+            if first:
+                self.latency.record(f"{profile or 'default'}:ttft", time.perf_counter() - start)
+                first = False
+            yield chunk
+
+    async def achat_img(
+        self,
+        prompt: str,
+        image: Image.Image,
+        max_tokens: Optional[int] = None,
+        profile: Optional[str] = None,
+        timeout: Optional[float] = None,
+    ) -> str:
+        return await self.achat_multi_img(prompt, [image], max_tokens, profile=profile, timeout=timeout)
+
+    async def achat_text(
+        self,
+        prompt: str,
+        max_tokens: Optional[int] = None,
+        profile: Optional[str] = None,
+        timeout: Optional[float] = None,
+    ) -> str:
+        return await self.achat_multi_img(prompt, [], max_tokens, profile=profile, timeout=timeout)
+
+    async def achat_multi_img(
+        self,
+        prompt: str,
+        images: list[Image.Image],
+        max_tokens: Optional[int] = None,
+        temperature: float = 0.8,
+        profile: Optional[str] = None,
+        timeout: Optional[float] = None,
+    ) -> str:
+        """
+        Async version of chat_multi_img.
+
+        At most `max_concurrency` requests are in flight at once (per event loop); the blocking
+        request runs on a worker thread sharing the pooled session, so the retry logic is the same.
+        """
+        loop = asyncio.get_running_loop()
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="api-model")
+        semaphore = self._semaphores.setdefault(loop, asyncio.Semaphore(self.max_concurrency))
+        async with semaphore:
+            payload = self._build_payload(prompt, images, max_tokens, temperature, profile)
+            return await loop.run_in_executor(self._executor, self._call, payload, profile or "default", timeout)
+
+    def chat_yes_probability(
+        self, prompt: str, images: Optional[list[Image.Image]] = None, timeout: Optional[float] = None
+    ) -> float:
+        """
+        Probability that the model answers a YES/NO prompt with YES, read from the top logprobs of a
+        single generated token (one decode step instead of a full judge reply).
+
+        Reasoning models think before answering and expose no logprobs: they generate with the "judge"
+        profile and the reply counts as 1.0 / 0.0, as does any reply without YES/NO candidates.
+
+        Args:
+            prompt: YES/NO question
+            images: Images to analyze (default: none)
+            timeout: Deadline in seconds for the whole call, retries included (default: self.timeout)
+
+        Returns:
+            float: P(YES) normalized over the YES and NO tokens
+        """
+        images = images or []
+        if self.is_reasoning_model:
+            response = self.chat_multi_img(prompt, images, profile="judge", timeout=timeout)
+            return 1.0 if is_yes(response) else 0.0
+        payload = self._build_payload(prompt, images, 1, 0.0, "judge")
+        payload.pop("stop", None)
+        payload.update({"max_tokens": 1, "logprobs": True, "top_logprobs": 20})
+        choice = self._call(payload, "judge_logprob", timeout, raw=True)["choices"][0]
+        tokens = (choice.get("logprobs") or {}).get("content") or []
+        probability = None
+        if tokens:
+            # The generated token itself is the only candidate when the server ignores top_logprobs
+            probability = yes_probability_from_top_logprobs(tokens[0].get("top_logprobs") or [tokens[0]])
+        if probability is None:
+            return 1.0 if is_yes(choice["message"]["content"] or "") else 0.0
+        return probability
+
+    async def achat_yes_probability(
+        self, prompt: str, images: Optional[list[Image.Image]] = None, timeout: Optional[float] = None
+    ) -> float:
+        """Async version of chat_yes_probability, sharing the limits of achat_multi_img."""
+        loop = asyncio.get_running_loop()
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="api-model")
+        semaphore = self._semaphores.setdefault(loop, asyncio.Semaphore(self.max_concurrency))
+        async with semaphore:
+            return await loop.run_in_executor(
+                self._executor, self.chat_yes_probability, prompt, images, timeout
+            )
+
+    def close(self):
+        """Release the pooled connections and the async worker threads."""
+        self.session.close()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+        if self._hedge_executor is not None:
+            self._hedge_executor.shutdown(wait=False)
+            self._hedge_executor = None
+
+    def latency_stats(self) -> dict:
+        """Latency summary per call type, plus hedging counters when hedging is enabled."""
+        stats = {"latency": self.latency.stats()}
+        if self.hedging is not None:
+            stats["hedging"] = dict(self.hedge_counts)
+        return stats
+
+    def _call(self, payload: dict, call_type: str, timeout: Optional[float], raw: bool = False):
+        """Send a request (hedged if enabled); `raw` returns the response JSON instead of the text."""
+        deadline = time.time() + (timeout if timeout is not None else self.timeout)
+        if self.hedging is None:
+            return self._timed_post(payload, call_type, deadline, raw=raw)
+        return self._hedged_post(payload, call_type, deadline, raw)
+
+    def _timed_post(
+        self,
+        payload: dict,
+        call_type: str,
+        deadline: float,
+        cancelled: Optional[threading.Event] = None,
+        raw: bool = False,
+    ):
+        start = time.perf_counter()
+        text = self._post_chat(payload, deadline, cancelled, raw)
+        if text is not None:
+            self.latency.record(call_type, time.perf_counter() - start)
+        return text
+
+    def _hedged_post(self, payload: dict, call_type: str, deadline: float, raw: bool = False):
+        """
+        Send the request; if it is still running after the call type's latency quantile, send a
+        duplicate and return whichever answer arrives first.
+
+        The other request is abandoned: if it is still waiting for a rate-limiter token or slot, or
+        between retries, it gives up; an HTTP request already sent cannot be aborted from another
+        thread with requests, so it runs to completion on its pooled connection and keeps its limiter
+        slot (the concurrency limit then reflects the real upstream load) and its answer is discarded.
+        Every hedge therefore costs one full extra request, which is what `max_rate` budgets: hedges
+        are counted when they are sent, whichever request wins. "abandoned" counts the requests that
+        were still running when their call returned.
+        """
+        if self._hedge_executor is None:
+            self._hedge_executor = ThreadPoolExecutor(
+                max_workers=2 * self.max_concurrency, thread_name_prefix="api-model-hedge"
+            )
+        with self._hedge_lock:
+            self.hedge_counts["calls"] += 1
+
+        cancelled = threading.Event()
+        post_args = (payload, call_type, deadline, cancelled, raw)
+        futures = [self._hedge_executor.submit(self._timed_post, *post_args)]
+        try:
+            threshold = self.latency.quantile(call_type, self.hedging["quantile"], self.hedging["min_samples"])
+            if threshold is not None:
+                done, _ = wait(futures, timeout=min(threshold, max(0.0, deadline - time.time())))
+                if not done and self._take_hedge():
+                    logger.debug(f"Hedging {call_type} request after {threshold:.2f}s")
+                    futures.append(self._hedge_executor.submit(self._timed_post, *post_args))
+
+            error = None
+            # Small grace period past the deadline for the request timeout to surface
+            for future in as_completed(futures, timeout=max(0.0, deadline - time.time()) + 5):
+                try:
+                    text = future.result()
+                except Exception as e:
+                    error = e
+                    continue
+                with self._hedge_lock:
+                    if future is not futures[0]:
+                        self.hedge_counts["hedge_wins"] += 1
+                    self.hedge_counts["abandoned"] += sum(not other.done() for other in futures)
+                return text
+            raise error
+        finally:
+            cancelled.set()
+
+    def _take_hedge(self) -> bool:
+        """Reserve a hedge if that keeps hedges under `max_rate` of all calls."""
+        with self._hedge_lock:
+            if self.hedge_counts["hedges"] + 1 > self.hedging["max_rate"] * self.hedge_counts["calls"]:
+                return False
+            self.hedge_counts["hedges"] += 1
+            return True
+
+    def _build_payload(
+        self,
+        prompt: str,
+        images: list[Image.Image],
+        max_tokens: Optional[int],
+        temperature: float,
+        profile: Optional[str],
+    ) -> dict:
         content = [{"type": "text", "text": prompt}]
 
         # Add each image to the content list
@@ -76,37 +459,125 @@ class APIModel:
         payload = {
             "model": self.model_id,
             "messages": [{"role": "user", "content": content}],
-            "temperature": temperature,
             "reasoning_effort": "high",
+            # Sampling fields come from _generation_payload, which merges them with the profile
+            **{key: value for key, value in self.params.items() if key not in SAMPLING_KEYS},
+            **self._generation_payload(max_tokens, temperature, profile),
         }
-        # merage payload with params
-        payload.update(self.params)
+        return payload
 
-        # Try up to 3 times with 30 second sleep on 429 errors
+    def _stream_chat(self, payload: dict, deadline: float) -> Iterator[str]:
+        """
+        POST a streaming request and yield the content deltas. Requests are retried like in
+        _post_chat, but only until the first chunk has been yielded.
+        """
         max_retries = 8
+        streamed = False
         for attempt in range(max_retries):
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                raise TimeoutError(f"API request exceeded its deadline after {attempt} attempts")
             try:
-                response = requests.post(
-                    f"{self.api_base}/chat/completions", headers=self.headers, json=payload
+                with self.rate_limiter.slot(deadline):
+                    response = self.session.post(
+                        f"{self.api_base}/chat/completions",
+                        json=payload,
+                        stream=True,
+                        timeout=max(deadline - time.time(), 0.001),
+                    )
+                    with response:
+                        rate_limited = response.status_code == 429 and attempt < max_retries - 1
+                        if not rate_limited:
+                            response.raise_for_status()
+                            self.rate_limiter.on_success()
+                            for delta in self._iter_sse(response):
+                                streamed = True
+                                yield delta
+                            return
+
+                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                retry_delay = self.rate_limiter.on_rate_limited(retry_after)
+                logger.warning(
+                    f"Rate limit (429) hit. Retrying after {retry_delay:.1f} seconds... (Attempt {attempt + 1}/{max_retries})"
                 )
 
-                # If we get a 429 Too Many Requests error and have attempts left, sleep and retry
+            except requests.exceptions.RequestException as e:
+                # A partially consumed stream cannot be retried transparently
+                if streamed or attempt == max_retries - 1:
+                    raise Exception(f"API streaming request failed after {attempt + 1} attempts: {str(e)}")
+                time.sleep(min(jittered_backoff(attempt), max(0.0, deadline - time.time())))
+
+    @staticmethod
+    def _iter_sse(response: requests.Response) -> Iterator[str]:
+        """Content deltas of an OpenAI-style server-sent event stream."""
+        done = False
+        for line in response.iter_lines():
+            # Keep reading after [DONE] so the connection goes back to the pool
+            if done or not line:
+                continue
+            line = line.decode("utf-8")
+            if not line.startswith("data: "):
+                continue
+            data = line[6:]  # Remove 'data: ' prefix
+            if data == "[DONE]":
+                done = True
+                continue
+            try:
+                chunk = json.loads(data)
+            except json.JSONDecodeError:
+                continue
+            if chunk.get("choices"):
+                content = chunk["choices"][0].get("delta", {}).get("content")
+                if content:
+                    yield content
+
+    def _post_chat(
+        self, payload: dict, deadline: float, cancelled: Optional[threading.Event] = None, raw: bool = False
+    ):
+        """
+        POST with retries until `deadline`; returns None once `cancelled` is set (hedge lost).
+        Returns the response text, or the whole response JSON if `raw`.
+        """
+        # Rate limiting is shared with every other APIModel for this endpoint, so a 429 pauses them all
+        max_retries = 8
+        for attempt in range(max_retries):
+            if cancelled is not None and cancelled.is_set():
+                return None
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                raise TimeoutError(f"API request exceeded its deadline after {attempt} attempts")
+            try:
+                # Waiting for the shared limits counts against the deadline too
+                with self.rate_limiter.slot(deadline, cancelled):
+                    response = self.session.post(
+                        f"{self.api_base}/chat/completions",
+                        json=payload,
+                        timeout=max(deadline - time.time(), 0.001),
+                    )
+
                 if response.status_code == 429 and attempt < max_retries - 1:
-                    retry_delay = 30 * (2**attempt)  # 30s, 60s, 120ss
+                    retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                    retry_delay = self.rate_limiter.on_rate_limited(retry_after)
                     logger.warning(
-                        f"Rate limit (429) hit. Retrying after {retry_delay} seconds... (Attempt {attempt + 1}/{max_retries})"
+                        f"Rate limit (429) hit. Retrying after {retry_delay:.1f} seconds... (Attempt {attempt + 1}/{max_retries})"
                     )
-                    time.sleep(retry_delay)
                     continue
 
                 response.raise_for_status()
+                self.rate_limiter.on_success()
 
                 result = response.json()
                 logger.debug(f"API request {payload['messages'][0]['content'][0]}\n Response: {result}")
-                return result["choices"][0]["message"]["content"].strip()
+                if raw:
+                    return result
+                # Some OpenAI-compatible servers ignore "stop"
+                text = result["choices"][0]["message"]["content"]
+                return truncate_at_stop(text, tuple(payload.get("stop") or ())).strip()
 
+            except RequestCancelled:
+                return None
             except requests.exceptions.RequestException as e:
                 # If this is our last attempt, raise the exception
-                time.sleep(30)
                 if attempt == max_retries - 1:
                     raise Exception(f"API request failed after {max_retries} attempts: {str(e)}")
+                time.sleep(min(jittered_backoff(attempt), max(0.0, deadline - time.time())))
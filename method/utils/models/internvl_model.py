@@ -1,19 +1,34 @@
 import math
+from functools import lru_cache
+from typing import Iterator, Optional
+
 import numpy as np
 import torch
 import torchvision.transforms as T
 from PIL import Image
 from torchvision.transforms.functional import InterpolationMode
-from transformers import AutoModel, AutoTokenizer
+from transformers import AutoModel, AutoTokenizer, LogitsProcessorList
 from loguru import logger
 
+from ..cache_utils import LRUCache, image_key
+from ..constrained_utils import GrammarLogitsProcessor
+from ..generation_profiles import (
+    GenerationProfile,
+    build_profiles,
+    hf_generate_kwargs,
+    resolve_profile,
+    truncate_at_stop,
+)
+from ..judge_utils import yes_no_token_ids, yes_probability_from_logits
+from ..streaming_utils import stream_generate
 from .base_model import BaseModel
 
 IMAGENET_MEAN = (0.485, 0.456, 0.406)
 IMAGENET_STD = (0.229, 0.224, 0.225)
 
+@lru_cache(maxsize=None)
 def build_transform(input_size):
-    """Build image transformation pipeline"""
+    """Build image transformation pipeline (cached per input size)"""
     MEAN, STD = IMAGENET_MEAN, IMAGENET_STD
     transform = T.Compose([
         T.Lambda(lambda img: img.convert('RGB') if img.mode != 'RGB' else img),
@@ -23,6 +38,14 @@ def build_transform(input_size):
     ])
     return transform
 
+@lru_cache(maxsize=None)
+def get_target_ratios(min_num=1, max_num=12):
+    """Candidate (cols, rows) tilings for a tile budget, sorted by tile count (cached per budget)"""
+    target_ratios = set(
+        (i, j) for n in range(min_num, max_num + 1) for i in range(1, n + 1) for j in range(1, n + 1) if
+        i * j <= max_num and i * j >= min_num)
+    return tuple(sorted(target_ratios, key=lambda x: x[0] * x[1]))
+
 def find_closest_aspect_ratio(aspect_ratio, target_ratios, width, height, image_size):
     """Find the closest aspect ratio from target ratios"""
     best_ratio_diff = float('inf')
@@ -44,13 +67,8 @@ def dynamic_preprocess(image, min_num=1, max_num=12, image_size=448, use_thumbna
     orig_width, orig_height = image.size
     aspect_ratio = orig_width / orig_height
 
-    # Calculate the existing image aspect ratio
-    target_ratios = set(
-        (i, j) for n in range(min_num, max_num + 1) for i in range(1, n + 1) for j in range(1, n + 1) if
-        i * j <= max_num and i * j >= min_num)
-    target_ratios = sorted(target_ratios, key=lambda x: x[0] * x[1])
-
     # Find the closest aspect ratio to the target
+    target_ratios = get_target_ratios(min_num, max_num)
     target_aspect_ratio = find_closest_aspect_ratio(
         aspect_ratio, target_ratios, orig_width, orig_height, image_size)
 
@@ -78,24 +96,54 @@ def dynamic_preprocess(image, min_num=1, max_num=12, image_size=448, use_thumbna
         processed_images.append(thumbnail_img)
     return processed_images
 
+def _normalize_array(image):
+    """Convert an RGB PIL image to a normalized (3, H, W) float tensor"""
+    array = torch.from_numpy(np.asarray(image, dtype=np.float32) / 255.0).permute(2, 0, 1)
+    mean = torch.tensor(IMAGENET_MEAN).view(3, 1, 1)
+    std = torch.tensor(IMAGENET_STD).view(3, 1, 1)
+    return (array - mean) / std
+
+def dynamic_preprocess_tensor(image, min_num=1, max_num=12, image_size=448, use_thumbnail=False):
+    """Same tiling as dynamic_preprocess, but cut from a single resized array into a (N, 3, S, S) tensor"""
+    orig_width, orig_height = image.size
+    aspect_ratio = orig_width / orig_height
+
+    target_ratios = get_target_ratios(min_num, max_num)
+    cols, rows = find_closest_aspect_ratio(
+        aspect_ratio, target_ratios, orig_width, orig_height, image_size)
+
+    # Resize once, normalize once, then split into row-major tiles with a reshape
+    resized = _normalize_array(image.resize((image_size * cols, image_size * rows)))
+    tiles = resized.view(3, rows, image_size, cols, image_size).permute(1, 3, 0, 2, 4)
+    tiles = tiles.reshape(rows * cols, 3, image_size, image_size)
+
+    if use_thumbnail and rows * cols != 1:
+        thumbnail = _normalize_array(image.resize((image_size, image_size))).unsqueeze(0)
+        tiles = torch.cat([tiles, thumbnail], dim=0)
+    return tiles
+
 def load_image_tensor(image, input_size=448, max_num=12):
     """Load and preprocess image into tensor format"""
     if isinstance(image, str):
         image = Image.open(image).convert('RGB')
     elif isinstance(image, Image.Image):
         image = image.convert('RGB')
-    
-    transform = build_transform(input_size=input_size)
-    images = dynamic_preprocess(image, image_size=input_size, use_thumbnail=True, max_num=max_num)
-    pixel_values = [transform(img) for img in images]
-    pixel_values = torch.stack(pixel_values)
-    return pixel_values
+
+    return dynamic_preprocess_tensor(image, image_size=input_size, use_thumbnail=True, max_num=max_num)
 
 
 class InternVLModel(BaseModel):
     """InternVL3-8B model implementation for single GPU"""
+
+    supports_constrained_decoding = True
     
-    def __init__(self, model_id="OpenGVLab/InternVL3-8B", params={}):
+    def __init__(
+        self,
+        model_id="OpenGVLab/InternVL3-8B",
+        params={},
+        pixel_cache_size: int = 32,
+        pixel_cache_max_bytes: int = 1024**3,
+    ):
         super().__init__()
         self.model_id = model_id
         self.params = params if params else {}
@@ -124,20 +172,50 @@ class InternVLModel(BaseModel):
             do_sample=True,
             **self.params
         )
+        # Named generation profiles (see generation_profiles); MLLMFactory may override them
+        self.profiles = build_profiles()
+        self.default_max_tokens = 512
         
+        # Image-keyed cache of the bf16 tiled pixel values, reused across the
+        # alignment / answer / choice calls made on the same image
+        self.pixel_cache = LRUCache(max_entries=pixel_cache_size, max_bytes=pixel_cache_max_bytes)
+        # Decoded text per token id, shared by the grammar-constrained decoding processors
+        self._token_strings = {}
+        self.yes_ids, self.no_ids = yes_no_token_ids(self.tokenizer)
+
         logger.info("InternVL model loaded successfully")
 
-    @staticmethod
-    def model_list():
-        """Return list of supported model IDs"""
-        return ["OpenGVLab/InternVL3-8B"]
+    def load_pixel_values(self, image: Image.Image, max_num: int = 12) -> torch.Tensor:
+        """Tiled bf16 pixel values for an image, served from the pixel cache when possible"""
+        key = (image_key(image), max_num)
+        pixel_values = self.pixel_cache.get(key)
+        if pixel_values is None:
+            pixel_values = load_image_tensor(image, max_num=max_num).to(torch.bfloat16).cuda()
+            self.pixel_cache.put(key, pixel_values)
+        logger.debug(f"InternVL pixel cache: {self.pixel_cache.stats()}")
+        return pixel_values
 
-    def chat_text(self, prompt: str, max_tokens: int = 512) -> str:
+    def _generation_config(self, settings: GenerationProfile, grammar: Optional[str] = None) -> dict:
+        """Default generation config with resolved profile settings and an optional output grammar"""
+        generation_config = hf_generate_kwargs(settings, self.tokenizer, self.generation_config)
+        if grammar is not None:
+            generation_config['logits_processor'] = LogitsProcessorList(
+                [GrammarLogitsProcessor(grammar, self.tokenizer, self._token_strings)]
+            )
+        return generation_config
+
+    def chat_text(
+        self,
+        prompt: str,
+        max_tokens: Optional[int] = None,
+        grammar: Optional[str] = None,
+        profile: Optional[str] = None,
+    ) -> str:
         """Chat with text-only input"""
         try:
-            # Update generation config with max_tokens
-            generation_config = self.generation_config.copy()
-            generation_config['max_new_tokens'] = max_tokens
+            # Update generation config with the profile settings
+            settings = resolve_profile(self.profiles, profile, max_tokens, self.default_max_tokens)
+            generation_config = self._generation_config(settings, grammar)
             
             # Pure text conversation
             response = self.model.chat(
@@ -150,21 +228,41 @@ class InternVLModel(BaseModel):
             )
             
             logger.debug(f"InternVL text response: {response}")
-            return response
+            return truncate_at_stop(response, settings.stop)
             
         except Exception as e:
             logger.error(f"Error in InternVL chat_text: {e}")
             return f"Error: {str(e)}"
 
-    def chat_img(self, prompt: str, image: Image.Image, max_tokens: int = 512) -> str:
+    def chat_yes_probability(self, prompt: str) -> float:
+        """P(YES) of a text-only YES/NO prompt from the next-token logits of one language-model forward pass"""
+        # Same conversation template as model.chat, without the generation loop
+        messages = [
+            {"role": "system", "content": self.model.system_message},
+            {"role": "user", "content": prompt},
+        ]
+        query = self.tokenizer.apply_chat_template(messages, tokenize=False, add_generation_prompt=True)
+        input_ids = self.tokenizer(query, return_tensors="pt").input_ids.to(self.model.device)
+        with torch.no_grad():
+            logits = self.model.language_model(input_ids=input_ids).logits[0, -1]
+        return yes_probability_from_logits(logits, self.yes_ids, self.no_ids)
+
+    def chat_img(
+        self,
+        prompt: str,
+        image: Image.Image,
+        max_tokens: Optional[int] = None,
+        grammar: Optional[str] = None,
+        profile: Optional[str] = None,
+    ) -> str:
         """Chat with image and text input"""
         try:
-            # Update generation config with max_tokens
-            generation_config = self.generation_config.copy()
-            generation_config['max_new_tokens'] = max_tokens
+            # Update generation config with the profile settings
+            settings = resolve_profile(self.profiles, profile, max_tokens, self.default_max_tokens)
+            generation_config = self._generation_config(settings, grammar)
             
             # Process image
-            pixel_values = load_image_tensor(image, max_num=12).to(torch.bfloat16).cuda()
+            pixel_values = self.load_pixel_values(image, max_num=12)
             
             # Add image token to prompt
             image_prompt = f'<image>\n{prompt}'
@@ -178,28 +276,108 @@ class InternVLModel(BaseModel):
             )
             
             logger.debug(f"InternVL image response: {response}")
-            return response
+            return truncate_at_stop(response, settings.stop)
             
         except Exception as e:
             logger.error(f"Error in InternVL chat_img: {e}")
             return f"Error: {str(e)}"
 
-    def chat_multi_img(self, prompt: str, images: list[Image.Image], max_tokens: int = 512) -> str:
+    def chat_text_stream(
+        self, prompt: str, max_tokens: Optional[int] = None, profile: Optional[str] = None
+    ) -> Iterator[str]:
+        """Stream a text-only response as text chunks"""
+        try:
+            settings = resolve_profile(self.profiles, profile, max_tokens, self.default_max_tokens)
+            generation_config = self._generation_config(settings)
+            yield from stream_generate(
+                lambda **stream_kwargs: self.model.chat(
+                    self.tokenizer,
+                    None,
+                    prompt,
+                    {**generation_config, **stream_kwargs},
+                    history=None,
+                    return_history=False,
+                ),
+                self.tokenizer,
+                settings.stop,
+            )
+        except Exception as e:
+            logger.error(f"Error in InternVL chat_text_stream: {e}")
+            yield f"Error: {str(e)}"
+
+    def chat_img_stream(
+        self, prompt: str, image: Image.Image, max_tokens: Optional[int] = None, profile: Optional[str] = None
+    ) -> Iterator[str]:
+        """Stream a single-image response as text chunks"""
+        try:
+            settings = resolve_profile(self.profiles, profile, max_tokens, self.default_max_tokens)
+            generation_config = self._generation_config(settings)
+            pixel_values = self.load_pixel_values(image, max_num=12)
+            yield from stream_generate(
+                lambda **stream_kwargs: self.model.chat(
+                    self.tokenizer, pixel_values, f'<image>\n{prompt}', {**generation_config, **stream_kwargs}
+                ),
+                self.tokenizer,
+                settings.stop,
+            )
+        except Exception as e:
+            logger.error(f"Error in InternVL chat_img_stream: {e}")
+            yield f"Error: {str(e)}"
+
+    def chat_img_batch(
+        self,
+        prompts: list[str],
+        images: list[Image.Image],
+        max_tokens: Optional[int] = None,
+        profile: Optional[str] = None,
+    ) -> list[str]:
+        """Chat with one image per prompt, served as a single padded batch"""
+        try:
+            settings = resolve_profile(self.profiles, profile, max_tokens, self.default_max_tokens)
+            generation_config = self._generation_config(settings)
+
+            pixel_values_list = [self.load_pixel_values(image, max_num=12) for image in images]
+            num_patches_list = [pixel_values.size(0) for pixel_values in pixel_values_list]
+            pixel_values = torch.cat(pixel_values_list, dim=0)
+
+            questions = [f'<image>\n{prompt}' for prompt in prompts]
+            responses = self.model.batch_chat(
+                self.tokenizer,
+                pixel_values,
+                num_patches_list=num_patches_list,
+                questions=questions,
+                generation_config=generation_config
+            )
+
+            logger.debug(f"InternVL batch image responses: {responses}")
+            return [truncate_at_stop(response, settings.stop) for response in responses]
+
+        except Exception as e:
+            logger.error(f"Error in InternVL chat_img_batch: {e}")
+            return [f"Error: {str(e)}"] * len(prompts)
+
+    def chat_multi_img(
+        self,
+        prompt: str,
+        images: list[Image.Image],
+        max_tokens: Optional[int] = None,
+        profile: Optional[str] = None,
+    ) -> str:
         """Chat with multiple images (for future extension)"""
         try:
             if not images:
-                return self.chat_text(prompt, max_tokens)
+                return self.chat_text(prompt, max_tokens, profile=profile)
             elif len(images) == 1:
-                return self.chat_img(prompt, images[0], max_tokens)
+                return self.chat_img(prompt, images[0], max_tokens, profile=profile)
             else:
                 # Handle multiple images by concatenating them
-                generation_config = self.generation_config.copy()
-                generation_config['max_new_tokens'] = max_tokens
+                settings = resolve_profile(self.profiles, profile, max_tokens, self.default_max_tokens)
+                generation_config = self._generation_config(settings)
                 
                 # Process all images
                 pixel_values_list = []
                 for image in images:
-                    pixel_values = load_image_tensor(image, max_num=12).to(torch.bfloat16).cuda()
+                    pixel_values = self.load_pixel_values(image, max_num=12)
                     pixel_values_list.append(pixel_values)
                 
                 # Concatenate all image tensors
@@ -217,7 +395,7 @@ class InternVLModel(BaseModel):
                 )
                 
                 logger.debug(f"InternVL multi-image response: {response}")
-                return response
+                return truncate_at_stop(response, settings.stop)
                 
         except Exception as e:
             logger.error(f"Error in InternVL chat_multi_img: {e}")
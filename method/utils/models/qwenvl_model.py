@@ -1,5 +1,8 @@
 import base64
+import contextvars
+from dataclasses import replace
 from io import BytesIO, text_encoding
+from typing import Iterator, Optional, Union
 
 import einops
 import requests
@@ -13,11 +16,23 @@ from transformers import (
     AutoModelForCausalLM,
     AutoProcessor,
     AutoTokenizer,
+    LogitsProcessorList,
     Qwen2_5_VLForConditionalGeneration,
+    StoppingCriteria,
+    StoppingCriteriaList,
 )
 
+from ..cache_utils import LRUCache, image_key
+from ..constrained_utils import GrammarLogitsProcessor
+from ..generation_profiles import build_profiles, hf_generate_kwargs, resolve_profile, truncate_at_stop
+from ..judge_utils import yes_no_token_ids, yes_probability_from_logits
+from ..streaming_utils import stream_generate
 from .base_model import BaseModel
 
+# (key, entry) per image of the generate call running in this thread, read by the patched
+# get_image_features; a context variable, so concurrent calls (e.g. a stream) never see each other's
+_vision_entries: contextvars.ContextVar[Optional[list]] = contextvars.ContextVar("vision_entries", default=None)
+
 
 def resize_image(image: Image.Image, max_size=640):
     """
@@ -80,8 +95,29 @@ def pil_image_to_base64(image, image_format="PNG"):
     return image_base64
 
 
+class RowTokenLimit(StoppingCriteria):
+    """Per-row `max_new_tokens` for batched generation: each row stops once it reaches its own limit."""
+
+    def __init__(self, prompt_length: int, max_tokens: list[int]):
+        self.prompt_length = prompt_length
+        self.max_tokens = torch.tensor(max_tokens)
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor, **kwargs) -> torch.BoolTensor:
+        generated = input_ids.shape[1] - self.prompt_length
+        return generated >= self.max_tokens.to(input_ids.device)
+
+
 class QwenVLModel(BaseModel):
-    def __init__(self, model_id="Qwen/Qwen2.5-VL-7B-Instruct", params={}):
+    supports_constrained_decoding = True
+
+    def __init__(
+        self,
+        model_id="Qwen/Qwen2.5-VL-7B-Instruct",
+        params={},
+        vision_cache_size: int = 32,
+        vision_cache_max_bytes: int = 2 * 1024**3,
+        vision_cache_device: str = "cpu",
+    ):
         super().__init__()
         self.model = Qwen2_5_VLForConditionalGeneration.from_pretrained(
             model_id,
@@ -93,37 +129,163 @@ class QwenVLModel(BaseModel):
         )
         self.processor = AutoProcessor.from_pretrained(model_id)
         self.tokenizer = AutoTokenizer.from_pretrained(model_id)
+        # Batched generation needs the prompts aligned on the right
+        self.processor.tokenizer.padding_side = "left"
         self.params = params if params else {}
+        # Named generation profiles (see generation_profiles); MLLMFactory may override them
+        self.profiles = build_profiles()
+        self.default_max_tokens = 512
 
         self.one_id = self.tokenizer.convert_tokens_to_ids("1")
         self.zero_id = self.tokenizer.convert_tokens_to_ids("0")
 
         self.harmful_id = self.tokenizer.convert_tokens_to_ids("Ġharmful")
         self.harmless_id = self.tokenizer.convert_tokens_to_ids("Ġharmless")
-
-    @staticmethod
-    def model_list():
-        return ["Qwen/Qwen2.5-VL-7B-Instruct"]
-
-    def chat_text(self, prompt: str, max_tokens: int = 512) -> str:
-        conversation = [
-            {
-                "role": "user",
-                "content": [{"type": "text", "text": prompt}],
+        self.yes_ids, self.no_ids = yes_no_token_ids(self.tokenizer)
+
+        # Image-keyed cache of processed pixel values and vision-encoder outputs, so repeated
+        # calls on the same image (alignment, answer, choice) skip resize, normalization and the vision tower
+        self.vision_cache = LRUCache(max_entries=vision_cache_size, max_bytes=vision_cache_max_bytes)
+        self.vision_cache_device = vision_cache_device
+        self.vision_encoder_runs = 0
+        self.vision_encoder_skips = 0
+        self._install_vision_cache()
+
+        # Decoded text per token id, shared by the grammar-constrained decoding processors
+        self._token_strings = {}
+
+    def _install_vision_cache(self):
+        """Wrap the model's image feature extraction so cached encoder outputs are reused."""
+        vl_model = getattr(self.model, "model", self.model)
+        original_get_image_features = vl_model.get_image_features
+
+        def cached_get_image_features(pixel_values, image_grid_thw=None):
+            entries = _vision_entries.get()
+            if not entries or image_grid_thw is None or len(entries) != len(image_grid_thw):
+                return original_get_image_features(pixel_values, image_grid_thw)
+
+            missing = [i for i, (_, entry) in enumerate(entries) if "image_embeds" not in entry]
+            self.vision_encoder_skips += len(entries) - len(missing)
+            if missing:
+                self.vision_encoder_runs += len(missing)
+                # Only run the vision tower on the images that are not cached yet
+                pixel_chunks = torch.split(pixel_values, image_grid_thw.prod(-1).tolist())
+                computed = original_get_image_features(
+                    torch.cat([pixel_chunks[i] for i in missing], dim=0), image_grid_thw[missing]
+                )
+                for i, embeds in zip(missing, computed):
+                    key, entry = entries[i]
+                    entry["image_embeds"] = embeds.detach().to(self.vision_cache_device)
+                    self.vision_cache.put(key, entry)
+
+            return tuple(entry["image_embeds"].to(self.model.device) for _, entry in entries)
+
+        vl_model.get_image_features = cached_get_image_features
+
+    def _get_vision_entry(self, image: Image.Image) -> tuple[str, dict]:
+        """Look up (or compute and cache) the processed pixel values for an image."""
+        key = image_key(image)
+        entry = self.vision_cache.get(key)
+        if entry is None:
+            image_inputs = self.processor.image_processor(images=[resize_image(image)], return_tensors="pt")
+            entry = {
+                "pixel_values": image_inputs["pixel_values"].to(self.vision_cache_device),
+                "image_grid_thw": image_inputs["image_grid_thw"].to(self.vision_cache_device),
             }
-        ]
-        text_prompt = self.processor.apply_chat_template(conversation, add_generation_prompt=True)
+            self.vision_cache.put(key, entry)
+        return key, entry
+
+    def _prepare_inputs(self, text_prompts: list[str], images: list[Image.Image]):
+        """
+        Tokenize prompts and attach cached pixel values, expanding the image placeholders
+        the same way the processor does.
+
+        Args:
+            text_prompts: Chat-templated prompts; text-only prompts simply have no image placeholder
+            images: Images in placeholder order across all prompts
+
+        Returns:
+            (BatchFeature, list): Model inputs on the model device, and the vision-cache entry per image
+                to pass to _generate_with_vision_cache
+        """
+        entries = [self._get_vision_entry(image) for image in images]
+
+        text = list(text_prompts)
+        image_token = self.processor.image_token
+        merge_length = self.processor.image_processor.merge_size**2
+        index = 0
+        for i in range(len(text)):
+            while image_token in text[i]:
+                num_image_tokens = int(entries[index][1]["image_grid_thw"].prod()) // merge_length
+                text[i] = text[i].replace(image_token, "<|placeholder|>" * num_image_tokens, 1)
+                index += 1
+            text[i] = text[i].replace("<|placeholder|>", image_token)
+
+        inputs = self.processor.tokenizer(text, padding=True, return_tensors="pt")
+        if entries:
+            inputs["pixel_values"] = torch.cat([entry["pixel_values"] for _, entry in entries], dim=0)
+            inputs["image_grid_thw"] = torch.cat([entry["image_grid_thw"] for _, entry in entries], dim=0)
+
+        return inputs.to(self.model.device), entries
+
+    def _generate_with_vision_cache(self, inputs, entries: list, **generate_kwargs):
+        token = _vision_entries.set(entries)
+        try:
+            return self.model.generate(**inputs, **generate_kwargs)
+        finally:
+            _vision_entries.reset(token)
+
+    def vision_cache_stats(self) -> dict:
+        """Hit-rate metrics of the vision-feature cache."""
+        stats = self.vision_cache.stats()
+        stats["encoder_runs"] = self.vision_encoder_runs
+        stats["encoder_skips"] = self.vision_encoder_skips
+        return stats
+
+    def _grammar_kwargs(self, grammar: Optional[str]) -> dict:
+        """Generate kwargs restricting the output to one of the GRAMMARS in constrained_utils."""
+        if grammar is None:
+            return {}
+        processor = GrammarLogitsProcessor(grammar, self.processor.tokenizer, self._token_strings)
+        return {"logits_processor": LogitsProcessorList([processor])}
+
+    def chat_text(
+        self,
+        prompt: str,
+        max_tokens: Optional[int] = None,
+        grammar: Optional[str] = None,
+        profile: Optional[str] = None,
+    ) -> str:
+        settings = resolve_profile(self.profiles, profile, max_tokens, self.default_max_tokens)
+        text_prompt = self._build_text_prompt(prompt, with_image=False)
         inputs = self.processor(text=[text_prompt], padding=True, return_tensors="pt").to(self.model.device)
-        output_ids = self.model.generate(**inputs, max_new_tokens=max_tokens, **self.params)
-        generated_ids = [output_ids[len(inputs.input_ids[i]) :] for i in range(len(output_ids))]
+        generate_kwargs = hf_generate_kwargs(settings, self.processor.tokenizer, self.params)
+        generate_kwargs.update(self._grammar_kwargs(grammar))
+        output_ids = self.model.generate(**inputs, **generate_kwargs)
+        generated_ids = [output_ids[i][len(inputs.input_ids[i]) :] for i in range(len(output_ids))]
         output_text = self.processor.batch_decode(
             generated_ids, skip_special_tokens=True, clean_up_tokenization_spaces=True
         )
         logger.debug(output_text)
-        return output_text[0]
-
-    def chat_img(self, prompt: str, image: Image.Image, max_tokens: int = 512) -> str:
-        image = resize_image(image)
+        return truncate_at_stop(output_text[0], settings.stop)
+
+    def chat_yes_probability(self, prompt: str) -> float:
+        """P(YES) of a text-only YES/NO prompt from the next-token logits of one forward pass (no decoding)."""
+        text_prompt = self._build_text_prompt(prompt, with_image=False)
+        inputs = self.processor(text=[text_prompt], return_tensors="pt").to(self.model.device)
+        with torch.no_grad():
+            logits = self.model(**inputs).logits[0, -1]
+        return yes_probability_from_logits(logits, self.yes_ids, self.no_ids)
+
+    def chat_img(
+        self,
+        prompt: str,
+        image: Image.Image,
+        max_tokens: Optional[int] = None,
+        grammar: Optional[str] = None,
+        profile: Optional[str] = None,
+    ) -> str:
+        settings = resolve_profile(self.profiles, profile, max_tokens, self.default_max_tokens)
         conversation = [
             {
                 "role": "user",
@@ -136,11 +298,11 @@ class QwenVLModel(BaseModel):
 
         text_prompt = self.processor.apply_chat_template(conversation, add_generation_prompt=True)
 
-        inputs = self.processor(text=[text_prompt], images=[image], padding=True, return_tensors="pt").to(
-            self.model.device
-        )
+        inputs, entries = self._prepare_inputs([text_prompt], [image])
 
-        output_ids = self.model.generate(**inputs, max_new_tokens=max_tokens, **self.params)
+        generate_kwargs = hf_generate_kwargs(settings, self.processor.tokenizer, self.params)
+        generate_kwargs.update(self._grammar_kwargs(grammar))
+        output_ids = self._generate_with_vision_cache(inputs, entries, **generate_kwargs)
 
         generated_ids = [
             output_ids[len(input_ids) :]
@@ -150,45 +312,122 @@ class QwenVLModel(BaseModel):
             generated_ids, skip_special_tokens=True, clean_up_tokenization_spaces=True
         )
         logger.debug(output_text)
+        logger.debug(f"Vision cache: {self.vision_cache_stats()}")
+
+        return truncate_at_stop(output_text[0], settings.stop)
+
+    def chat_stream(
+        self,
+        prompt: str,
+        image: Optional[Image.Image] = None,
+        max_tokens: Optional[int] = None,
+        profile: Optional[str] = None,
+    ) -> Iterator[str]:
+        """
+        Stream the response to a text-only (image=None) or single-image prompt as text chunks.
+
+        Uses the same vision-feature cache as chat_img.
+        """
+        settings = resolve_profile(self.profiles, profile, max_tokens, self.default_max_tokens)
+        text_prompt = self._build_text_prompt(prompt, with_image=image is not None)
+        inputs, entries = self._prepare_inputs([text_prompt], [image] if image is not None else [])
+        generate_kwargs = hf_generate_kwargs(settings, self.processor.tokenizer, self.params)
+
+        yield from stream_generate(
+            # Runs on the streaming thread, which sets the entries in its own context
+            lambda **stream_kwargs: self._generate_with_vision_cache(
+                inputs, entries, **generate_kwargs, **stream_kwargs
+            ),
+            self.processor.tokenizer,
+            settings.stop,
+        )
 
-        return output_text[0]
-
-    def chat_img_batch(
-        self, prompts: list[str], images: list[Image.Image], max_tokens: int = 256
+    def chat_text_stream(
+        self, prompt: str, max_tokens: Optional[int] = None, profile: Optional[str] = None
+    ) -> Iterator[str]:
+        return self.chat_stream(prompt, None, max_tokens, profile)
+
+    def chat_img_stream(
+        self, prompt: str, image: Image.Image, max_tokens: Optional[int] = None, profile: Optional[str] = None
+    ) -> Iterator[str]:
+        return self.chat_stream(prompt, image, max_tokens, profile)
+
+    def _build_text_prompt(self, prompt: str, with_image: bool) -> str:
+        content = [{"type": "image"}] if with_image else []
+        content.append({"type": "text", "text": prompt})
+        conversation = [{"role": "user", "content": content}]
+        return self.processor.apply_chat_template(conversation, add_generation_prompt=True)
+
+    def chat_batch(
+        self,
+        prompts: list[str],
+        images: list[Optional[Image.Image]],
+        max_tokens: Union[None, int, list[Optional[int]]] = None,
+        profile: Optional[str] = None,
     ) -> list[str]:
-        conversations = [
-            [
-                {
-                    "role": "user",
-                    "content": [
-                        {"type": "image"},
-                        {"type": "text", "text": prompt},
-                    ],
-                }
-            ]
-            for prompt in prompts
-        ]
-
-        text_prompts = [
-            self.processor.apply_chat_template(conversation, add_generation_prompt=True)
-            for conversation in conversations
-        ]
-
-        inputs = self.processor(text=text_prompts, images=images, padding=True, return_tensors="pt").to(
-            self.model.device
+        """
+        Generate responses for a heterogeneous batch in one left-padded forward pass.
+
+        Args:
+            prompts: Text prompts
+            images: One entry per prompt; None for text-only rows
+            max_tokens: Token limit shared by all rows, or one limit per row (None: the profile's cap)
+            profile: Generation profile shared by all rows
+
+        Returns:
+            list[str]: Generated responses in prompt order
+        """
+        settings = resolve_profile(self.profiles, profile, None, self.default_max_tokens)
+        if max_tokens is None or isinstance(max_tokens, int):
+            max_tokens = [max_tokens] * len(prompts)
+        max_tokens = [limit if limit is not None else settings.max_tokens for limit in max_tokens]
+
+        text_prompts = [self._build_text_prompt(prompt, image is not None) for prompt, image in zip(prompts, images)]
+        inputs, entries = self._prepare_inputs(text_prompts, [image for image in images if image is not None])
+        prompt_length = inputs.input_ids.shape[1]
+
+        generate_kwargs = hf_generate_kwargs(
+            replace(settings, max_tokens=max(max_tokens)), self.processor.tokenizer, self.params
         )
+        if len(set(max_tokens)) > 1:
+            generate_kwargs["stopping_criteria"] = StoppingCriteriaList([RowTokenLimit(prompt_length, max_tokens)])
+        output_ids = self._generate_with_vision_cache(inputs, entries, **generate_kwargs)
 
-        output_ids = self.model.generate(**inputs, max_new_tokens=max_tokens, **self.params)
-
-        generated_ids = [output_ids[i][len(inputs.input_ids[i]) :] for i in range(len(output_ids))]
+        generated_ids = [
+            output_ids[i][prompt_length : prompt_length + max_tokens[i]] for i in range(len(output_ids))
+        ]
         output_text = self.processor.batch_decode(
             generated_ids, skip_special_tokens=True, clean_up_tokenization_spaces=True
         )
         logger.debug(output_text)
 
-        return output_text
+        return [truncate_at_stop(text, settings.stop) for text in output_text]
+
+    def chat_text_batch(
+        self,
+        prompts: list[str],
+        max_tokens: Union[None, int, list[Optional[int]]] = None,
+        profile: Optional[str] = None,
+    ) -> list[str]:
+        return self.chat_batch(prompts, [None] * len(prompts), max_tokens, profile)
 
-    def chat_multi_img(self, prompt: str, images: list[Image.Image]) -> str:
+    def chat_img_batch(
+        self,
+        prompts: list[str],
+        images: list[Image.Image],
+        max_tokens: Union[None, int, list[Optional[int]]] = None,
+        profile: Optional[str] = None,
+    ) -> list[str]:
+        return self.chat_batch(prompts, images, max_tokens, profile)
+
+    def chat_multi_img(
+        self,
+        prompt: str,
+        images: list[Image.Image],
+        max_tokens: Optional[int] = None,
+        profile: Optional[str] = None,
+    ) -> str:
+        settings = resolve_profile(self.profiles, profile, max_tokens, 1024)
         conversation = [
             {
                 "role": "user",
@@ -208,7 +447,9 @@ class QwenVLModel(BaseModel):
             text=[text_prompt], images=image_inputs, videos=video_inputs, padding=True, return_tensors="pt"
         ).to(self.model.device)
 
-        output_ids = self.model.generate(**inputs, **self.params, max_new_tokens=1024)
+        output_ids = self.model.generate(
+            **inputs, **hf_generate_kwargs(settings, self.processor.tokenizer, self.params)
+        )
 
         generated_ids = [
             output_ids[len(input_ids) :]
@@ -219,4 +460,4 @@ class QwenVLModel(BaseModel):
         )
         logger.debug(output_text)
 
-        return output_text[0]
+        return truncate_at_stop(output_text[0], settings.stop)
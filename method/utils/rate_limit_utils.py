@@ -0,0 +1,252 @@
+"""Adaptive rate and concurrency limits shared by every thread and process on the host."""
+
+import email.utils
+import fcntl
+import hashlib
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Optional
+
+from loguru import logger
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Seconds to wait from a Retry-After header (delta-seconds or HTTP-date), if present."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, email.utils.parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RequestCancelled(Exception):
+    """Raised while waiting for a token or slot when the request is no longer needed."""
+
+
+def jittered_backoff(attempt: int, base: float = 0.5, cap: float = 8.0) -> float:
+    """Short exponential backoff with full jitter: uniform in [0, min(cap, base * 2**attempt)]."""
+    return random.uniform(0, min(cap, base * 2**attempt))
+
+
+class SharedRateLimiter:
+    """
+    Adaptive token bucket plus a concurrency limit, shared through files in `state_dir`.
+
+    Both limits are opt-in: without a `rate` requests are not throttled, and without
+    `max_concurrency` any number may be in flight. A 429 always pauses every client for its
+    Retry-After; with a `rate` it also cuts the rate, which then grows back on each success.
+
+    Args:
+        name: Limiter identity; every process using the same name shares one budget
+        rate: Initial refill rate in requests per second (default: no token bucket)
+        burst: Bucket capacity
+        max_concurrency: Requests in flight at once across all processes (default: unlimited)
+        min_rate: Floor for the adaptive rate
+        max_rate: Ceiling for the adaptive rate
+        decrease_factor: Rate multiplier applied on a 429
+        increase_step: Rate added (requests per second) on each success (default: 5% of `rate`)
+        state_ttl: Seconds after which an idle shared state is discarded, so a rate cut back by an
+            earlier run does not outlive it
+        state_dir: Directory holding the shared state (default: the system temp directory)
+    """
+
+    def __init__(
+        self,
+        name: str,
+        rate: Optional[float] = None,
+        burst: float = 8.0,
+        max_concurrency: Optional[int] = None,
+        min_rate: float = 0.1,
+        max_rate: float = 64.0,
+        decrease_factor: float = 0.7,
+        increase_step: Optional[float] = None,
+        state_ttl: float = 300.0,
+        state_dir: Optional[str] = None,
+    ):
+        self.initial_rate = rate
+        self.burst = burst
+        self.max_concurrency = max_concurrency
+        self.min_rate = min_rate
+        # A configured rate above the default ceiling raises the ceiling rather than being cut back
+        self.max_rate = max(max_rate, rate or 0.0)
+        self.decrease_factor = decrease_factor
+        self.increase_step = increase_step if increase_step is not None else 0.05 * (rate or 0.0)
+        self.state_ttl = state_ttl
+
+        state_dir = Path(state_dir or Path(tempfile.gettempdir()) / "tame-rate-limits")
+        state_dir.mkdir(parents=True, exist_ok=True)
+        key = hashlib.blake2b(name.encode("utf-8"), digest_size=8).hexdigest()
+        self.state_path = state_dir / f"{key}.json"
+        self.lock_path = state_dir / f"{key}.lock"
+        self.slot_paths = [state_dir / f"{key}.slot{i}" for i in range(max_concurrency or 0)]
+        self.waited_seconds = 0.0
+        self.rate_limited = 0
+
+        if rate is not None:
+            with self._locked_state() as state:
+                if state["rate"] < rate:
+                    logger.info(
+                        f"Request rate for {name} starts at {state['rate']:.2f}/s (configured {rate:.2f}/s), "
+                        f"lowered by 429s within the last {state_ttl:.0f}s"
+                    )
+
+    def _fresh_state(self, now: float) -> dict:
+        return {
+            "rate": self.initial_rate,
+            "configured_rate": self.initial_rate,
+            "tokens": self.burst,
+            "updated": now,
+            "blocked_until": 0.0,
+            "last_decrease": 0.0,
+        }
+
+    @contextmanager
+    def _locked_state(self):
+        """
+        Read-modify-write the shared bucket state under an exclusive lock. A state written with a
+        different configured rate, or idle for longer than `state_ttl`, starts over.
+        """
+        with open(self.lock_path, "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                now = time.time()
+                try:
+                    state = json.loads(self.state_path.read_text())
+                except (FileNotFoundError, ValueError):
+                    state = None
+                if (
+                    state is None
+                    or state.get("configured_rate") != self.initial_rate
+                    or now - state["updated"] > self.state_ttl
+                ):
+                    state = self._fresh_state(now)
+                yield state
+                tmp_path = self.state_path.with_suffix(f".{os.getpid()}.tmp")
+                tmp_path.write_text(json.dumps(state))
+                os.replace(tmp_path, self.state_path)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _refill(self, state: dict, now: float):
+        if state["rate"] is not None:
+            elapsed = max(0.0, now - state["updated"])
+            state["tokens"] = min(self.burst, state["tokens"] + elapsed * state["rate"])
+        state["updated"] = now
+
+    @staticmethod
+    def _check_wait(wait: float, deadline: Optional[float], cancelled: Optional[threading.Event]):
+        if cancelled is not None and cancelled.is_set():
+            raise RequestCancelled()
+        if deadline is not None and time.time() + wait > deadline:
+            raise TimeoutError(f"Rate limiter wait of {wait:.1f}s would exceed the call deadline")
+
+    def acquire_token(self, deadline: Optional[float] = None, cancelled: Optional[threading.Event] = None):
+        """
+        Block until the shared bucket grants one request.
+
+        Raises:
+            TimeoutError: The wait would end past `deadline` (a time.time() value)
+            RequestCancelled: `cancelled` was set while waiting
+        """
+        while True:
+            with self._locked_state() as state:
+                now = time.time()
+                self._refill(state, now)
+                if now < state["blocked_until"]:
+                    wait = state["blocked_until"] - now
+                elif state["rate"] is None:
+                    return
+                elif state["tokens"] >= 1:
+                    state["tokens"] -= 1
+                    return
+                else:
+                    wait = (1 - state["tokens"]) / state["rate"]
+            # Small jitter so waiting processes do not wake up in lockstep (bounded by the wait itself,
+            # so it does not dominate at high rates)
+            wait += random.uniform(0, min(0.05, wait))
+            self._check_wait(wait, deadline, cancelled)
+            # Wake up regularly to notice a cancellation
+            if cancelled is not None:
+                wait = min(wait, 0.1)
+            self.waited_seconds += wait
+            time.sleep(wait)
+
+    @contextmanager
+    def slot(self, deadline: Optional[float] = None, cancelled: Optional[threading.Event] = None):
+        """
+        Hold one of the shared concurrency slots (after taking a token) for the duration of a request.
+        Waiting for either raises TimeoutError past `deadline` and RequestCancelled once `cancelled` is set.
+        """
+        self.acquire_token(deadline, cancelled)
+        if not self.slot_paths:
+            yield
+            return
+        slot_file = None
+        while slot_file is None:
+            for path in random.sample(self.slot_paths, len(self.slot_paths)):
+                candidate = open(path, "a")
+                try:
+                    fcntl.flock(candidate, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                except BlockingIOError:
+                    candidate.close()
+                    continue
+                slot_file = candidate
+                break
+            else:
+                wait = random.uniform(0.005, 0.02)
+                self._check_wait(wait, deadline, cancelled)
+                time.sleep(wait)
+        try:
+            yield
+        finally:
+            fcntl.flock(slot_file, fcntl.LOCK_UN)
+            slot_file.close()
+
+    def on_success(self):
+        """Additive increase of the shared rate."""
+        if self.initial_rate is None:
+            return
+        with self._locked_state() as state:
+            self._refill(state, time.time())
+            state["rate"] = min(self.max_rate, state["rate"] + self.increase_step)
+
+    def on_rate_limited(self, retry_after: Optional[float] = None) -> float:
+        """
+        Record a 429: pause every client and cut the rate (if there is one).
+
+        Concurrent requests often see the same 429, so the rate is cut at most once per refill
+        interval. Without a Retry-After header the pause is a short jittered backoff.
+
+        Returns:
+            float: Seconds until requests are allowed again
+        """
+        self.rate_limited += 1
+        with self._locked_state() as state:
+            now = time.time()
+            self._refill(state, now)
+            if state["rate"] is not None and now - state["last_decrease"] > 1 / state["rate"]:
+                state["rate"] = max(self.min_rate, state["rate"] * self.decrease_factor)
+                state["last_decrease"] = now
+                logger.warning(f"Rate limited, lowering request rate to {state['rate']:.2f}/s")
+            pause = retry_after
+            if pause is None:
+                pause = jittered_backoff(1) + (1 / state["rate"] if state["rate"] is not None else 0.0)
+            state["blocked_until"] = max(state["blocked_until"], now + pause)
+            state["tokens"] = 0.0
+            return state["blocked_until"] - now
+
+    def stats(self) -> dict:
+        with self._locked_state() as state:
+            rate = state["rate"]
+        return {"rate": rate, "rate_limited": self.rate_limited, "waited_seconds": self.waited_seconds}
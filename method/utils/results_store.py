@@ -0,0 +1,202 @@
+"""Indexed SQLite store for QA results and their evaluations."""
+
+import argparse
+import json
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from loguru import logger
+
+TABLES = ("results", "evaluations")
+METRICS = ("choice_acc", "freetext_acc", "scoring_point", "scoring_point_long", "scoring_point_short")
+STORE_SUFFIXES = (".sqlite", ".sqlite3", ".db")
+
+
+def is_results_store(path) -> bool:
+    """True if `path` names a ResultsStore database rather than a JSONL file."""
+    return Path(path).suffix.lower() in STORE_SUFFIXES
+
+
+class ResultsStore:
+    """
+    SQLite results store; safe to share between threads and processes.
+
+    Args:
+        path: Database file
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, timeout=60, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        metric_columns = "".join(f", {metric} REAL" for metric in METRICS)
+        for table in TABLES:
+            # question_id has no type affinity, so integer and string ids come back as they were written;
+            # seq orders the rows by their last write, like the line order of a JSONL file
+            self._conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} (concept_id TEXT NOT NULL, question_id NOT NULL, "
+                f"difficulty TEXT NOT NULL, run_id TEXT NOT NULL DEFAULT '', seq INTEGER NOT NULL, "
+                f"record TEXT NOT NULL{metric_columns if table == 'evaluations' else ''})"
+            )
+            self._conn.execute(
+                f"CREATE UNIQUE INDEX IF NOT EXISTS {table}_key "
+                f"ON {table} (concept_id, question_id, difficulty, run_id)"
+            )
+            self._conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_seq ON {table} (seq)")
+
+    @staticmethod
+    def _check_table(table: str):
+        if table not in TABLES:
+            raise ValueError(f"Unknown results store table {table!r} (expected one of {TABLES})")
+
+    def _row(self, table: str, record: Dict[str, Any], run_id: str) -> tuple:
+        row = (record["concept_id"], record["question_id"], record["difficulty"], run_id)
+        row += (json.dumps(record, ensure_ascii=False),)
+        if table == "evaluations":
+            row += tuple(record.get(metric) for metric in METRICS)
+        return row
+
+    def _upsert_sql(self, table: str) -> str:
+        columns = ["concept_id", "question_id", "difficulty", "run_id", "record"]
+        if table == "evaluations":
+            columns += METRICS
+        updates = ", ".join(f"{column} = excluded.{column}" for column in ["seq"] + columns[4:])
+        return (
+            f"INSERT INTO {table} ({', '.join(columns)}, seq) "
+            f"VALUES ({', '.join('?' * len(columns))}, (SELECT COALESCE(MAX(seq), 0) + 1 FROM {table})) "
+            f"ON CONFLICT (concept_id, question_id, difficulty, run_id) DO UPDATE SET {updates}"
+        )
+
+    def upsert(self, table: str, record: Dict[str, Any], run_id: str = ""):
+        """Write a record, replacing the row of the same question and run."""
+        self.upsert_many(table, [record], run_id)
+
+    def upsert_many(self, table: str, records: Iterable[Dict[str, Any]], run_id: str = "") -> int:
+        """Write records in one transaction (later records win); returns their number."""
+        self._check_table(table)
+        rows = [self._row(table, record, run_id) for record in records]
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                # One statement per row: each takes the next seq
+                for row in rows:
+                    self._conn.execute(self._upsert_sql(table), row)
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return len(rows)
+
+    def contains(
+        self, table: str, concept_id: str, question_id: Any, difficulty: str, run_id: Optional[str] = None
+    ) -> bool:
+        """Whether the question has a row (in run `run_id`, or in any run if None)."""
+        self._check_table(table)
+        sql = f"SELECT 1 FROM {table} WHERE concept_id = ? AND question_id = ? AND difficulty = ?"
+        params = [concept_id, question_id, difficulty]
+        if run_id is not None:
+            sql += " AND run_id = ?"
+            params.append(run_id)
+        with self._lock:
+            return self._conn.execute(sql + " LIMIT 1", params).fetchone() is not None
+
+    def get(
+        self, table: str, concept_id: str, question_id: Any, difficulty: str, run_id: str = ""
+    ) -> Optional[Dict[str, Any]]:
+        """The record of the question in run `run_id`, or None."""
+        self._check_table(table)
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT record FROM {table} WHERE concept_id = ? AND question_id = ? AND difficulty = ? "
+                f"AND run_id = ?",
+                (concept_id, question_id, difficulty, run_id),
+            ).fetchone()
+        return None if row is None else json.loads(row[0])
+
+    def _latest_filter(self, table: str, run_id: Optional[str]) -> Tuple[str, list]:
+        """WHERE clause selecting the latest row per question (within run `run_id` if given)."""
+        run_filter, params = ("", []) if run_id is None else (" WHERE run_id = ?", [run_id])
+        latest_seqs = f"SELECT MAX(seq) FROM {table}{run_filter} GROUP BY concept_id, question_id, difficulty"
+        return f" WHERE seq IN ({latest_seqs})", params
+
+    def latest(self, table: str, run_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Latest record per (concept_id, question_id, difficulty), in write order, as filter_latest_results."""
+        self._check_table(table)
+        where, params = self._latest_filter(table, run_id)
+        with self._lock:
+            rows = self._conn.execute(f"SELECT record FROM {table}{where} ORDER BY seq", params).fetchall()
+        return [json.loads(record) for record, in rows]
+
+    def metric_sums(self, run_id: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        Count and score sums of the latest evaluation per question, per difficulty (one aggregate query).
+        Evaluations not judged yet (only the choice accuracy written, freetext_acc null) are left out.
+        """
+        where, params = self._latest_filter("evaluations", run_id)
+        where += " AND freetext_acc IS NOT NULL"
+        sums = ", ".join(f"TOTAL({metric})" for metric in METRICS)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT difficulty, COUNT(*), {sums} FROM evaluations{where} GROUP BY difficulty", params
+            ).fetchall()
+        return {row[0]: {"count": row[1], "sums": dict(zip(METRICS, row[2:]))} for row in rows}
+
+    def count(self, table: str) -> int:
+        self._check_table(table)
+        with self._lock:
+            return self._conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+    def export_jsonl(self, table: str, path: str, latest_only: bool = False) -> int:
+        """Write a table (every row, or only the latest per question) to JSONL in write order."""
+        self._check_table(table)
+        where, params = self._latest_filter(table, None) if latest_only else ("", [])
+        with self._lock:
+            rows = self._conn.execute(f"SELECT record FROM {table}{where} ORDER BY seq", params).fetchall()
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            for record, in rows:
+                f.write(record + "\n")
+        return len(rows)
+
+    def import_jsonl(self, table: str, path: str, run_id: str = "") -> int:
+        """Upsert the records of a JSONL file (the last line per question wins); returns their number."""
+        records = []
+        with open(path, "r", encoding="utf-8") as f:
+            for line_num, line in enumerate(f, 1):
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError as e:
+                    logger.warning(f"Invalid JSON on line {line_num} in {path}: {e}")
+        return self.upsert_many(table, records, run_id)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import / export a results store")
+    parser.add_argument("command", choices=["import", "export"])
+    parser.add_argument("store", help="Database file")
+    parser.add_argument("table", choices=TABLES)
+    parser.add_argument("jsonl", help="JSONL file to import from / export to")
+    parser.add_argument("--run-id", default="", help="Run id of the imported rows")
+    parser.add_argument("--latest-only", action="store_true", help="Export only the latest row per question")
+    args = parser.parse_args()
+
+    store = ResultsStore(args.store)
+    if args.command == "import":
+        count = store.import_jsonl(args.table, args.jsonl, args.run_id)
+        logger.info(f"Imported {count} rows from {args.jsonl} into {args.store}:{args.table}")
+    else:
+        count = store.export_jsonl(args.table, args.jsonl, args.latest_only)
+        logger.info(f"Exported {count} rows from {args.store}:{args.table} to {args.jsonl}")
+    store.close()
@@ -0,0 +1,53 @@
+"""Token streaming for the local backends."""
+
+import threading
+from typing import Callable, Iterator
+
+from transformers import StoppingCriteria, StoppingCriteriaList, TextIteratorStreamer
+
+from .generation_profiles import until_stop
+
+
+class _Cancelled(StoppingCriteria):
+    def __init__(self, event: threading.Event):
+        self.event = event
+
+    def __call__(self, input_ids, scores, **kwargs) -> bool:
+        return self.event.is_set()
+
+
+def stream_generate(
+    generate: Callable[..., object], tokenizer, stop: tuple = (), timeout: float = 600.0
+) -> Iterator[str]:
+    """
+    Stream the text produced by `generate`.
+
+    Args:
+        generate: Called with `streamer` and `stopping_criteria` kwargs, which it must forward to `generate()`
+        tokenizer: Tokenizer used to decode the streamed tokens
+        stop: Stop strings; the stream ends before the first one
+        timeout: Seconds to wait for the next chunk before giving up
+
+    Yields:
+        str: Decoded text chunks
+    """
+    streamer = TextIteratorStreamer(tokenizer, skip_prompt=True, skip_special_tokens=True, timeout=timeout)
+    cancelled = threading.Event()
+    errors = []
+
+    def run():
+        try:
+            generate(streamer=streamer, stopping_criteria=StoppingCriteriaList([_Cancelled(cancelled)]))
+        except Exception as e:
+            errors.append(e)
+            streamer.end()
+
+    thread = threading.Thread(target=run, name="stream-generate", daemon=True)
+    thread.start()
+    try:
+        yield from until_stop(streamer, stop)
+    finally:
+        cancelled.set()
+        thread.join()
+    if errors:
+        raise errors[0]
@@ -0,0 +1,26 @@
+import tempfile
+
+import pytest
+
+from method.utils.mock_openai_server import MockOpenAIServer
+
+
+@pytest.fixture
+def api_env(monkeypatch, tmp_path):
+    """Point APIModel at a mock server; returns a function starting one with the given options."""
+    servers = []
+
+    def start(**options) -> MockOpenAIServer:
+        server = MockOpenAIServer(**options).start()
+        servers.append(server)
+        monkeypatch.setenv("API_URL", server.url)
+        monkeypatch.setenv("API_KEY", "test-key")
+        # Keep the shared rate-limiter state of the tests away from real runs
+        monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+        for name in ("API_RATE_LIMIT", "API_MAX_CONCURRENCY", "API_TIMEOUT", "API_HEDGE_MAX_RATE"):
+            monkeypatch.delenv(name, raising=False)
+        return server
+
+    yield start
+    for server in servers:
+        server.stop()
@@ -0,0 +1,128 @@
+import asyncio
+import base64
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+import pytest
+from PIL import Image
+
+from method.utils.models.api_model import APIModel
+
+def test_pooled_sync_calls_reuse_connections(api_env):
+    server = api_env()
+    model = APIModel("mock-model", max_concurrency=4)
+    prompts = [f"prompt {i}" for i in range(24)]
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        replies = list(executor.map(model.chat_text, prompts))
+    model.close()
+
+    assert replies == [f"echo: {prompt}" for prompt in prompts]
+    assert server.requests == len(prompts)
+    assert server.connections <= 4
+
+
+def test_async_calls_are_bounded_by_max_concurrency(api_env):
+    server = api_env(latency_ms=50)
+    model = APIModel("mock-model", max_concurrency=4)
+    prompts = [f"prompt {i}" for i in range(16)]
+
+    async def run():
+        return await asyncio.gather(*(model.achat_text(prompt) for prompt in prompts))
+
+    replies = asyncio.run(run())
+    model.close()
+
+    assert replies == [f"echo: {prompt}" for prompt in prompts]
+    assert 1 < server.max_in_flight <= 4
+    assert server.connections <= 4
+
+
+def test_server_errors_are_retried(api_env):
+    server = api_env(fail_requests=2)
+    model = APIModel("mock-model")
+    assert model.chat_text("hello") == "echo: hello"
+    assert asyncio.run(model.achat_text("again")) == "echo: again"
+    model.close()
+
+    assert server.failed == 2
+    assert server.requests == 2
+
+
+def test_rate_limited_requests_wait_for_retry_after(api_env):
+    server = api_env(max_rps=2)
+    model = APIModel("mock-model", max_concurrency=4)
+    prompts = [f"prompt {i}" for i in range(6)]
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        replies = list(executor.map(model.chat_text, prompts))
+    model.close()
+
+    assert replies == [f"echo: {prompt}" for prompt in prompts]
+    assert server.rejected > 0
+    assert model.rate_limiter.rate_limited > 0
+    # Every 429 carries Retry-After: 1, which pauses all clients of the endpoint
+    assert model.rate_limiter.waited_seconds >= 0.5
+
+
+def test_persistent_errors_fail_within_the_deadline(api_env):
+    api_env(fail_requests=1000)
+    model = APIModel("mock-model")
+    with pytest.raises(Exception, match="deadline|failed after"):
+        model.chat_text("hello", timeout=0.5)
+    model.close()
+
+
+def test_rate_limiter_pause_does_not_outlive_the_deadline(api_env):
+    server = api_env()
+    model = APIModel("mock-model")
+    model.rate_limiter.on_rate_limited(retry_after=30.0)
+    start = time.time()
+    with pytest.raises(TimeoutError):
+        model.chat_text("hello", timeout=1.0)
+    model.close()
+
+    assert time.time() - start < 1.5
+    assert server.requests == 0
+
+
+def test_hedges_stay_within_budget(api_env):
+    server = api_env(latency_ms=5, tail_fraction=0.2, tail_latency_ms=300)
+    model = APIModel("mock-model", hedging={"quantile": 0.5, "max_rate": 0.2, "min_samples": 10})
+    replies = [model.chat_text(f"prompt {i}") for i in range(40)]
+    time.sleep(0.4)
+    model.close()
+
+    counts = model.hedge_counts
+    assert replies == [f"echo: prompt {i}" for i in range(40)]
+    assert 0 < counts["hedges"] <= 0.2 * counts["calls"]
+    # Each hedge is exactly one extra request, abandoned or not; losers are never retried
+    assert server.requests == counts["calls"] + counts["hedges"]
+
+
+def image_sizes_reply(payload: dict) -> str:
+    """Sizes of the images a request carries, decoded from their data URLs."""
+    sizes = []
+    for part in payload["messages"][-1]["content"]:
+        if part["type"] == "image_url":
+            data = base64.b64decode(part["image_url"]["url"].split(",", 1)[1])
+            with Image.open(BytesIO(data)) as image:
+                sizes.append(f"{image.format} {image.width}x{image.height}")
+    return ", ".join(sizes)
+
+
+def test_image_payloads_are_downscaled_and_cached(api_env):
+    server = api_env(reply=image_sizes_reply)
+    model = APIModel("mock-model", image_encoding={"max_edge": 100, "quality": 80})
+    large = Image.new("RGBA", (400, 200), (255, 0, 0, 255))
+    small = Image.new("RGB", (60, 30), (0, 0, 255))
+
+    assert model.chat_img("describe", large) == "JPEG 100x50"
+    # Images are only ever downscaled
+    assert model.chat_multi_img("compare", [small, large.copy()]) == "JPEG 60x30, JPEG 100x50"
+    model.close()
+
+    # The copy hits the payload encoded for the first call
+    assert model.image_cache.stats()["hits"] == 1
+    assert model.image_cache.stats()["entries"] == 2
+    assert server.requests == 2
+
@@ -0,0 +1,152 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from PIL import Image
+
+from method.utils.batching_utils import BatchScheduler
+
+
+class GroupedBackend:
+    """Backend with per-kind batch methods, recording each call."""
+
+    def __init__(self, fail: bool = False, short: bool = False):
+        self.calls = []
+        self.fail = fail
+        self.short = short
+        self.tokenizer = "tokenizer"
+
+    def chat_text_batch(self, prompts, max_tokens=None, profile=None):
+        self.calls.append(("text_batch", len(prompts), profile, max_tokens))
+        if self.fail:
+            raise ValueError("out of memory")
+        outputs = [f"text: {prompt}" for prompt in prompts]
+        return outputs[:-1] if self.short else outputs
+
+    def chat_img_batch(self, prompts, images, max_tokens=None, profile=None):
+        self.calls.append(("img_batch", len(prompts), profile, max_tokens))
+        return [f"img {image.size[0]}: {prompt}" for prompt, image in zip(prompts, images)]
+
+    def chat_text(self, prompt, max_tokens=None, profile=None, **kwargs):
+        self.calls.append(("text", 1, profile, max_tokens))
+        return f"single: {prompt} {kwargs}"
+
+
+def submit_concurrently(scheduler, requests):
+    """Submit (kind, prompt, kwargs) requests at once and wait for all of them."""
+    barrier = threading.Barrier(len(requests))
+
+    def call(request):
+        kind, prompt, kwargs = request
+        barrier.wait()
+        if kind == "img":
+            return scheduler.chat_img(prompt, Image.new("RGB", (kwargs.pop("width"), 4)), **kwargs)
+        return scheduler.chat_text(prompt, **kwargs)
+
+    with ThreadPoolExecutor(max_workers=len(requests)) as executor:
+        return list(executor.map(call, requests))
+
+
+def test_concurrent_requests_are_grouped_by_kind_profile_and_max_tokens():
+    backend = GroupedBackend()
+    scheduler = BatchScheduler(backend, max_batch_size=16, max_wait_ms=200)
+    requests = [("text", f"t{i}", {"profile": "answer"}) for i in range(4)]
+    requests += [("text", f"c{i}", {"profile": "choice"}) for i in range(2)]
+    requests += [("img", f"i{i}", {"width": 8, "profile": "answer"}) for i in range(3)]
+    replies = submit_concurrently(scheduler, requests)
+    scheduler.close()
+
+    assert replies[:6] == [f"text: {prompt}" for _, prompt, _ in requests[:6]]
+    assert replies[6:] == ["img 8: i0", "img 8: i1", "img 8: i2"]
+    assert sorted(backend.calls) == [
+        ("img_batch", 3, "answer", None),
+        ("text_batch", 2, "choice", None),
+        ("text_batch", 4, "answer", None),
+    ]
+    assert scheduler.stats()["requests"] == len(requests)
+
+
+def test_batch_size_is_capped():
+    backend = GroupedBackend()
+    scheduler = BatchScheduler(backend, max_batch_size=3, max_wait_ms=200)
+    submit_concurrently(scheduler, [("text", f"t{i}", {}) for i in range(7)])
+    scheduler.close()
+
+    assert all(size <= 3 for size in scheduler.batch_sizes)
+    assert scheduler.stats()["requests"] == 7
+
+
+def test_requests_with_backend_options_are_served_alone():
+    backend = GroupedBackend()
+    scheduler = BatchScheduler(backend, max_wait_ms=100)
+    replies = submit_concurrently(scheduler, [("text", "a", {}), ("text", "b", {"grammar": "memory_ops"})])
+    scheduler.close()
+
+    assert replies == ["text: a", "single: b {'grammar': 'memory_ops'}"]
+    assert ("text", 1, None, None) in backend.calls
+
+
+def test_failures_reach_every_caller_of_the_batch():
+    scheduler = BatchScheduler(GroupedBackend(fail=True), max_wait_ms=100)
+    futures = [scheduler.submit_text(f"t{i}") for i in range(3)]
+    for future in futures:
+        with pytest.raises(ValueError, match="out of memory"):
+            future.result(timeout=5)
+    scheduler.close()
+
+
+def test_missing_outputs_fail_instead_of_hanging():
+    scheduler = BatchScheduler(GroupedBackend(short=True), max_wait_ms=100)
+    futures = [scheduler.submit_text(f"t{i}") for i in range(3)]
+    assert [future.result(timeout=5) for future in futures[:2]] == ["text: t0", "text: t1"]
+    with pytest.raises(RuntimeError, match="2 outputs for a batch of 3"):
+        futures[2].result(timeout=5)
+    scheduler.close()
+
+
+def test_close_serves_queued_requests_then_rejects_new_ones():
+    backend = GroupedBackend()
+    scheduler = BatchScheduler(backend, max_wait_ms=1000)
+    future = scheduler.submit_text("queued")
+    scheduler.close()
+
+    assert future.result(timeout=5) == "text: queued"
+    with pytest.raises(RuntimeError, match="closed"):
+        scheduler.submit_text("late")
+    # Unscheduled attributes go straight to the backend
+    assert scheduler.tokenizer == "tokenizer"
+
+
+class MixedBackend:
+    """Backend generating text and image rows with per-row token limits in one batch."""
+
+    def __init__(self):
+        self.calls = []
+
+    def chat_batch(self, prompts, images, max_tokens, profile=None):
+        self.calls.append((profile, list(prompts), [image is not None for image in images], list(max_tokens)))
+        rows = zip(prompts, images, max_tokens)
+        return [f"{prompt} ({'img' if image else 'text'}, {limit})" for prompt, image, limit in rows]
+
+
+def test_mixed_window_goes_to_chat_batch_per_profile():
+    backend = MixedBackend()
+    scheduler = BatchScheduler(backend, max_batch_size=16, max_wait_ms=200)
+    requests = [
+        ("text", "t0", {"max_tokens": 8, "profile": "answer"}),
+        ("img", "i0", {"width": 4, "max_tokens": 64, "profile": "answer"}),
+        ("text", "t1", {"profile": "answer"}),
+        ("text", "c0", {"max_tokens": 8, "profile": "choice"}),
+    ]
+    replies = submit_concurrently(scheduler, requests)
+    scheduler.close()
+
+    assert replies == ["t0 (text, 8)", "i0 (img, 64)", "t1 (text, None)", "c0 (text, 8)"]
+    # Text and image rows with different token limits share one call; profiles do not
+    assert len(backend.calls) == 2
+    answer_call = next(call for call in backend.calls if call[0] == "answer")
+    assert sorted(zip(answer_call[1], answer_call[2], answer_call[3]), key=lambda row: row[0]) == [
+        ("i0", True, 64),
+        ("t0", False, 8),
+        ("t1", False, None),
+    ]
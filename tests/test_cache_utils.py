@@ -0,0 +1,57 @@
+from PIL import Image
+
+from method.utils.cache_utils import LRUCache, image_key, tensor_nbytes
+
+
+class FakeTensor:
+    def __init__(self, nelement: int, element_size: int = 2):
+        self._nelement = nelement
+        self._element_size = element_size
+
+    def nelement(self) -> int:
+        return self._nelement
+
+    def element_size(self) -> int:
+        return self._element_size
+
+
+def test_image_key_follows_the_pixels():
+    image = Image.new("RGB", (8, 4), (255, 0, 0))
+    assert image_key(image) == image_key(image.copy())
+    assert image_key(image) != image_key(Image.new("RGB", (8, 4), (0, 255, 0)))
+    # Same bytes, other shape or mode
+    assert image_key(image) != image_key(Image.new("RGB", (4, 8), (255, 0, 0)))
+    assert image_key(Image.new("L", (4, 4))) != image_key(Image.new("P", (4, 4)))
+
+
+def test_tensor_nbytes_of_nested_outputs():
+    assert tensor_nbytes(FakeTensor(10)) == 20
+    assert tensor_nbytes((FakeTensor(10), [FakeTensor(3, 4)], {"grid": FakeTensor(1, 8)})) == 40
+    assert tensor_nbytes("not a tensor") == 0
+
+
+def test_lru_cache_evicts_by_entries_and_bytes():
+    cache = LRUCache(max_entries=3, max_bytes=100)
+    for key in "abc":
+        cache.put(key, FakeTensor(10))
+    assert cache.get("a") is not None
+    cache.put("d", FakeTensor(10))
+    # "b" was the least recently used
+    assert "b" not in cache and {"a", "c", "d"} <= set(cache._data)
+
+    cache.put("big", FakeTensor(40))
+    assert cache.total_bytes <= 100
+    assert "big" in cache and len(cache) == 2
+
+    cache.put("big", FakeTensor(5))
+    assert cache.total_bytes == sum(size for _, size in cache._data.values())
+
+
+def test_lru_cache_stats():
+    cache = LRUCache(max_entries=None, sizeof=len)
+    cache.put("a", "xyz")
+    assert cache.get("a") == "xyz"
+    assert cache.get("missing", "default") == "default"
+    assert cache.stats() == {"entries": 1, "bytes": 3, "hits": 1, "misses": 1, "hit_rate": 0.5}
+    cache.clear()
+    assert len(cache) == 0 and cache.total_bytes == 0
@@ -0,0 +1,83 @@
+import pytest
+import yaml
+
+from method.utils.constrained_utils import GRAMMARS, Alt, Chars, Grammar, Lit, Opt, Plus, Seq, Star
+
+UPDATE_OPS = GRAMMARS["memory_update_ops"]
+TRANSFER_OPS = GRAMMARS["memory_transfer_ops"]
+
+
+def accepts(grammar: Grammar, text: str) -> bool:
+    return grammar.is_complete(grammar.feed(grammar.start, text))
+
+
+def test_combinators():
+    number = Grammar(Seq(Opt(Lit("-")), Plus(Chars("0123456789"))))
+    assert accepts(number, "42") and accepts(number, "-7")
+    assert not accepts(number, "-") and not accepts(number, "")
+    assert not number.feed(number.start, "4-2")
+
+    words = Grammar(Seq(Star(Alt(Lit("ab"), Lit("c"))), Lit(".")))
+    assert accepts(words, ".") and accepts(words, "abcab.")
+    assert not words.feed(words.start, "ac")
+    assert not accepts(words, "abc")
+
+
+def test_feed_is_incremental_and_pure():
+    state = UPDATE_OPS.feed(UPDATE_OPS.start, "```yaml\n- op: ")
+    # Feeding the rest in one go or in pieces reaches the same state, and the state is never mutated
+    whole = UPDATE_OPS.feed(state, '"add"\n')
+    pieces = UPDATE_OPS.feed(UPDATE_OPS.feed(state, '"ad'), 'd"\n')
+    assert whole == pieces
+    assert UPDATE_OPS.feed(state, '"add"\n') == whole
+
+
+UPDATE_DOCUMENTS = [
+    "```yaml\n[]\n```",
+    '```yaml\n- op: "add"\n  memory: "Has a red collar"\n```',
+    '```yaml\n- op: "modify"\n  memory: "Sleeps on the sofa"\n  target_id: 2\n- op: "remove"\n  target_id: 10\n```',
+]
+
+
+@pytest.mark.parametrize("document", UPDATE_DOCUMENTS)
+def test_update_ops_accepts_parseable_documents(document):
+    assert accepts(UPDATE_OPS, document)
+    # Every proper prefix can still be completed, so generation never dead-ends
+    for end in range(len(document)):
+        state = UPDATE_OPS.feed(UPDATE_OPS.start, document[:end])
+        assert state and not UPDATE_OPS.is_complete(state)
+    ops = yaml.safe_load(document.removeprefix("```yaml\n").removesuffix("```"))
+    assert isinstance(ops, list) and all(op["op"] in ("add", "modify", "remove") for op in ops)
+
+
+@pytest.mark.parametrize(
+    "document",
+    [
+        '```yaml\n- op: "rename"\n```',
+        '```yaml\n- op: "remove"\n  target_id: 0\n```',
+        '```yaml\n- op: "add"\n  memory: "says "hi""\n```',
+        '```yaml\n- op: "add"\n  memory: "two\nlines"\n```',
+        '```yaml\n- op: add\n```',
+        "```json\n[]\n```",
+    ],
+)
+def test_update_ops_rejects_malformed_documents(document):
+    assert not accepts(UPDATE_OPS, document)
+
+
+def test_transfer_ops_document():
+    document = (
+        "```yaml\ndynamic_ops:\n"
+        '- op: "remove"\n  target_id: 1\n'
+        "static_ops:\n"
+        '- op: "add"\n  memory: "Likes long walks"\n'
+        "```"
+    )
+    assert accepts(TRANSFER_OPS, document)
+    parsed = yaml.safe_load(document.removeprefix("```yaml\n").removesuffix("```"))
+    assert parsed == {
+        "dynamic_ops": [{"op": "remove", "target_id": 1}],
+        "static_ops": [{"op": "add", "memory": "Likes long walks"}],
+    }
+    assert accepts(TRANSFER_OPS, "```yaml\ndynamic_ops: []\nstatic_ops: []\n```")
+    assert not accepts(TRANSFER_OPS, "```yaml\nstatic_ops: []\ndynamic_ops: []\n```")
@@ -0,0 +1,386 @@
+import asyncio
+import json
+import sys
+import threading
+import time
+
+import pytest
+import yaml
+
+from evaluator import evaluator
+from method.utils.generation_cache import GenerationCache
+from method.utils.mock_openai_server import judge_reply, judge_yes_probability
+from method.utils.results_store import ResultsStore
+
+CONCEPTS = 4
+QUESTIONS = 3
+
+
+@pytest.fixture
+def concept_tree(tmp_path, monkeypatch):
+    """data/concept tree with easy and hard questions, and a results JSONL answering them."""
+    for c in range(CONCEPTS):
+        concept_dir = tmp_path / "data" / "concept" / f"c{c}"
+        concept_dir.mkdir(parents=True)
+        easy = [
+            {
+                "id": q,
+                "question": f"easy question {q}",
+                "options": ["a", "b", "c", "d"],
+                "answer": "b",
+                "evaluation_criteria": {"ideal_answer": f"red apple {q}", "key_points": [f"apple {q}"]},
+            }
+            for q in range(QUESTIONS)
+        ]
+        hard = [
+            {
+                "id": q,
+                "question": f"hard question {q}",
+                "options": ["a", "b", "c", "d"],
+                "answer": "c",
+                "evaluation_criteria": {
+                    "ideal_answer": f"green pear {q}",
+                    "key_points": [f"green pear {q}", f"ripe fruit {q}"],
+                },
+            }
+            for q in range(QUESTIONS)
+        ]
+        (concept_dir / "easy_question.yaml").write_text(yaml.safe_dump(easy))
+        (concept_dir / "hard_question.yaml").write_text(yaml.safe_dump(hard))
+
+    # Distinct answers, half of them matching the references
+    results = []
+    for c in range(CONCEPTS):
+        for difficulty in ("easy", "hard"):
+            for q in range(QUESTIONS):
+                matching = (c + q) % 2 == 0
+                reference = "red apple" if difficulty == "easy" else "green pear"
+                answer = f"{reference} {q} c{c}" if matching else f"no idea c{c}"
+                results.append(
+                    {
+                        "concept_id": f"c{c}",
+                        "question_id": q,
+                        "difficulty": difficulty,
+                        "choice": "B" if matching else "A",
+                        "answer": answer,
+                    }
+                )
+    input_file = tmp_path / "results.jsonl"
+    input_file.write_text("".join(json.dumps(result) + "\n" for result in results))
+    monkeypatch.chdir(tmp_path)
+    return input_file, results
+
+
+def run_evaluator(monkeypatch, *args):
+    monkeypatch.setattr(sys, "argv", ["evaluator", *map(str, args)])
+    evaluator.main()
+
+
+def result_key(record) -> tuple:
+    return record["concept_id"], record["question_id"], record["difficulty"]
+
+
+def read_evaluations(path) -> dict:
+    evaluations = {}
+    for line in path.read_text().splitlines():
+        evaluation = json.loads(line)
+        evaluations[result_key(evaluation)] = evaluation
+    return evaluations
+
+
+def judge_calls(result, ground_truth) -> int:
+    """Judge calls of one result: the ideal answer and each key point."""
+    criteria = ground_truth[result["concept_id"]][result["difficulty"]][result["question_id"]]
+    return 1 + len(criteria["evaluation_criteria"]["key_points"])
+
+
+def test_concurrency_engine_matches_process_pool(api_env, concept_tree, monkeypatch, tmp_path):
+    input_file, results = concept_tree
+    server = api_env(reply=judge_reply, yes_probability=judge_yes_probability)
+
+    run_evaluator(monkeypatch, input_file, tmp_path / "pool.jsonl")
+    pool_requests = server.requests
+    run_evaluator(monkeypatch, input_file, tmp_path / "async.jsonl", "--concurrency", 8)
+
+    pool_evaluations = read_evaluations(tmp_path / "pool.jsonl")
+    async_evaluations = read_evaluations(tmp_path / "async.jsonl")
+    assert len(pool_evaluations) == len(results)
+    assert async_evaluations == pool_evaluations
+    assert server.requests == 2 * pool_requests
+    # The mock judge says YES to the matching answers only
+    assert 0 < sum(evaluation["freetext_acc"] for evaluation in pool_evaluations.values()) < len(results)
+
+
+def test_pool_workers_build_their_judge_once(api_env, concept_tree, monkeypatch, tmp_path):
+    input_file, results = concept_tree
+    server = api_env(reply=judge_reply, yes_probability=judge_yes_probability)
+    run_evaluator(monkeypatch, input_file, tmp_path / "pool.jsonl")
+
+    # Each judge keeps one connection alive: a judge built per task would open one per result
+    assert server.requests > len(results)
+    assert server.connections <= 2
+
+
+def test_choice_rows_are_written_before_judging(api_env, concept_tree, monkeypatch, tmp_path):
+    input_file, results = concept_tree
+    api_env(reply=judge_reply, yes_probability=judge_yes_probability)
+
+    output_file = tmp_path / "evaluations.jsonl"
+    run_evaluator(monkeypatch, input_file, output_file)
+    rows = [json.loads(line) for line in output_file.read_text().splitlines()]
+
+    # Phase 1: one row per result with the choice accuracy and null judge metrics, then the judged rows
+    choice_rows, judged_rows = rows[: len(results)], rows[len(results) :]
+    assert [result_key(row) for row in choice_rows] == [result_key(result) for result in results]
+    assert all(row["freetext_acc"] is None and row["choice_acc"] in (0, 1) for row in choice_rows)
+    assert len(judged_rows) == len(results)
+    evaluations = read_evaluations(output_file)
+    assert all(evaluations[result_key(row)]["choice_acc"] == row["choice_acc"] for row in choice_rows)
+
+    # A results store fills the judge columns of its phase-1 rows in place
+    store_file = tmp_path / "evaluations.sqlite"
+    run_evaluator(monkeypatch, input_file, store_file)
+    store = ResultsStore(store_file)
+    assert store.count("evaluations") == len(results)
+    assert {result_key(row): row for row in store.latest("evaluations")} == evaluations
+
+
+def on_event_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+@pytest.mark.parametrize("judge_mode", [[], ["--single-prompt-judge"]])
+def test_verdict_cache_stays_off_the_event_loop(api_env, concept_tree, monkeypatch, tmp_path, judge_mode):
+    input_file, results = concept_tree
+    api_env(reply=judge_reply, yes_probability=judge_yes_probability)
+    blocking_calls = []
+    for name in ("get", "put"):
+        original = getattr(GenerationCache, name)
+
+        def recorded(self, *args, _original=original, _name=name):
+            if on_event_loop():
+                blocking_calls.append(_name)
+            return _original(self, *args)
+
+        monkeypatch.setattr(GenerationCache, name, recorded)
+
+    verdict_cache = tmp_path / "verdicts.sqlite"
+    args = ["--concurrency", 8, "--verdict-cache", verdict_cache, *judge_mode]
+    run_evaluator(monkeypatch, input_file, tmp_path / "first.jsonl", *args)
+    run_evaluator(monkeypatch, input_file, tmp_path / "second.jsonl", *args)
+
+    assert blocking_calls == []
+    assert read_evaluations(tmp_path / "second.jsonl") == read_evaluations(tmp_path / "first.jsonl")
+
+
+def test_concurrency_engine_resumes_pool_output(api_env, concept_tree, monkeypatch, tmp_path):
+    input_file, results = concept_tree
+    server = api_env(reply=judge_reply, yes_probability=judge_yes_probability)
+
+    output_file = tmp_path / "evaluations.jsonl"
+    run_evaluator(monkeypatch, input_file, output_file)
+    complete = read_evaluations(output_file)
+
+    # Keep the phase-1 rows and half of the judged rows of the pool engine, as if it had been interrupted
+    lines = output_file.read_text().splitlines(keepends=True)
+    kept = len(results) + len(results) // 2
+    output_file.write_text("".join(lines[:kept]))
+    kept_evaluations = read_evaluations(output_file)
+    done = {key for key, evaluation in kept_evaluations.items() if evaluation["freetext_acc"] is not None}
+    assert len(done) == len(results) // 2
+
+    server.requests = 0
+    run_evaluator(monkeypatch, input_file, output_file, "--concurrency", 8)
+
+    ground_truth = evaluator.load_all_concepts()
+    remaining = [result for result in results if result_key(result) not in done]
+    assert server.requests == sum(judge_calls(result, ground_truth) for result in remaining)
+    # No new phase-1 rows: the remaining results fill in the ones already written
+    assert len(output_file.read_text().splitlines()) == 2 * len(results)
+    assert read_evaluations(output_file) == complete
+
+
+def test_logprob_judge_matches_generated_verdicts(api_env, concept_tree, monkeypatch, tmp_path):
+    input_file, results = concept_tree
+    server = api_env(reply=judge_reply, yes_probability=judge_yes_probability)
+    run_evaluator(monkeypatch, input_file, tmp_path / "generated.jsonl", "--concurrency", 8)
+    generated_requests = server.requests
+
+    # The mock judge replies YES exactly when P(YES) >= 0.5
+    server.requests = 0
+    run_evaluator(monkeypatch, input_file, tmp_path / "logprob.jsonl", "--concurrency", 8, "--logprob-judge")
+    assert server.requests == generated_requests
+    assert read_evaluations(tmp_path / "logprob.jsonl") == read_evaluations(tmp_path / "generated.jsonl")
+
+    run_evaluator(
+        monkeypatch, input_file, tmp_path / "soft.jsonl", "--concurrency", 8, "--logprob-judge", "--soft-judge"
+    )
+    soft = read_evaluations(tmp_path / "soft.jsonl")
+    assert all(0 <= evaluation["freetext_acc"] <= 1 for evaluation in soft.values())
+    assert any(0 < evaluation["freetext_acc"] < 1 for evaluation in soft.values())
+
+
+def test_follow_mode_evaluates_rows_appended_while_it_runs(api_env, concept_tree, monkeypatch, tmp_path):
+    input_file, results = concept_tree
+    api_env(reply=judge_reply, yes_probability=judge_yes_probability)
+    half = len(results) // 2
+    # A later row for the first question, now answering it wrongly, supersedes the first one
+    rewrite = {**results[0], "choice": "A", "answer": "no idea at all"}
+    final_rows = results[half:] + [rewrite]
+
+    tail_file = tmp_path / "tail.jsonl"
+    tail_file.write_text("".join(json.dumps(result) + "\n" for result in results[:half]))
+    args = [tail_file, tmp_path / "follow.jsonl", "--follow", "--idle-timeout", 2]
+    monkeypatch.setattr(sys, "argv", ["evaluator", *map(str, args)])
+    follower = threading.Thread(target=evaluator.main)
+    follower.start()
+    time.sleep(0.5)
+    with open(tail_file, "a") as f:
+        for row in final_rows:
+            # Split lines are only read once complete
+            line = json.dumps(row) + "\n"
+            f.write(line[:10])
+            f.flush()
+            f.write(line[10:])
+    follower.join(timeout=60)
+    assert not follower.is_alive()
+
+    run_evaluator(monkeypatch, tail_file, tmp_path / "batch.jsonl", "--concurrency", 8)
+    followed = read_evaluations(tmp_path / "follow.jsonl")
+    assert len(followed) == len(results)
+    assert followed == read_evaluations(tmp_path / "batch.jsonl")
+    assert followed[result_key(results[0])]["freetext_acc"] == 0
+
+
+def test_results_store_input_is_read_per_run(api_env, concept_tree, monkeypatch, tmp_path):
+    input_file, results = concept_tree
+    api_env(reply=judge_reply, yes_probability=judge_yes_probability)
+    store = ResultsStore(tmp_path / "results.sqlite")
+    store.upsert_many("results", results, run_id="model-a")
+    store.upsert_many("results", results[:3], run_id="model-b")
+    store.close()
+
+    with pytest.raises(SystemExit):
+        run_evaluator(monkeypatch, tmp_path / "results.sqlite", tmp_path / "evaluations.sqlite")
+    run_evaluator(
+        monkeypatch, tmp_path / "results.sqlite", tmp_path / "evaluations.sqlite", "--run-id", "model-b"
+    )
+
+    store = ResultsStore(tmp_path / "evaluations.sqlite")
+    assert {result_key(evaluation) for evaluation in store.latest("evaluations", "model-b")} == {
+        result_key(result) for result in results[:3]
+    }
+    assert store.count("evaluations") == 3
+
+
+CRITERIA = {
+    "ideal_answer": ("ideal_answer", "a red apple"),
+    "key_point_1": ("key_point", "red"),
+    "key_point_2": ("key_point", "apple"),
+}
+
+
+@pytest.mark.parametrize(
+    "response, verdicts",
+    [
+        ('{"ideal_answer": "YES", "key_point_1": "no", "key_point_2": true}', [1, 0, 1]),
+        ('Verdicts:\n```json\n{"ideal_answer": " Yes ", "key_point_1": false, "key_point_2": "NO"}\n```', [1, 0, 0]),
+        # Cut short by the token cap: the verdicts given so far count
+        ('{"ideal_answer": "YES", "key_point_1": "YES",', [1, 1]),
+        ('{"ideal_answer": "NO", "key_point_1": "maybe", "unknown": "YES"}', [0]),
+        ('["YES", "NO"]', []),
+        ("YES", []),
+        ('{"ideal_answer": "YES" "key_point_1"}', []),
+    ],
+)
+def test_parse_multi_criterion_verdict(response, verdicts):
+    parsed = evaluator.parse_multi_criterion_verdict(response, CRITERIA)
+    assert list(parsed.values()) == verdicts
+    assert list(parsed) == list(CRITERIA)[: len(verdicts)]
+
+
+def test_single_prompt_judge_agrees_with_per_criterion_judging(api_env, concept_tree, monkeypatch, tmp_path):
+    input_file, results = concept_tree
+    server = api_env(reply=judge_reply, yes_probability=judge_yes_probability)
+    run_evaluator(monkeypatch, input_file, tmp_path / "per_criterion.jsonl", "--concurrency", 8)
+    server.requests = 0
+    run_evaluator(
+        monkeypatch, input_file, tmp_path / "single.jsonl", "--concurrency", 8, "--single-prompt-judge"
+    )
+
+    # One judge call per result instead of one per criterion
+    assert server.requests == len(results)
+    assert read_evaluations(tmp_path / "single.jsonl") == read_evaluations(tmp_path / "per_criterion.jsonl")
+
+
+def test_verdict_cache_answers_repeated_judgements(api_env, concept_tree, monkeypatch, tmp_path):
+    input_file, results = concept_tree
+    server = api_env(reply=judge_reply, yes_probability=judge_yes_probability)
+    verdict_cache = tmp_path / "verdicts.sqlite"
+    run_evaluator(monkeypatch, input_file, tmp_path / "first.jsonl", "--verdict-cache", verdict_cache)
+    first_requests = server.requests
+
+    # A new output file, as for another run over the same answers: every verdict comes from the cache
+    server.requests = 0
+    run_evaluator(monkeypatch, input_file, tmp_path / "second.jsonl", "--verdict-cache", verdict_cache)
+    assert first_requests > 0 and server.requests == 0
+    assert read_evaluations(tmp_path / "second.jsonl") == read_evaluations(tmp_path / "first.jsonl")
+
+    cache = evaluator.JudgeVerdictCache(str(verdict_cache), "Qwen/Qwen2.5-72B-Instruct")
+    assert cache.stats()["entries"] == first_requests
+    # Keys are per judge model and per judgement kind
+    other_judge = evaluator.JudgeVerdictCache(str(verdict_cache), "other-judge")
+    key = cache.key("key_point", "red apple", "a red apple")
+    assert key != other_judge.key("key_point", "red apple", "a red apple")
+    assert key != cache.key("key_point", "red apple", "a red apple", single_prompt=True)
+    assert key != cache.key("key_point", "red apple", "a red apple", logprob=True)
+
+
+def sample_evaluation(i: int, difficulty: str) -> dict:
+    evaluation = {"concept_id": f"c{i % 3}", "question_id": i, "difficulty": difficulty, "choice_acc": i % 2}
+    for j, metric in enumerate(evaluator.EvaluationStats.METRICS[difficulty][1:], 1):
+        evaluation[metric] = ((i + j) % 4) / 3
+    return evaluation
+
+
+def test_evaluation_stats_add_and_remove():
+    evaluations = [sample_evaluation(i, difficulty) for i in range(12) for difficulty in ("easy", "hard")]
+    stats = evaluator.EvaluationStats(evaluations)
+    for difficulty, metrics in evaluator.EvaluationStats.METRICS.items():
+        rows = [evaluation for evaluation in evaluations if evaluation["difficulty"] == difficulty]
+        assert stats.count(difficulty) == len(rows)
+        for metric in metrics:
+            assert stats.mean(difficulty, metric) == pytest.approx(sum(row[metric] for row in rows) / len(rows))
+
+    # Superseding a row takes the old one back; phase-1 rows and unknown difficulties are not counted
+    newer = {**evaluations[0], "choice_acc": 1, "freetext_acc": 1.0}
+    stats.remove(evaluations[0])
+    stats.add(newer)
+    stats.add(evaluator.choice_row(evaluations[2], 1))
+    stats.add({**evaluations[2], "difficulty": "medium"})
+    assert stats.count("easy") == 12
+    latest = [newer] + [row for row in evaluations[1:] if row["difficulty"] == "easy"]
+    assert stats.mean("easy", "freetext_acc") == pytest.approx(sum(row["freetext_acc"] for row in latest) / 12)
+
+    for evaluation in evaluations[1:]:
+        stats.remove(evaluation)
+    stats.remove(newer)
+    assert stats.count("easy") == stats.count("hard") == 0
+    assert stats.mean("hard", "choice_acc") == 0.0
+
+
+def test_evaluation_stats_from_store_sums(tmp_path):
+    evaluations = [sample_evaluation(i, difficulty) for i in range(10) for difficulty in ("easy", "hard")]
+    store = ResultsStore(tmp_path / "evaluations.sqlite")
+    store.upsert_many("evaluations", evaluations[:-2] + [evaluator.choice_row(row, 0) for row in evaluations[-2:]])
+
+    from_sums = evaluator.EvaluationStats.from_sums(store.metric_sums())
+    scanned = evaluator.EvaluationStats(evaluations[:-2])
+    assert from_sums.counts == scanned.counts
+    for difficulty, metrics in evaluator.EvaluationStats.METRICS.items():
+        for metric in metrics:
+            assert from_sums.mean(difficulty, metric) == pytest.approx(scanned.mean(difficulty, metric))
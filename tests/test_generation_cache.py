@@ -0,0 +1,86 @@
+import pytest
+
+from method.utils.generation_cache import CachedModel, GenerationCache
+from method.utils.generation_profiles import build_profiles
+
+
+class CountingBackend:
+    """Backend stand-in counting its generations."""
+
+    def __init__(self, params=None):
+        self.params = params or {}
+        self.profiles = build_profiles()
+        self.default_max_tokens = 512
+        self.calls = 0
+
+    def chat_text(self, prompt, max_tokens=None, profile=None, **kwargs):
+        self.calls += 1
+        return f"reply {self.calls}"
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = GenerationCache(tmp_path / "generations.sqlite", max_bytes=100, check_every=1)
+    for i in range(5):
+        cache.put(f"key {i}", "x" * 20)
+    # Touch key 0 so key 1 becomes the least recently used
+    assert cache.get("key 0") == "x" * 20
+    cache.put("key 5", "x" * 20)
+
+    assert cache.get("key 1") is None
+    assert cache.get("key 0") is not None and cache.get("key 5") is not None
+    assert cache._stored_bytes() <= 100
+    cache.close()
+
+
+def test_size_bound_holds_across_processes_sharing_the_file(tmp_path):
+    path = tmp_path / "generations.sqlite"
+    first = GenerationCache(path, max_bytes=200, check_every=4)
+    second = GenerationCache(path, max_bytes=200, check_every=4)
+    for i in range(40):
+        (first if i % 2 else second).put(f"key {i}", "x" * 10)
+
+    # Each writer re-reads the shared total every `check_every` puts
+    assert first._stored_bytes() <= 200 + 2 * 4 * 10
+    assert first.get("key 39") is not None
+    first.close()
+    second.close()
+
+
+def test_only_greedy_calls_are_cached(tmp_path):
+    backend = CountingBackend()
+    model = CachedModel(backend, "mock", GenerationCache(tmp_path / "generations.sqlite"))
+
+    assert model.chat_text("q", profile="judge") == model.chat_text("q", profile="judge") == "reply 1"
+    # The answer profile samples, so every call generates
+    assert model.chat_text("q", profile="answer") != model.chat_text("q", profile="answer")
+    assert backend.calls == 3
+
+
+@pytest.mark.parametrize(
+    "params, cached",
+    [
+        ({"do_sample": True, "temperature": 0.7}, False),
+        ({"do_sample": False}, True),
+        ({"temperature": 0}, True),
+    ],
+)
+def test_cacheability_follows_the_merged_sampling(tmp_path, params, cached):
+    backend = CountingBackend(params)
+    model = CachedModel(backend, "mock", GenerationCache(tmp_path / "generations.sqlite"))
+    model.chat_text("q", profile="answer")
+    model.chat_text("q", profile="answer")
+    assert backend.calls == (1 if cached else 2)
+
+    # A greedy profile stays greedy whatever the params say
+    model.chat_text("q", profile="choice")
+    model.chat_text("q", profile="choice")
+    assert backend.calls == (2 if cached else 3)
+
+
+def test_sampled_calls_are_cached_on_request(tmp_path):
+    backend = CountingBackend({"do_sample": True})
+    cache = GenerationCache(tmp_path / "generations.sqlite")
+    model = CachedModel(backend, "mock", cache, deterministic_only=False)
+    assert model.chat_text("q", profile="answer") == model.chat_text("q", profile="answer")
+    assert backend.calls == 1
+    assert cache.stats()["hits"] == 1
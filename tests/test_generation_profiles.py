@@ -0,0 +1,76 @@
+import pytest
+
+from method.utils.generation_profiles import (
+    GenerationProfile,
+    build_profiles,
+    hf_generate_kwargs,
+    is_deterministic,
+    sampling_settings,
+    truncate_at_stop,
+    until_stop,
+)
+from method.utils.models.api_model import APIModel
+
+
+def test_truncate_at_stop_cuts_before_the_earliest_stop():
+    assert truncate_at_stop("a: 1\n```\nrest", ("```\n",)) == "a: 1\n"
+    assert truncate_at_stop("YES. Because", (".", "\n")) == "YES"
+    assert truncate_at_stop("no stop here", ("```\n",)) == "no stop here"
+    assert truncate_at_stop("anything", ()) == "anything"
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 3, 5, 100])
+def test_until_stop_matches_truncate_at_stop(chunk_size):
+    stop = ("```\n", "END")
+    for text in ("a: 1\n```\nrest", "ops\nEND trailing", "``` not a fence\n```\n", "no stop at all", "END"):
+        chunks = [text[i : i + chunk_size] for i in range(0, len(text), chunk_size)]
+        streamed = list(until_stop(chunks, stop))
+        assert "".join(streamed) == truncate_at_stop(text, stop)
+        assert all(streamed)
+
+
+def test_until_stop_holds_back_only_a_possible_stop_prefix():
+    stream = until_stop(iter(["abcdef", "```", "\nnever"]), ("```\n",))
+    # Everything but the last len(stop) - 1 characters is released as soon as it arrives
+    assert next(stream) == "abc"
+    assert list(stream) == ["def"]
+
+
+def test_until_stop_passes_chunks_through_without_stops():
+    assert list(until_stop(["a", "b"], ())) == ["a", "b"]
+
+
+def test_profile_sampling_overrides_backend_params():
+    params = {"do_sample": True, "temperature": 0.7, "top_p": 0.9, "repetition_penalty": 1.05}
+    greedy = GenerationProfile(max_tokens=8, stop=("\n",), do_sample=False)
+    kwargs = hf_generate_kwargs(greedy, "tokenizer", params)
+    assert kwargs == {
+        "do_sample": False,
+        "repetition_penalty": 1.05,
+        "stop_strings": ["\n"],
+        "tokenizer": "tokenizer",
+        "max_new_tokens": 8,
+    }
+    assert is_deterministic(sampling_settings(greedy, params))
+
+    # A profile that leaves sampling open keeps the backend params, and its own fields win
+    open_profile = GenerationProfile(max_tokens=64, temperature=0.2)
+    assert sampling_settings(open_profile, params) == {"do_sample": True, "temperature": 0.2, "top_p": 0.9}
+    assert sampling_settings(GenerationProfile(), params) == {"do_sample": True, "temperature": 0.7, "top_p": 0.9}
+    assert not is_deterministic(sampling_settings(GenerationProfile(), {}))
+    assert is_deterministic(sampling_settings(GenerationProfile(), {"temperature": 0}))
+
+
+def test_api_payload_keeps_the_profile_sampling(api_env):
+    api_env()
+    model = APIModel("mock-model", params={"temperature": 0.9, "top_p": 0.5, "seed": 1})
+    model.profiles = build_profiles({"answer": {"temperature": 0.3}})
+
+    judge = model._build_payload("prompt", [], None, 0.8, "judge")
+    assert judge["temperature"] == 0.0 and "top_p" not in judge
+    assert judge["max_tokens"] == 8 and judge["seed"] == 1
+    answer = model._build_payload("prompt", [], None, 0.8, "answer")
+    assert (answer["temperature"], answer["top_p"]) == (0.3, 0.5)
+    # Without a profile, the backend params override the call's default temperature
+    assert model._build_payload("prompt", [], None, 0.8, None)["temperature"] == 0.9
+    model.close()
@@ -0,0 +1,39 @@
+import pytest
+
+pytest.importorskip("torchvision")
+
+import numpy as np
+import torch
+from PIL import Image
+
+from method.utils.models.internvl_model import (
+    build_transform,
+    dynamic_preprocess,
+    dynamic_preprocess_tensor,
+    get_target_ratios,
+)
+
+
+def random_image(width: int, height: int) -> Image.Image:
+    pixels = np.random.default_rng(0).integers(0, 256, size=(height, width, 3), dtype=np.uint8)
+    return Image.fromarray(pixels)
+
+
+@pytest.mark.parametrize("size, max_num", [((300, 200), 6), ((900, 120), 12), ((64, 64), 1)])
+def test_tensor_tiling_matches_the_pil_tiles(size, max_num):
+    image = random_image(*size)
+    tiles = dynamic_preprocess(image, image_size=112, use_thumbnail=True, max_num=max_num)
+    transform = build_transform(112)
+    expected = torch.stack([transform(tile) for tile in tiles])
+
+    actual = dynamic_preprocess_tensor(image, image_size=112, use_thumbnail=True, max_num=max_num)
+    assert actual.shape == expected.shape
+    assert torch.allclose(actual, expected, atol=1e-5)
+
+
+def test_tiling_helpers_are_memoized():
+    assert build_transform(112) is build_transform(112)
+    ratios = get_target_ratios(1, 6)
+    assert ratios is get_target_ratios(1, 6)
+    assert all(1 <= cols * rows <= 6 for cols, rows in ratios)
+    assert [cols * rows for cols, rows in ratios] == sorted(cols * rows for cols, rows in ratios)
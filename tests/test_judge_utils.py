@@ -0,0 +1,56 @@
+import math
+
+import pytest
+
+from method.utils.judge_utils import is_yes, token_f1, yes_no_token_ids, yes_probability_from_top_logprobs
+
+
+@pytest.mark.parametrize(
+    "reply, expected",
+    [
+        ("YES", True),
+        ("**Yes.** It matches", True),
+        ('"yes"', True),
+        ("NO", False),
+        ("No, YES would be wrong", False),
+        ("Yesterday", False),
+        ("", False),
+    ],
+)
+def test_is_yes_reads_the_start_of_the_reply(reply, expected):
+    assert is_yes(reply) is expected
+
+
+def test_yes_probability_from_top_logprobs():
+    top_logprobs = [
+        {"token": "YES", "logprob": math.log(0.6)},
+        {"token": " yes", "logprob": math.log(0.1)},
+        {"token": "NO", "logprob": math.log(0.2)},
+        {"token": "Maybe", "logprob": math.log(0.1)},
+    ]
+    # Renormalized over the YES/NO spellings only
+    assert yes_probability_from_top_logprobs(top_logprobs) == pytest.approx(0.7 / 0.9)
+    assert yes_probability_from_top_logprobs([{"token": "Maybe", "logprob": 0.0}]) is None
+
+
+class WordTokenizer:
+    """Tokenizer encoding the words of `vocab` as one token and anything else as two."""
+
+    def __init__(self, vocab: dict):
+        self.vocab = vocab
+
+    def encode(self, text, add_special_tokens=False):
+        return [self.vocab[text]] if text in self.vocab else [0, 0]
+
+
+def test_yes_no_token_ids():
+    vocab = {"YES": 1, " YES": 2, "Yes": 3, "NO": 4, "no": 5, " no": 6, " Maybe": 7}
+    assert yes_no_token_ids(WordTokenizer(vocab)) == ([1, 2, 3], [4, 5, 6])
+    with pytest.raises(ValueError, match="single-token"):
+        yes_no_token_ids(WordTokenizer({"YES": 1}))
+
+
+def test_token_f1():
+    assert token_f1("Red apple", "a red apple") == pytest.approx(0.8)
+    assert token_f1("red apple", "green pear") == 0.0
+    assert token_f1("", "anything") == 0.0
@@ -0,0 +1,34 @@
+import subprocess
+import sys
+
+import pytest
+
+from method.utils.mllm_factory import MODEL_REGISTRY, MLLMFactory, get_model_class
+
+HEAVY_MODULES = ("torch", "transformers", "torchvision", "qwen_vl_utils")
+
+
+def imported_modules(code: str) -> set:
+    """Heavy modules loaded after running `code` in a fresh interpreter."""
+    check = f"{code}\nimport sys\nprint(' '.join(name for name in {HEAVY_MODULES!r} if name in sys.modules))"
+    output = subprocess.run([sys.executable, "-c", check], capture_output=True, text=True, check=True).stdout
+    return set(output.split())
+
+
+def test_factory_import_loads_no_backend():
+    assert imported_modules("import method.utils.mllm_factory") == set()
+
+
+def test_api_backend_loads_no_local_model_stack(api_env):
+    # The mock server's URL reaches the subprocess through the environment
+    api_env()
+    code = "from method.utils.mllm_factory import MLLMFactory\nMLLMFactory('gemini-2.5-pro').close()"
+    assert imported_modules(code) == set()
+
+
+def test_unknown_models_are_rejected():
+    with pytest.raises(ValueError, match="not supported"):
+        MLLMFactory("unknown/model")
+    with pytest.raises(ValueError, match="not supported"):
+        get_model_class("unknown/model")
+    assert all(len(entry) == 3 for entry in MODEL_REGISTRY.values())
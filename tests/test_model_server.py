@@ -0,0 +1,92 @@
+import os
+import threading
+import time
+from multiprocessing import AuthenticationError
+
+import pytest
+
+from method.utils.generation_profiles import build_profiles
+from method.utils.model_server import ModelServer, RemoteModel, _private_socket_dir
+
+AUTHKEY = "0123456789abcdef"
+
+
+class EchoBackend:
+    def __init__(self):
+        self.profiles = build_profiles()
+        self.default_max_tokens = 512
+        self.params = {}
+
+    def chat_text(self, prompt, max_tokens=None, profile=None):
+        if prompt == "fail":
+            raise ValueError("backend failure")
+        return f"echo: {prompt} ({profile})"
+
+    def chat_text_stream(self, prompt, max_tokens=None, profile=None):
+        yield from prompt.split()
+
+
+@pytest.fixture
+def model_server(tmp_path, monkeypatch):
+    """A ModelServer on a private socket serving EchoBackend as "echo"; returns its address."""
+    address = str(tmp_path / "server" / "server.sock")
+    server = ModelServer(address, authkey=AUTHKEY)
+    server.models["echo"] = EchoBackend()
+    server.locks["echo"] = threading.Lock()
+
+    def serve():
+        try:
+            server.serve_forever()
+        except OSError:
+            # The listener was closed at teardown
+            pass
+
+    threading.Thread(target=serve, daemon=True).start()
+    deadline = time.monotonic() + 5
+    while not os.path.exists(address):
+        assert time.monotonic() < deadline, "model server did not start"
+        time.sleep(0.01)
+    monkeypatch.setenv("MODEL_SERVER_AUTHKEY", AUTHKEY)
+    yield address
+    server.listener.close()
+
+
+def test_remote_calls_reach_the_served_model(model_server):
+    model = RemoteModel("echo", model_server)
+    assert model.chat_text("hello", profile="answer") == "echo: hello (answer)"
+    assert list(model.chat_text_stream("one two three")) == ["one", "two", "three"]
+    assert model.profiles == build_profiles()
+    with pytest.raises(ValueError, match="backend failure"):
+        model.chat_text("fail")
+    # Methods the backend lacks are not exposed
+    assert not hasattr(model, "chat_batch")
+    model.close()
+
+
+def test_wrong_authkey_is_rejected(model_server, monkeypatch):
+    monkeypatch.setenv("MODEL_SERVER_AUTHKEY", "not-the-key")
+    with pytest.raises(AuthenticationError):
+        RemoteModel("echo", model_server)
+
+    # The server keeps serving clients with the right key
+    monkeypatch.setenv("MODEL_SERVER_AUTHKEY", AUTHKEY)
+    model = RemoteModel("echo", model_server)
+    assert model.chat_text("still up") == "echo: still up (None)"
+    model.close()
+
+
+def test_clients_need_an_authkey(model_server, monkeypatch):
+    monkeypatch.delenv("MODEL_SERVER_AUTHKEY")
+    with pytest.raises(ValueError, match="MODEL_SERVER_AUTHKEY"):
+        RemoteModel("echo", model_server)
+
+
+def test_socket_directory_must_be_private(tmp_path):
+    shared = tmp_path / "shared"
+    shared.mkdir(mode=0o755)
+    shared.chmod(0o755)
+    with pytest.raises(PermissionError, match="private"):
+        _private_socket_dir(str(shared / "server.sock"))
+
+    _private_socket_dir(str(tmp_path / "private" / "server.sock"))
+    assert (tmp_path / "private").stat().st_mode & 0o777 == 0o700
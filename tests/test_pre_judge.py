@@ -0,0 +1,53 @@
+import numpy as np
+
+from evaluator.evaluator import PreJudge
+
+
+def test_fit_threshold_takes_the_largest_agreeing_cut():
+    keys = np.array([0.1, 0.2, 0.3, 0.4, 0.5, 0.6])
+    positive = np.array([True, True, True, False, True, False])
+    assert PreJudge._fit_threshold(keys, positive, target_agreement=1.0, min_support=1) == 0.3
+    assert PreJudge._fit_threshold(keys, positive, target_agreement=0.8, min_support=1) == 0.5
+    # Too few pairs below any cut
+    assert PreJudge._fit_threshold(keys, positive, target_agreement=1.0, min_support=4) is None
+
+
+def test_fit_threshold_never_splits_ties():
+    keys = np.array([0.1, 0.2, 0.2, 0.3])
+    positive = np.array([True, True, False, False])
+    assert PreJudge._fit_threshold(keys, positive, target_agreement=1.0, min_support=1) == 0.1
+
+
+def test_calibration_reports_held_out_agreement():
+    rng = np.random.default_rng(0)
+    pairs, verdicts = [], []
+    for _ in range(200):
+        overlap = int(rng.integers(0, 5))
+        answer = " ".join(["red", "ripe", "sweet", "apple"][:overlap] + ["stone"] * (4 - overlap))
+        pairs.append(("red ripe sweet apple", answer))
+        verdicts.append(1.0 if overlap >= 3 else 0.0)
+
+    pre_judge = PreJudge(embedding_model=None)
+    report = pre_judge.calibrate(pairs, verdicts, target_agreement=0.95, min_support=10)
+    assert report["accept"] is not None and report["reject"] is not None
+    assert report["avoided"] == 1.0
+    assert report["agreement"] == 1.0
+
+
+
+def test_calibration_agreement_is_not_measured_in_sample():
+    # Judge verdicts unrelated to the answers: thresholds fitted to them look good on the same pairs only
+    rng = np.random.default_rng(0)
+    words = [f"w{i}" for i in range(40)]
+    reference = " ".join(words[:20])
+    pairs = [(reference, " ".join(rng.choice(words, size=int(rng.integers(5, 30))))) for _ in range(400)]
+    verdicts = list((rng.random(len(pairs)) < 0.5).astype(float))
+
+    pre_judge = PreJudge(embedding_model=None)
+    report = pre_judge.calibrate(pairs, verdicts, target_agreement=0.6, min_support=10)
+    in_sample = pre_judge.verdicts(pre_judge.similarities(pairs))
+    decided = in_sample >= 0
+    assert decided.any()
+    in_sample_agreement = (in_sample[decided] == np.array(verdicts)[decided]).mean()
+    assert in_sample_agreement >= 0.6
+    assert report["decided_agreement"] < in_sample_agreement
@@ -0,0 +1,64 @@
+import threading
+import time
+
+import pytest
+
+from method.utils.rate_limit_utils import RequestCancelled, SharedRateLimiter
+
+
+def test_without_rate_requests_are_not_throttled(tmp_path):
+    limiter = SharedRateLimiter("endpoint", state_dir=tmp_path)
+    start = time.time()
+    for _ in range(100):
+        with limiter.slot():
+            pass
+        limiter.on_success()
+    assert time.time() - start < 1.0
+    assert limiter.stats()["rate"] is None
+
+
+def test_rate_limited_pause_is_shared(tmp_path):
+    first = SharedRateLimiter("endpoint", state_dir=tmp_path)
+    second = SharedRateLimiter("endpoint", state_dir=tmp_path)
+    first.on_rate_limited(retry_after=0.3)
+    start = time.time()
+    second.acquire_token()
+    assert time.time() - start >= 0.25
+
+
+def test_configured_rate_overrides_persisted_state(tmp_path):
+    limiter = SharedRateLimiter("endpoint", rate=10.0, state_dir=tmp_path)
+    limiter.on_rate_limited(retry_after=0.0)
+    assert limiter.stats()["rate"] < 10.0
+    # Same configuration within the TTL: the lowered rate is shared
+    assert SharedRateLimiter("endpoint", rate=10.0, state_dir=tmp_path).stats()["rate"] < 10.0
+    # A different configured rate starts over
+    assert SharedRateLimiter("endpoint", rate=20.0, state_dir=tmp_path).stats()["rate"] == 20.0
+
+
+def test_stale_state_expires(tmp_path):
+    limiter = SharedRateLimiter("endpoint", rate=10.0, state_ttl=0.1, state_dir=tmp_path)
+    limiter.on_rate_limited(retry_after=0.0)
+    time.sleep(0.2)
+    assert limiter.stats()["rate"] == 10.0
+
+
+def test_wait_past_the_deadline_fails_fast(tmp_path):
+    limiter = SharedRateLimiter("endpoint", state_dir=tmp_path)
+    limiter.on_rate_limited(retry_after=30.0)
+    start = time.time()
+    with pytest.raises(TimeoutError):
+        with limiter.slot(deadline=time.time() + 1.0):
+            pass
+    assert time.time() - start < 0.5
+
+
+def test_cancelled_wait_gives_up(tmp_path):
+    limiter = SharedRateLimiter("endpoint", state_dir=tmp_path)
+    limiter.on_rate_limited(retry_after=30.0)
+    cancelled = threading.Event()
+    threading.Timer(0.2, cancelled.set).start()
+    start = time.time()
+    with pytest.raises(RequestCancelled):
+        limiter.acquire_token(cancelled=cancelled)
+    assert time.time() - start < 1.0
@@ -0,0 +1,40 @@
+from method.TAME import TAME
+from method.utils.generation_profiles import build_profiles
+from method.utils.models.api_model import APIModel
+
+MODEL_ID = "Qwen/Qwen2.5-72B-Instruct"
+
+
+def test_api_stream_yields_the_reply_in_chunks(api_env):
+    api_env(reply=lambda payload: "one two three four")
+    model = APIModel(MODEL_ID)
+    chunks = list(model.chat_text_stream("hello", profile="answer"))
+
+    assert len(chunks) > 1
+    assert "".join(chunks) == model.chat_text("hello", profile="answer")
+    assert model.latency.stats()["answer:ttft"]["count"] == 1
+    model.close()
+
+
+def test_api_stream_ends_before_the_stop_string(api_env):
+    api_env(reply=lambda payload: "- op: add\n```\nnot part of the block")
+    model = APIModel(MODEL_ID)
+    model.profiles = build_profiles({"answer": {"stop": ["```\n"]}})
+
+    assert "".join(model.chat_text_stream("hello", profile="answer")) == "- op: add\n"
+    model.close()
+
+
+def test_answer_question_stream_matches_answer_question(api_env, monkeypatch, tmp_path):
+    api_env()
+    monkeypatch.chdir(tmp_path)
+    tame = TAME(MODEL_ID)
+    context = "Static: likes tennis balls"
+
+    answer = tame.answer_question("c0", "What does it like?", context)
+    chunks = list(tame.answer_question_stream("c0", "What does it like?", context))
+    assert answer.startswith("echo: ")
+    assert "".join(chunks) == answer
+    assert list(tame.answer_question_stream("", "What does it like?", context)) == [
+        "Error: Invalid parameters provided."
+    ]